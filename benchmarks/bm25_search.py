@@ -0,0 +1,81 @@
+"""
+Latency of the BM25 first retrieval stage against exhaustive scoring.
+
+Builds a `BM25Index` over a synthetic Zipf-distributed corpus and compares,
+per query:
+  - exhaustive: every posting of every query term added to a dense
+                accumulator of all documents, then the top k
+  - index:      `BM25Index.search`, best k + 1 documents kept among those
+                touched by each term, with max-impact pruning
+and checks that both return the same top k scores.
+
+Run from the repository root:
+    $ python -m benchmarks.bm25_search --n-docs 100000
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.tfidf_sparse_search import synthetic_corpus
+from models.bm25_index import BM25Index, tokenize
+
+
+def exhaustive_search(index, query_text, k):
+    term_ids = {index.term_ids[t] for t in tokenize(query_text) if t in index.term_ids}
+    scores = np.zeros(len(index.ids), dtype=np.float32)
+    for term_id in term_ids:
+        docs, freqs = index.postings(term_id)
+        scores[docs] += index.term_scores(term_id, docs, freqs)
+
+    top = np.argsort(-scores, kind="stable")[:k]
+    top = top[scores[top] > 0]
+    return scores[top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--n-docs", type=int, default=100000)
+    parser.add_argument("--doc-len", type=int, default=200)
+    parser.add_argument("--vocab-size", type=int, default=50000)
+    parser.add_argument("--query-len", type=int, default=8)
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.n_docs, args.doc_len, args.vocab_size)
+    rng = np.random.default_rng(1)
+    queries = [
+        " ".join(rng.choice(corpus[i].split(), size=args.query_len))
+        for i in rng.integers(0, args.n_docs, size=args.n_queries)
+    ]
+    batches = (
+        (list(range(start + 1, start + 1 + 1000)), corpus[start : start + 1000])
+        for start in range(0, args.n_docs, 1000)
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = BM25Index.build(tmp_dir, batches)
+
+        start = time.perf_counter()
+        expected = [exhaustive_search(index, query, args.k) for query in queries]
+        exhaustive_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        start = time.perf_counter()
+        found = [index.search(query, args.k)[0] for query in queries]
+        index_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    n_mismatches = sum(
+        len(a) != len(b) or not np.allclose(a, b, rtol=1e-5)
+        for a, b in zip(expected, found)
+    )
+    print(f"{args.n_docs} docs, {args.n_queries} queries of {args.query_len} words")
+    print(f"{'method':<12}{'ms/query':>12}")
+    print(f"{'exhaustive':<12}{exhaustive_ms:>12.3f}")
+    print(f"{'index':<12}{index_ms:>12.3f}")
+    print(f"Queries with different top {args.k} scores: {n_mismatches}")
+
+
+if __name__ == "__main__":
+    main()
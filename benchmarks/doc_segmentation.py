@@ -0,0 +1,254 @@
+"""
+Throughput of the section extraction of judgments.
+
+Compares the former extraction with the anchor-offset segmenter used by
+`JurisdictionPreprocessor.extract_information_from_doc` on a synthetic fixture
+corpus of CENDOJ-like judgments, and checks that both produce the same
+information for every document.
+
+Run from the repository root:
+    $ python -m benchmarks.doc_segmentation --n-docs 200 --n-pages 60
+"""
+import argparse
+import random
+import re
+import time
+
+from scripts.data_processing.data_preprocessor import JurisdictionPreprocessor
+
+FILLER_WORDS = (
+    "el la de que en los del se las por un para con no una su al es lo como "
+    "más pero sus le ya o este sí porque esta entre cuando muy sin sobre "
+    "contrato cláusula préstamo hipotecario consumidor entidad bancaria "
+    "nulidad abusiva interés demora gastos notaría registro tasación "
+    "sentencia recurso apelación juzgado instancia audiencia provincial "
+    "pago imponer condena procedimiento derecho artículo ley tribunal"
+).split()
+
+GROUNDS_HEADERS = [
+    "FUNDAMENTOS DE DERECHO",
+    "F U N D A M E N T O S DE DERECHO",
+    "RAZONAMIENTOS JURÍDICOS",
+]
+VERDICT_HEADERS = ["FALLAMOS", "F A L L A M O S", "PARTE DISPOSITIVA"]
+VERDICTS = [
+    "Desestimamos el recurso de apelación",
+    "Estimamos parcialmente el recurso de apelación",
+    "Estimamos el recurso de apelación",
+]
+COSTS = [
+    "con imposición de las costas de primera instancia a la demandada",
+    "sin imposición de las costas del recurso",
+    "condenando al pago de las costas de esta instancia",
+    "Se imponen las costas a la parte apelante",
+    "",
+]
+
+
+def filler(rng, n_words):
+    words = rng.choices(FILLER_WORDS, k=n_words)
+    # line breaks and page breaks, as extracted from the PDFs
+    for i in range(12, n_words, 12):
+        words[i] += "\n"
+    for i in range(500, n_words, 500):
+        words[i] += f"\n\n{i // 500}\n\n\x0cJURISPRUDENCIA\n"
+    return " ".join(words)
+
+
+def synthetic_judgment(rng, n_pages):
+    """CENDOJ-like judgment, some sections missing or with header variants"""
+    words_per_page = 450
+    parts = [
+        "Roj: SAP B 1234/2021 - ECLI:ES:APB:2021:1234\n",
+        f"Id Cendoj: {rng.randrange(10**19, 10**20)}\n",
+        "Órgano: Audiencia Provincial\nSede: Barcelona\n",
+        f"Fecha: {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2021\n",
+        f"Nº de Recurso: {rng.randint(1, 999)}/2020\n",
+    ]
+    if rng.random() < 0.9:
+        parts.append("Cuestiones: cláusulas abusivas, gastos hipotecarios\n")
+    if rng.random() < 0.8:
+        parts.append("Parte recurrente/Solicitante: BANCO EJEMPLO S.A.\n")
+    parts.append("Procurador/a: DOÑA MARÍA EJEMPLO\n")
+    if rng.random() < 0.8:
+        parts.append("Parte recurrida: DON JUAN EJEMPLO\n")
+    parts.append(filler(rng, words_per_page // 2))
+
+    if rng.random() < 0.95:
+        parts.append("\nANTECEDENTES DE HECHO\n")
+    parts.append(f"PRIMERO.- {rng.choice(VERDICTS)} de la demanda.\n")
+    parts.append(filler(rng, words_per_page * n_pages // 6))
+
+    if rng.random() < 0.95:
+        parts.append(f"\n{rng.choice(GROUNDS_HEADERS)}\n")
+    parts.append(filler(rng, words_per_page * n_pages * 4 // 6))
+
+    if rng.random() < 0.95:
+        parts.append(f"\n{rng.choice(VERDICT_HEADERS)}\n")
+    parts.append(f"{rng.choice(VERDICTS)}, {rng.choice(COSTS)}.\n")
+    parts.append(filler(rng, words_per_page * n_pages // 6))
+    parts.append(
+        "\nAsí por esta nuestra sentencia, lo pronunciamos, mandamos y firmamos."
+    )
+
+    return "".join(parts)
+
+
+# The former extraction, kept to compare with
+
+INFO_NOT_FOUND_STRING = JurisdictionPreprocessor.INFO_NOT_FOUND_STRING
+
+
+def legacy_extract_section_content(
+    doc, section_name=None, section_start_pos=None, section_end_pos=None, clean=True
+):
+    if section_name:
+        start_section = doc.find(section_name, 0)
+        if start_section == -1:
+            return INFO_NOT_FOUND_STRING
+        else:
+            start_section += len(section_name)
+    if section_start_pos:
+        start_section = section_start_pos
+    if section_end_pos:
+        end_section = section_end_pos
+    else:
+        end_section = doc.find("\n", start_section)
+    section_text = doc[start_section:end_section]
+    if clean:
+        section_text = re.sub(r"\W+", " ", section_text).strip()
+    return section_text
+
+
+def legacy_text_cleaning(dirty_string):
+    clean_string = dirty_string
+    for rm_pat, repl in JurisdictionPreprocessor.BASIC_CLEANING_PATTERNS:
+        clean_string = re.sub(rm_pat, repl, clean_string)
+    return clean_string
+
+
+def legacy_retrieve_litigation_costs(section):
+    result = ""
+    for pat in list(JurisdictionPreprocessor.LEGAL_COSTS_MATCHER):
+        match_costs = JurisdictionPreprocessor.LEGAL_COSTS_MATCHER[pat].search(section)
+        if match_costs and (pat in ["C1", "C2"] or pat == "C1C2" and result == ""):
+            match_pos_start_bf = min(0, match_costs.span()[0] - 15)
+            match_str_bf = section[match_pos_start_bf : match_costs.span()[0]]
+            if "sin " not in match_str_bf.lower():
+                result += pat
+    if result == "":
+        result = "NC"
+    return result
+
+
+def legacy_extract_information_from_doc(preprocessor, doc):
+    cls = JurisdictionPreprocessor
+    dict_info = dict()
+    dict_info["cendoj_id"] = cls.CENDOJ_ID_PATTERN.search(doc).group()
+    dict_info["date"] = cls.DATE_PATTERN.search(doc).group(1)
+    dict_info["keyphrases"] = legacy_extract_section_content(
+        doc, section_name=cls.KEYPHRASE_TITLE
+    )
+
+    recurring_ent_match = cls.RECURRING_PATTERN.search(doc)
+    if recurring_ent_match:
+        recurring_ent_match = legacy_extract_section_content(
+            doc, section_start_pos=recurring_ent_match.span(1)[-1]
+        )
+    else:
+        recurring_ent_match = INFO_NOT_FOUND_STRING
+    dict_info["recurring_part"] = recurring_ent_match
+
+    dict_info["appellant"] = legacy_extract_section_content(
+        doc, section_name=cls.APELLANT_TITLE
+    )
+
+    match_new_facts = cls.FACTUAL_GROUND_HEADER_PATTERN.search(doc)
+    if match_new_facts:
+        background_end_position = match_new_facts.span()[0]
+        factual_background = legacy_extract_section_content(
+            doc,
+            section_name=cls.FACTUAL_BACKGROUND_HEADER,
+            section_end_pos=background_end_position,
+            clean=False,
+        )
+        factual_background = legacy_text_cleaning(factual_background)
+    else:
+        background_end_position = 0
+        factual_background = INFO_NOT_FOUND_STRING
+    dict_info["factual_background"] = factual_background
+
+    dict_info["first_verdict"] = preprocessor.retrieve_verdict_result(
+        dict_info["factual_background"]
+    )
+
+    match_last_verdict = cls.VERDICT_HEADER_PATTERN.search(
+        doc[background_end_position:]
+    )
+    if match_new_facts and match_last_verdict:
+        factual_grounds = legacy_extract_section_content(
+            doc,
+            section_start_pos=match_new_facts.span()[1],
+            section_end_pos=match_last_verdict.span()[0],
+        )
+        factual_grounds = legacy_text_cleaning(factual_grounds)
+    else:
+        factual_grounds = INFO_NOT_FOUND_STRING
+    dict_info["factual_grounds"] = factual_grounds
+
+    if match_last_verdict:
+        last_verdict = doc[match_last_verdict.span()[0] + background_end_position :]
+        last_verdict = legacy_text_cleaning(last_verdict)
+    else:
+        last_verdict = INFO_NOT_FOUND_STRING
+    dict_info["verdict_arguments"] = last_verdict
+
+    dict_info["last_verdict"] = preprocessor.retrieve_verdict_result(
+        dict_info["verdict_arguments"]
+    )
+    dict_info["legal_costs"] = legacy_retrieve_litigation_costs(
+        dict_info["verdict_arguments"]
+    )
+
+    return dict_info
+
+
+def time_extraction(extract, corpus):
+    start = time.perf_counter()
+    results = [extract(doc) for doc in corpus]
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--n-docs", type=int, default=200)
+    parser.add_argument("--n-pages", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [synthetic_judgment(rng, args.n_pages) for _ in range(args.n_docs)]
+    corpus_mb = sum(len(doc.encode()) for doc in corpus) / 1e6
+
+    # only the extraction methods are used, skip loading arguments and agents
+    preprocessor = JurisdictionPreprocessor.__new__(JurisdictionPreprocessor)
+
+    legacy_results, legacy_s = time_extraction(
+        lambda doc: legacy_extract_information_from_doc(preprocessor, doc), corpus
+    )
+    results, segmenter_s = time_extraction(
+        preprocessor.extract_information_from_doc, corpus
+    )
+
+    n_different = sum(a != b for a, b in zip(legacy_results, results))
+    print(
+        f"{args.n_docs} docs x {args.n_pages} pages ({corpus_mb:.1f} MB), "
+        f"{n_different} with different output"
+    )
+    print(f"{'method':<22}{'docs/s':>10}{'MB/s':>10}")
+    for name, elapsed in [("former", legacy_s), ("anchor offsets", segmenter_s)]:
+        print(f"{name:<22}{args.n_docs / elapsed:>10.1f}{corpus_mb / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
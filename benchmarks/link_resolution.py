@@ -0,0 +1,133 @@
+"""
+Throughput of resolving PDF links from CENDOJ detail pages over HTTP.
+
+Serves saved (or synthetic) detail pages from a local fixture server with a
+simulated network latency, resolves them with `JurisdictionLinkResolver` and
+checks every resolved link. Pages without the `objtcontentpdf` anchor in
+their source stand for the ones rendered with JavaScript (no container, or
+an empty one followed by other links): they must be counted as browser
+fallbacks, no browser is started.
+
+Run from the repository root:
+    $ python -m benchmarks.link_resolution --n-pages 500 --latency-ms 100
+    $ python -m benchmarks.link_resolution --pages-dir data/raw/detail_pages
+"""
+import argparse
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scripts.data_processing.data_downloader import JurisdictionPDFDownloader
+from scripts.data_processing.data_link_resolver import JurisdictionLinkResolver
+
+# href as found in the page source, entities included
+PDF_HREF_TEMPLATE = (
+    "/search/contenidos.action?action=accessToPDF&amp;publicinterface=true"
+    "&amp;tab=AN&amp;reference={reference}&amp;optimize=20210101"
+)
+DETAIL_PAGE_TEMPLATE = """<html><head><title>CENDOJ</title></head><body>
+<div class="modal"><button class="close">x</button></div>
+<div id="objtcontentpdf" class="pdf-box">
+<a href="{href}" target="_blank">PDF</a>
+</div></body></html>"""
+SCRIPT_PAGES = [
+    """<html><body><div id="root"></div>
+<script src="/static/app.js"></script></body></html>""",
+    """<html><body><div id="objtcontentpdf" class="pdf-box"></div>
+<script>load()</script>
+<footer><a href="/aviso-legal">Aviso</a></footer></body></html>""",
+]
+
+
+def synthetic_pages(n_pages, script_ratio):
+    """path -> (html, expected link), a `script_ratio` share needing JS"""
+    pages = {}
+    n_script = int(n_pages * script_ratio)
+    for i in range(n_pages):
+        if i < n_script:
+            pages[f"/detail/{i}"] = (SCRIPT_PAGES[i % len(SCRIPT_PAGES)], None)
+        else:
+            href = PDF_HREF_TEMPLATE.format(reference=9000000 + i)
+            pages[f"/detail/{i}"] = (DETAIL_PAGE_TEMPLATE.format(href=href), href)
+    return pages
+
+
+def saved_pages(pages_dir):
+    """path -> (html, None) of every saved page, links are not checked"""
+    pages = {}
+    for file_name in sorted(os.listdir(pages_dir)):
+        with open(os.path.join(pages_dir, file_name), encoding="utf-8") as handle:
+            pages[f"/detail/{file_name}"] = (handle.read(), None)
+    return pages
+
+
+def serve(pages, latency_s):
+    class DetailPageHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency_s)
+            if self.path not in pages:
+                self.send_error(404)
+                return
+            body = pages[self.path][0].encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DetailPageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--n-pages", type=int, default=500)
+    parser.add_argument("--script-ratio", type=float, default=0.05)
+    parser.add_argument("--pages-dir", help="folder of saved detail pages")
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--max-workers", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.pages_dir:
+        pages = saved_pages(args.pages_dir)
+    else:
+        pages = synthetic_pages(args.n_pages, args.script_ratio)
+
+    server = serve(pages, args.latency_ms / 1000)
+    root = f"http://127.0.0.1:{server.server_address[1]}"
+
+    fallbacks = []
+    resolver = JurisdictionLinkResolver(
+        JurisdictionPDFDownloader(["benchmark\n"], max_workers=args.max_workers),
+        browser_fallback=lambda url: fallbacks.append(url),
+    )
+
+    start = time.perf_counter()
+    resolved = dict(resolver.resolve_many(root + path for path in pages))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    # the fallback resolves nothing, pages needing JS must come back as None
+    n_wrong = 0
+    if not args.pages_dir:
+        n_wrong = sum(
+            resolved[root + path] != expected for path, (_, expected) in pages.items()
+        )
+    print(
+        f"{len(pages)} pages, {args.latency_ms:.0f} ms latency, "
+        f"{args.max_workers} workers"
+    )
+    print(
+        f"Over HTTP: {resolver.n_http} | Browser fallbacks: {len(fallbacks)} | "
+        f"Wrong links: {n_wrong}"
+    )
+    print(f"{len(pages) / elapsed:.1f} pages/s ({elapsed:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Throughput of loading embeddings into a pgvector table and reading them back.
+
+Loads random vectors into a scratch table with the row by row INSERT path
+(`executemany` of pgvector text literals) and with the binary COPY bulk
+loader, with and without the unlogged staging table. Then reads them back
+with `fetchall` and with the chunked server-side cursor, reporting the peak
+Python memory of each. Needs the Postgres server of `database_secrets.json`;
+the scratch table is dropped at the end.
+
+Run from the repository root:
+    $ python -m benchmarks.pgvector_load --n-rows 100000 --dim 800
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from scripts.data_processing.data_storage import (
+    JurisdictionDataBaseManager,
+    format_vector_rows,
+)
+
+SCRATCH_TABLE = "benchmark_vectors"
+SCHEMA_TEMPLATE = """CREATE EXTENSION IF NOT EXISTS vector;
+
+DROP TABLE IF EXISTS {table};
+
+CREATE TABLE {table} (
+    id INTEGER PRIMARY KEY,
+    vector vector({dim})
+);"""
+
+
+def fetchall_vectors(db_manager, table_name):
+    """Former way of reading vectors: every row as a tuple of Python floats"""
+    result = db_manager.load_data_from_table(table_name, "id, vector::real[]")
+    ids, embeddings = zip(*result)
+    return np.array(ids), np.array(embeddings, dtype=np.float32)
+
+
+def time_and_peak(function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--n-rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=800)
+    parser.add_argument("--chunk-rows", type=int, default=10000)
+    parser.add_argument(
+        "--insert-rows",
+        type=int,
+        default=10000,
+        help="rows loaded with INSERT, it is too slow for the whole set",
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.random((args.n_rows, args.dim), dtype=np.float32)
+    ids = np.arange(1, args.n_rows + 1)
+
+    # schema file named after the scratch table, as the pgvector tables are
+    schema_dir = tempfile.mkdtemp()
+    table_path = os.path.join(schema_dir, f"{SCRATCH_TABLE}.sql")
+    with open(table_path, "w") as handle:
+        handle.write(SCHEMA_TEMPLATE.format(table=SCRATCH_TABLE, dim=args.dim))
+
+    db_manager = JurisdictionDataBaseManager()
+    n_insert = min(args.insert_rows, args.n_rows)
+    start = time.perf_counter()
+    db_manager(
+        "pgvector",
+        table_path,
+        format_vector_rows(ids[:n_insert], vectors[:n_insert]),
+        recreate=True,
+    )
+    insert_s = time.perf_counter() - start
+
+    results = [("INSERT executemany", n_insert, insert_s)]
+    for name, staging in [("COPY", False), ("COPY + staging table", True)]:
+        start = time.perf_counter()
+        db_manager.bulk_load_vectors(
+            table_path,
+            ids,
+            vectors,
+            recreate=True,
+            staging=staging,
+            chunk_rows=args.chunk_rows,
+        )
+        results.append((name, args.n_rows, time.perf_counter() - start))
+
+    with db_manager.session("pgvector") as connection:
+        reads = [
+            ("fetchall", *time_and_peak(fetchall_vectors, db_manager, SCRATCH_TABLE)),
+            (
+                "server-side cursor",
+                *time_and_peak(db_manager.load_vectors, SCRATCH_TABLE),
+            ),
+        ]
+        cursor = connection.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {SCRATCH_TABLE}")
+        cursor.close()
+
+    print(f"{args.dim}-d vectors, {args.chunk_rows} rows per COPY")
+    print(f"{'load':<24}{'rows':>10}{'rows/s':>12}")
+    for name, n_rows, elapsed in results:
+        print(f"{name:<24}{n_rows:>10}{n_rows / elapsed:>12.0f}")
+
+    print(f"Read back, float32 matrix of {vectors.nbytes / 1e6:.0f} MB")
+    print(f"{'read':<24}{'rows/s':>10}{'peak (MB)':>12}")
+    for name, elapsed, peak in reads:
+        print(f"{name:<24}{args.n_rows / elapsed:>10.0f}{peak / 1e6:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Concurrent requests to the search service.
+
+Starts the service in this process on a free port and sends `/sentences` and
+`/search` requests from many threads at once, as several clients (or the app
+sessions sharing one engine) do. Every response must succeed and return the
+sentences asked for; failures are reported with their error. Needs the
+SQLite database of `database_secrets.json` and, for searches, fitted models.
+
+Run from the repository root:
+    $ python -m benchmarks.search_service_concurrency --threads 16 --requests 50
+    $ python -m benchmarks.search_service_concurrency --no-search
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+from scripts.data_processing.data_storage import JurisdictionDataBaseManager
+from scripts.search_service import (
+    SENTENCE_TABLE,
+    JurisdictionSearchEngine,
+    SearchRequestHandler,
+)
+
+
+class QuietRequestHandler(SearchRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def sample_sentences(n_sentences):
+    """(sentence id, text) of the first sentences of the database"""
+    db_manager = JurisdictionDataBaseManager()
+    with db_manager.session("sqlite"):
+        return db_manager.get_query_data(
+            f"SELECT sentence_id, factual_background FROM {SENTENCE_TABLE} "
+            f"ORDER BY sentence_id LIMIT {int(n_sentences)}"
+        )
+
+
+def send(root, path, body=None):
+    """Status and JSON content of a request, the error text on failure"""
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    try:
+        with urllib.request.urlopen(root + path, data=data, timeout=60) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, error.read().decode("utf-8", errors="replace")
+    except OSError as error:
+        return None, str(error)
+
+
+def run_client(root, sentences, categories, n_requests, client):
+    """Send n_requests, alternating metadata reads and searches"""
+    failures = []
+    for i in range(n_requests):
+        start = (client + i) % len(sentences)
+        ids = [sentence_id for sentence_id, _ in sentences[start : start + 3]]
+
+        if not categories or i % 2 == 0:
+            status, content = send(root, f"/sentences?ids={','.join(map(str, ids))}")
+            ok = status == 200 and [r["sentence_id"] for r in content["results"]] == ids
+        else:
+            query = sentences[start][1] or "costas"
+            category = categories[i % len(categories)]
+            body = {"category": category, "query": query[:500], "k": 5}
+            status, content = send(root, "/search", body)
+            ok = status == 200
+
+        if not ok:
+            failures.append(f"{status}: {content}"[:200])
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=50, help="per thread")
+    parser.add_argument("--no-search", action="store_true")
+    args = parser.parse_args()
+
+    sentences = sample_sentences(100)
+    if not sentences:
+        raise SystemExit(f"No rows in the {SENTENCE_TABLE} table")
+
+    engine = JurisdictionSearchEngine()
+    categories = [] if args.no_search else engine.categories
+    if categories:
+        engine.load_all()
+    QuietRequestHandler.engine = engine
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    root = f"http://127.0.0.1:{server.server_address[1]}"
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        results = pool.map(
+            lambda client: run_client(
+                root, sentences, categories, args.requests, client
+            ),
+            range(args.threads),
+        )
+        failures = [failure for result in results for failure in result]
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    n_requests = args.threads * args.requests
+    print(f"{n_requests} requests from {args.threads} threads in {elapsed:.1f} s")
+    print(f"{n_requests / elapsed:.1f} requests/s | Failures: {len(failures)}")
+    for failure, count in Counter(failures).most_common(5):
+        print(f"  {count} x {failure}")
+
+
+if __name__ == "__main__":
+    main()
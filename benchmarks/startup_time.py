@@ -0,0 +1,76 @@
+"""
+Cold start time of the app, the pipeline entry point and the models.
+
+Each target runs in a fresh interpreter, so nothing is shared through the
+import cache, and the median of several runs is reported. A first search
+also loads the model and index, that cost is measured by the search
+benchmarks and not here.
+
+Run from the repository root:
+    $ python -m benchmarks.startup_time --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> statement run in a fresh interpreter
+TARGETS = {
+    "import vector_index": "import models.vector_index",
+    "import tfidf_model": "import models.tfidf_model",
+    "import w2v_model": "import models.w2v_model",
+    "TFIDFModel()": "from models.tfidf_model import TFIDFModel; TFIDFModel()",
+    "Word2VecModel()": "from models.w2v_model import Word2VecModel; Word2VecModel()",
+    "import pipeline (src.main)": "import src.main",
+    # the app imports its siblings from scripts/, as `streamlit run` does
+    "import app": "import sys; sys.path.insert(0, 'scripts'); import generate_app",
+}
+
+
+def time_statement(statement):
+    """Wall time of a fresh interpreter running `statement`, None if it fails"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", statement],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    elapsed = time.perf_counter() - start
+
+    if result.returncode != 0:
+        error = result.stderr.decode().strip().splitlines()
+        print(f"Failed: {statement}\n  {error[-1] if error else ''}")
+        return None
+
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # bare interpreter start, subtracted to show the cost of the code itself
+    baseline = statistics.median(time_statement("pass") for _ in range(args.runs))
+
+    print(f"Interpreter start: {baseline * 1000:.0f} ms (median of {args.runs})")
+    print(f"{'target':<30}{'total (ms)':>12}{'own (ms)':>12}")
+    for name, statement in TARGETS.items():
+        times = []
+        for _ in range(args.runs):
+            elapsed = time_statement(statement)
+            if elapsed is None:
+                break
+            times.append(elapsed)
+        else:
+            total = statistics.median(times)
+            print(f"{name:<30}{total * 1000:>12.0f}{(total - baseline) * 1000:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
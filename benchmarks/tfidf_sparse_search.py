@@ -0,0 +1,83 @@
+"""
+Memory and latency of the sparse TF-IDF search path against the dense one.
+
+Fits a TF-IDF vectorizer on a synthetic Zipf-distributed corpus and compares:
+  - dense:  float64 `toarray()` matrix (how vectors used to be stored) searched
+            with an exact FAISS flat index
+  - sparse: CSR matrix searched with `SparseVectorIndex`
+
+Run from the repository root:
+    $ python -m benchmarks.tfidf_sparse_search --n-docs 20000
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from models.vector_index import SparseVectorIndex, VectorIndex
+
+
+def synthetic_corpus(n_docs, doc_len, vocab_size, seed=0):
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"w{i}" for i in range(vocab_size)])
+    # Zipf-like word frequencies, as in natural language
+    probs = 1.0 / np.arange(1, vocab_size + 1)
+    probs /= probs.sum()
+    return [
+        " ".join(rng.choice(vocabulary, size=doc_len, p=probs)) for _ in range(n_docs)
+    ]
+
+
+def time_queries(index, queries, k):
+    start = time.perf_counter()
+    for row in range(queries.shape[0]):
+        index.search(queries[row], k)
+    return (time.perf_counter() - start) * 1000 / queries.shape[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--n-docs", type=int, default=20000)
+    parser.add_argument("--doc-len", type=int, default=400)
+    parser.add_argument("--vocab-size", type=int, default=50000)
+    parser.add_argument("--max-features", type=int, default=800)
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.n_docs, args.doc_len, args.vocab_size)
+    vectorizer = TfidfVectorizer(max_df=0.9, max_features=args.max_features)
+    tfidf_vectors = vectorizer.fit_transform(corpus)
+    queries = vectorizer.transform(corpus[: args.n_queries])
+    ids = np.arange(1, args.n_docs + 1)
+
+    dense_vectors = tfidf_vectors.toarray()
+    dense_bytes = dense_vectors.nbytes
+    sparse_bytes = (
+        tfidf_vectors.data.nbytes
+        + tfidf_vectors.indices.nbytes
+        + tfidf_vectors.indptr.nbytes
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dense_index = VectorIndex.build(f"{tmp_dir}/dense", dense_vectors, ids)
+        sparse_index = SparseVectorIndex.build(f"{tmp_dir}/sparse", tfidf_vectors, ids)
+
+        dense_queries = queries.toarray()
+        dense_ms = time_queries(dense_index, dense_queries, args.k)
+        sparse_ms = time_queries(sparse_index, queries, args.k)
+
+    density = tfidf_vectors.nnz / np.prod(tfidf_vectors.shape)
+    print(
+        f"{args.n_docs} docs x {tfidf_vectors.shape[1]} features, "
+        f"density {density:.2%}"
+    )
+    print(f"{'path':<8}{'memory (MB)':>14}{'ms/query':>12}")
+    print(f"{'dense':<8}{dense_bytes / 1e6:>14.1f}{dense_ms:>12.3f}")
+    print(f"{'sparse':<8}{sparse_bytes / 1e6:>14.1f}{sparse_ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Memory footprint and recall of the compressed index types, with and without
+exact rescoring.
+
+Builds every index option on synthetic clustered embeddings (or on the
+vectors of a published index) and reports the size of what stays in memory,
+recall@k against the exact float32 search and the latency per query. Rescored
+options rank `--rescore` candidates of the index again with the float32
+vectors, as `VectorIndex.search` does.
+
+Run from the repository root:
+    $ python -m benchmarks.vector_quantization --n-docs 100000 --dim 300
+    $ python -m benchmarks.vector_quantization \\
+        --vectors data/indexes/wordvector/<version>/vectors.npy
+"""
+import argparse
+
+import numpy as np
+
+from models.vector_index import build_faiss_index, evaluate_recall, normalize_embeddings
+
+# name -> index params, the float64 baseline is reported apart
+OPTIONS = {
+    "flat float32": {"type": "flat"},
+    "sq8": {"type": "sq8"},
+    "pq": {"type": "pq"},
+    "ivf_sq8": {"type": "ivf_sq8"},
+    "ivf_pq": {"type": "ivf_pq"},
+}
+
+
+def synthetic_embeddings(n_docs, dim, n_topics=200, seed=0):
+    """Documents scattered around topic centroids, like averaged word vectors"""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    topics = rng.integers(0, n_topics, n_docs)
+    noise = rng.standard_normal((n_docs, dim)).astype(np.float32)
+    return normalize_embeddings(centroids[topics] + 0.8 * noise)
+
+
+def index_bytes(index):
+    import faiss
+
+    return faiss.serialize_index(index).nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--n-docs", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=300)
+    parser.add_argument("--vectors", help=".npy file of vectors to index")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--n-queries", type=int, default=500)
+    parser.add_argument("--rescore", type=int, default=100)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--pq-m", type=int, default=20)
+    parser.add_argument("--pq-nbits", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = normalize_embeddings(np.load(args.vectors))
+    else:
+        vectors = synthetic_embeddings(args.n_docs, args.dim)
+    n_docs, dim = vectors.shape
+
+    shared_params = {
+        "nlist": args.nlist,
+        "nprobe": args.nprobe,
+        "pq_m": args.pq_m,
+        "pq_nbits": args.pq_nbits,
+    }
+
+    print(f"{n_docs} vectors of {dim} dimensions, recall@{args.k}")
+    print(f"float64 matrix: {n_docs * dim * 8 / 1e6:.1f} MB (former storage)")
+    print(f"{'option':<28}{'memory (MB)':>12}{'recall':>10}{'ms/query':>10}")
+    for name, params in OPTIONS.items():
+        index = build_faiss_index(vectors, dict(shared_params, **params))
+        memory_mb = index_bytes(index) / 1e6
+
+        for rescore in [0, args.rescore] if params["type"] != "flat" else [0]:
+            recall = evaluate_recall(
+                index, vectors, args.k, args.n_queries, rescore=rescore
+            )
+            label = f"{name} + rescore {rescore}" if rescore else name
+            print(
+                f"{label:<28}{memory_mb:>12.1f}{recall['recall_at_k']:>10.3f}"
+                f"{recall['approx_ms']:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Throughput of document embedding with Word2Vec word-vector averaging.
+
+Trains a small Word2Vec model on a synthetic corpus and compares the former
+word-by-word Python loop with the batched implementation, which sums the word
+vectors of each document through one sparse (n_docs x vocab_size)
+bag-of-words matrix product, in one process and across worker processes
+sharing the memory-mapped word vectors.
+
+Run from the repository root:
+    $ python -m benchmarks.w2v_doc_embedding --n-docs 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+from multiprocessing import Pool
+
+import numpy as np
+from gensim.models import Word2Vec
+
+from models.w2v_model import (
+    EMBEDDING_CHUNK_SIZE,
+    _embed_documents_chunk,
+    _init_embedding_worker,
+    average_word_vectors,
+)
+
+
+def loop_doc_vector(document, wv):
+    # word by word averaging, as Word2VecModel.get_doc_vector used to do
+    aggregate_vector = np.zeros(wv.vector_size)
+    word_count = 0
+    for word in document.split():
+        if word in wv.key_to_index:
+            aggregate_vector += wv[word]
+            word_count += 1
+    if word_count > 0:
+        aggregate_vector = np.divide(aggregate_vector, word_count)
+    return aggregate_vector
+
+
+def synthetic_corpus(n_docs, doc_len, vocab_size, seed=0):
+    rng = np.random.default_rng(seed)
+    probs = 1.0 / np.arange(1, vocab_size + 1)
+    probs /= probs.sum()
+    word_ids = rng.choice(vocab_size, size=(n_docs, doc_len), p=probs)
+    return [" ".join(f"w{i}" for i in row) for row in word_ids]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--n-docs", type=int, default=100000)
+    parser.add_argument("--doc-len", type=int, default=300)
+    parser.add_argument("--vocab-size", type=int, default=30000)
+    parser.add_argument("--vector-size", type=int, default=300)
+    parser.add_argument("--n-jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--loop-docs", type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.n_docs, args.doc_len, args.vocab_size)
+    model = Word2Vec(
+        [doc.split() for doc in corpus[:5000]],
+        vector_size=args.vector_size,
+        min_count=1,
+        workers=4,
+        epochs=1,
+    )
+    wv = model.wv
+
+    # the former loop is too slow to run on the whole corpus, extrapolate
+    start = time.perf_counter()
+    for doc in corpus[: args.loop_docs]:
+        loop_doc_vector(doc, wv)
+    loop_docs_s = args.loop_docs / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    average_word_vectors(corpus, wv.vectors, wv.key_to_index)
+    batch_docs_s = args.n_docs / (time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vectors_path = os.path.join(tmp_dir, "w2v_embeddings.wv")
+        wv.save(vectors_path)
+        chunks = [
+            corpus[i : i + EMBEDDING_CHUNK_SIZE]
+            for i in range(0, len(corpus), EMBEDDING_CHUNK_SIZE)
+        ]
+        start = time.perf_counter()
+        with Pool(args.n_jobs, _init_embedding_worker, (vectors_path,)) as pool:
+            np.vstack(pool.map(_embed_documents_chunk, chunks))
+        pool_docs_s = args.n_docs / (time.perf_counter() - start)
+
+    print(
+        f"{args.n_docs} docs x {args.doc_len} tokens, "
+        f"{len(wv.key_to_index)} words x {args.vector_size} dims"
+    )
+    print(f"{'method':<22}{'docs/s':>12}{'100k docs (s)':>16}")
+    for name, docs_s in [
+        ("word-by-word loop", loop_docs_s),
+        ("batched", batch_docs_s),
+        (f"batched, {args.n_jobs} procs", pool_docs_s),
+    ]:
+        print(f"{name:<22}{docs_s:>12.0f}{100000 / docs_s:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
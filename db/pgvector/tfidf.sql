@@ -1,6 +1,8 @@
+CREATE EXTENSION IF NOT EXISTS vector;
+
 DROP TABLE IF EXISTS tfidf;
 
 CREATE TABLE tfidf (
-    id SERIAL PRIMARY KEY,
-    vector FLOAT[800]
+    id INTEGER PRIMARY KEY,
+    vector vector(800)
 );
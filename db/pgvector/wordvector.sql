@@ -1,6 +1,8 @@
+CREATE EXTENSION IF NOT EXISTS vector;
+
 DROP TABLE IF EXISTS wordvector;
 
 CREATE TABLE wordvector (
-    id SERIAL PRIMARY KEY,
-    vector FLOAT[500]
-);
\ No newline at end of file
+    id INTEGER PRIMARY KEY,
+    vector vector(300)
+);
@@ -0,0 +1,4 @@
+CREATE TABLE IF NOT EXISTS jurisprudence_urls (
+                                    base_url             TEXT PRIMARY KEY,
+                                    final_url            TEXT NOT NULL
+                                    );
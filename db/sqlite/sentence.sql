@@ -1,7 +1,7 @@
 CREATE TABLE IF NOT EXISTS sentence (
-                                    sentence_id          INT PRIMARY KEY,
-                                    cendoj_id            TEXT,
-                                    doc_date              INT,
+                                    sentence_id          INTEGER PRIMARY KEY,
+                                    cendoj_id            TEXT NOT NULL UNIQUE,
+                                    doc_date             TEXT,
                                     keyphrases           TEXT,
                                     recurring_part       TEXT,
                                     appellant            TEXT,
@@ -11,5 +11,12 @@ CREATE TABLE IF NOT EXISTS sentence (
                                     first_verdict        TEXT,
                                     last_verdict         TEXT,
                                     legal_costs          TEXT,
-                                    link                 TEXT
-                                    );
\ No newline at end of file
+                                    link                 TEXT,
+                                    updated_at           TEXT
+                                    );
+-- searches are filtered with the attributes stored with each search index,
+-- no query filters this table: drop the indexes of older schemas
+DROP INDEX IF EXISTS sentence_doc_date_idx;
+DROP INDEX IF EXISTS sentence_first_verdict_idx;
+DROP INDEX IF EXISTS sentence_last_verdict_idx;
+DROP INDEX IF EXISTS sentence_legal_costs_idx;
@@ -0,0 +1,8 @@
+CREATE TABLE IF NOT EXISTS url_state (
+                                    url                  TEXT PRIMARY KEY,
+                                    status               TEXT NOT NULL DEFAULT 'pending'
+                                        CHECK (status IN ('pending', 'done', 'failed')),
+                                    error                TEXT,
+                                    attempts             INTEGER NOT NULL DEFAULT 0,
+                                    updated_at           TEXT
+                                    );
@@ -0,0 +1,350 @@
+import json
+import os
+import re
+
+import numpy as np
+
+from .vector_index import VectorIndex
+
+# Bump whenever the on-disk layout of a BM25 index version changes
+BM25_FORMAT_VERSION = 1
+
+# Files that make up one published BM25 index version
+TERMS_FILE_NAME = "terms.json"
+INDPTR_FILE_NAME = "indptr.npy"
+POSTING_DOCS_FILE_NAME = "posting_docs.npy"
+POSTING_FREQS_FILE_NAME = "posting_freqs.npy"
+MAX_IMPACTS_FILE_NAME = "max_impacts.npy"
+DOC_LENGTHS_FILE_NAME = "doc_lengths.npy"
+IDS_FILE_NAME = "ids.npy"
+META_FILE_NAME = "meta.json"
+
+# Same tokens as the default TfidfVectorizer analyzer, over the whole
+# vocabulary
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+# Term frequencies are stored as uint16
+MAX_TERM_FREQ = np.iinfo(np.uint16).max
+
+# Indexes already loaded by this process, keyed by (root path, version)
+_LOADED_BM25_INDEXES = {}
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Versioned, on-disk BM25 inverted index of the sentence documents, used as
+    a cheap first retrieval stage over the full vocabulary.
+
+    Postings are stored per term in CSR layout: `indptr` delimits the
+    postings of each term, which hold the document position (in `ids`) and
+    the term frequency, sorted by position. Arrays are memory-mapped, so a
+    query only reads the postings of its terms. Versions are published under
+    `root_path` with the same `LATEST` pointer as the vector indexes.
+
+    Queries are scored term at a time, highest impact first, keeping the best
+    k + 1 documents among those the postings touched so far. Once the terms
+    left cannot change which documents make the top k (their maximum impact
+    is below the gap between the k-th and the next score), only the top k
+    documents keep being scored.
+    """
+
+    def __init__(self, root_path: str, version: str, arrays: dict, meta: dict):
+        self.root_path = root_path
+        self.version = version
+        self.meta = meta
+        self.ids = arrays["ids"]
+        self.indptr = arrays["indptr"]
+        self.posting_docs = arrays["posting_docs"]
+        self.posting_freqs = arrays["posting_freqs"]
+        self.max_impacts = arrays["max_impacts"]
+        self.term_ids = {term: i for i, term in enumerate(arrays["terms"])}
+
+        # per document part of the BM25 denominator, computed once
+        k1, b = meta["k1"], meta["b"]
+        doc_lengths = arrays["doc_lengths"]
+        self.doc_norms = (
+            k1 * (1 - b + b * doc_lengths / max(meta["avg_doc_length"], 1e-9))
+        ).astype(np.float32)
+        doc_freqs = np.diff(self.indptr)
+        self.idf = np.log(
+            1 + (len(self.ids) - doc_freqs + 0.5) / (doc_freqs + 0.5)
+        ).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def last_id(self) -> int:
+        return int(self.ids.max()) if len(self.ids) else 0
+
+    @classmethod
+    def build(
+        cls,
+        root_path: str,
+        batches,
+        k1: float = 1.2,
+        b: float = 0.75,
+        corpus_version: str = None,
+    ):
+        """
+        Build the inverted index of a document stream and publish it as the
+        latest version under root_path.
+
+        Parameters:
+            root_path (str): Directory holding all versions of this index.
+            batches (Iterable[Tuple[List[int], List[str]]]): (ids, documents)
+                chunks, e.g. `SentenceCorpus.iter_batches()`.
+            k1 (float): BM25 term frequency saturation.
+            b (float): BM25 document length normalization.
+            corpus_version (str): `SentenceCorpus.version` of the documents,
+                to find the ones updated after the build.
+
+        Returns:
+            BM25Index: The newly published index.
+        """
+        term_ids = {}
+        ids, doc_lengths = [], []
+        chunk_terms, chunk_docs, chunk_freqs = [], [], []
+
+        for batch_ids, documents in batches:
+            terms, docs, freqs = [], [], []
+            for document in documents:
+                tokens = tokenize(document)
+                position = len(doc_lengths)
+                doc_lengths.append(len(tokens))
+
+                counts = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for token, count in counts.items():
+                    terms.append(term_ids.setdefault(token, len(term_ids)))
+                    docs.append(position)
+                    freqs.append(min(count, MAX_TERM_FREQ))
+
+            ids.extend(batch_ids)
+            chunk_terms.append(np.array(terms, dtype=np.int32))
+            chunk_docs.append(np.array(docs, dtype=np.int32))
+            chunk_freqs.append(np.array(freqs, dtype=np.uint16))
+
+        terms = np.concatenate(chunk_terms) if chunk_terms else np.zeros(0, np.int32)
+        docs = np.concatenate(chunk_docs) if chunk_docs else np.zeros(0, np.int32)
+        freqs = np.concatenate(chunk_freqs) if chunk_freqs else np.zeros(0, np.uint16)
+        doc_lengths = np.array(doc_lengths, dtype=np.int32)
+
+        # group postings by term, documents stay in position order
+        order = np.argsort(terms, kind="stable")
+        docs, freqs = docs[order], freqs[order]
+        indptr = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(terms, minlength=len(term_ids)))
+
+        meta = {
+            "format_version": BM25_FORMAT_VERSION,
+            "n_docs": len(ids),
+            "n_terms": len(term_ids),
+            "n_postings": int(len(docs)),
+            "avg_doc_length": float(doc_lengths.mean()) if len(ids) else 0.0,
+            "k1": k1,
+            "b": b,
+            "corpus_version": corpus_version,
+        }
+        arrays = {
+            "terms": sorted(term_ids, key=term_ids.get),
+            "ids": np.asarray(ids, dtype=np.int64),
+            "indptr": indptr,
+            "posting_docs": docs,
+            "posting_freqs": freqs,
+            "doc_lengths": doc_lengths,
+        }
+        arrays["max_impacts"] = cls.max_term_impacts(arrays, meta)
+
+        return cls.write_version(root_path, arrays, meta)
+
+    @staticmethod
+    def max_term_impacts(arrays: dict, meta: dict) -> np.ndarray:
+        """Highest BM25 score each term gives a document, used for pruning"""
+        k1, b = meta["k1"], meta["b"]
+        doc_norms = k1 * (
+            1 - b + b * arrays["doc_lengths"] / max(meta["avg_doc_length"], 1e-9)
+        )
+        freqs = arrays["posting_freqs"].astype(np.float32)
+        impacts = freqs * (k1 + 1) / (freqs + doc_norms[arrays["posting_docs"]])
+
+        indptr = arrays["indptr"]
+        max_impacts = np.zeros(len(indptr) - 1, dtype=np.float32)
+        non_empty = indptr[:-1] < indptr[1:]
+        max_impacts[non_empty] = np.maximum.reduceat(impacts, indptr[:-1][non_empty])
+
+        doc_freqs = np.diff(indptr)
+        idf = np.log(1 + (meta["n_docs"] - doc_freqs + 0.5) / (doc_freqs + 0.5))
+        return (max_impacts * idf).astype(np.float32)
+
+    @classmethod
+    def write_version(cls, root_path: str, arrays: dict, meta: dict) -> "BM25Index":
+        """Write all files of a new version and publish it as the latest"""
+        version = VectorIndex.new_version_name()
+        version_path = os.path.join(root_path, version)
+        os.makedirs(version_path, exist_ok=True)
+
+        with open(os.path.join(version_path, TERMS_FILE_NAME), "w") as handle:
+            json.dump(arrays["terms"], handle, ensure_ascii=False)
+        for name, file_name in cls.array_files().items():
+            np.save(os.path.join(version_path, file_name), arrays[name])
+        with open(os.path.join(version_path, META_FILE_NAME), "w") as handle:
+            json.dump(meta, handle)
+
+        VectorIndex.publish(root_path, version)
+
+        print(
+            f"BM25 index: {meta['n_docs']} docs, {meta['n_terms']} terms, "
+            f"{meta['n_postings']} postings"
+        )
+        return cls(root_path, version, arrays, meta)
+
+    @staticmethod
+    def array_files() -> dict:
+        return {
+            "ids": IDS_FILE_NAME,
+            "indptr": INDPTR_FILE_NAME,
+            "posting_docs": POSTING_DOCS_FILE_NAME,
+            "posting_freqs": POSTING_FREQS_FILE_NAME,
+            "max_impacts": MAX_IMPACTS_FILE_NAME,
+            "doc_lengths": DOC_LENGTHS_FILE_NAME,
+        }
+
+    @classmethod
+    def load(cls, root_path: str, version: str = None) -> "BM25Index":
+        """
+        Load an index version (the latest one by default) from disk, the
+        postings are memory-mapped.
+        """
+        if version is None:
+            version = VectorIndex.latest_version(root_path)
+
+        version_path = os.path.join(root_path, version)
+        with open(os.path.join(version_path, META_FILE_NAME)) as handle:
+            meta = json.load(handle)
+
+        if meta["format_version"] != BM25_FORMAT_VERSION:
+            raise ValueError(
+                f"BM25 index at {version_path} has format version "
+                f"{meta['format_version']}, expected {BM25_FORMAT_VERSION}. "
+                "Run src/main.py to rebuild it."
+            )
+
+        arrays = {
+            name: np.load(os.path.join(version_path, file_name), mmap_mode="r")
+            for name, file_name in cls.array_files().items()
+        }
+        with open(os.path.join(version_path, TERMS_FILE_NAME)) as handle:
+            arrays["terms"] = json.load(handle)
+
+        return cls(root_path, version, arrays, meta)
+
+    def postings(self, term_id: int):
+        start, end = self.indptr[term_id], self.indptr[term_id + 1]
+        return self.posting_docs[start:end], self.posting_freqs[start:end]
+
+    def term_scores(self, term_id: int, docs, freqs) -> np.ndarray:
+        freqs = freqs.astype(np.float32)
+        k1 = self.meta["k1"]
+        return self.idf[term_id] * freqs * (k1 + 1) / (freqs + self.doc_norms[docs])
+
+    def search(self, query_text: str, k: int):
+        """
+        The k documents with the highest BM25 score for a query.
+
+        Parameters:
+            query_text (str): Query as entered.
+            k (int): Number of results.
+
+        Returns:
+            Tuple[np.ndarray, List[int]]: Scores and document ids, best first.
+                Documents sharing no term with the query are not returned.
+        """
+        term_ids = {
+            self.term_ids[t] for t in tokenize(query_text) if t in self.term_ids
+        }
+        # highest impact first, so pruning starts as early as possible
+        term_ids = sorted(term_ids, key=lambda t: -self.max_impacts[t])
+        if not term_ids or not len(self.ids):
+            return np.zeros(0, dtype=np.float32), []
+
+        # upper bound of what the terms after each one can still add, and of
+        # the score of any document after it
+        max_impacts = np.array([self.max_impacts[t] for t in term_ids])
+        remaining_impacts = np.append(np.cumsum(max_impacts[::-1])[::-1][1:], 0.0)
+        reached_impacts = np.cumsum(max_impacts)
+
+        # postings are added into a scratch array, only the documents of each
+        # term and the best k + 1 so far are read back: scores only grow, so
+        # the new best are among them
+        all_scores = np.zeros(len(self.ids), dtype=np.float32)
+        top = np.zeros(0, dtype=np.int64)
+        for i, term_id in enumerate(term_ids):
+            docs, freqs = self.postings(term_id)
+            all_scores[docs] += self.term_scores(term_id, docs, freqs)
+
+            # every term of the index has postings, sorted by position
+            found = np.minimum(np.searchsorted(docs, top), len(docs) - 1)
+            top = np.concatenate([top[docs[found] != top], docs])
+            if len(top) > k + 1:
+                top = top[np.argpartition(-all_scores[top], k)[: k + 1]]
+
+            # the k-th score cannot lead the next one by more than the terms
+            # left can add while it is below them
+            if (
+                remaining_impacts[i] == 0
+                or reached_impacts[i] <= remaining_impacts[i]
+                or len(top) <= k
+            ):
+                continue
+
+            top = top[np.argsort(-all_scores[top])]
+            if all_scores[top[k - 1]] - all_scores[top[k]] > remaining_impacts[i]:
+                # the top k set is final, only their scores still change
+                positions, scores = self.score_candidates(
+                    top[:k], all_scores[top[:k]], term_ids[i + 1 :]
+                )
+                break
+        else:
+            positions, scores = top, all_scores[top]
+
+        if len(positions) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            positions, scores = positions[top], scores[top]
+        order = np.lexsort((positions, -scores))
+
+        return scores[order], [int(self.ids[pos]) for pos in positions[order]]
+
+    def score_candidates(self, candidates, scores, term_ids):
+        """Add the scores of the given terms to the candidate documents only"""
+        order = np.argsort(candidates)
+        candidates, scores = candidates[order], scores[order].copy()
+        for term_id in term_ids:
+            docs, freqs = self.postings(term_id)
+            if not len(docs):
+                continue
+            found = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+            hit = docs[found] == candidates
+            scores[hit] += self.term_scores(term_id, candidates[hit], freqs[found[hit]])
+        return candidates, scores
+
+
+def load_latest_bm25_index(root_path: str) -> BM25Index:
+    """
+    Return the latest published BM25 index under root_path, loading it from
+    disk only the first time a version is seen by this process.
+    """
+    version = VectorIndex.latest_version(root_path)
+    key = (root_path, version)
+
+    if key not in _LOADED_BM25_INDEXES:
+        for loaded_key in [k for k in _LOADED_BM25_INDEXES if k[0] == root_path]:
+            del _LOADED_BM25_INDEXES[loaded_key]
+        _LOADED_BM25_INDEXES[key] = BM25Index.load(root_path, version)
+
+    return _LOADED_BM25_INDEXES[key]
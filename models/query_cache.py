@@ -0,0 +1,219 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Returned by `LRUCache.get` on a miss, None may be a cached value
+MISSING = object()
+
+
+def normalize_query(text: str) -> str:
+    """
+    Key form of a query: Unicode NFC and collapsed whitespace. Case is kept,
+    the Word2Vec vocabulary is case sensitive.
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def model_version(model) -> str:
+    """Version of a saved model, changes whenever it is fitted and saved again"""
+    return str(os.stat(model.model_path).st_mtime_ns)
+
+
+class LRUCache:
+    """
+    Thread-safe mapping keeping the `max_entries` most recently used entries,
+    each dropped `ttl_seconds` after it was stored. Counts hits and misses.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (expiry time, value), least recently used first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key):
+        """Cached value of key, `MISSING` if absent or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.entries.pop(key, None)
+                self.misses += 1
+                return MISSING
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value) -> None:
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, predicate) -> None:
+        """Drop every entry whose key matches predicate"""
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                del self.entries[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+        }
+
+
+class QueryCache:
+    """
+    Two-level cache of the search app, keyed by the normalized query text:
+    query vectors per (model name, model version), and ranked document ids
+    per (model name, index versions, k, filters). A repeated query skips the
+    search, and a known query with a new k skips the vectorization.
+
+    Index versions are those of the model index and of any other data the
+    search reads (e.g. the BM25 index of hybrid retrieval). They are taken
+    from the loaded objects the search runs on, so looking up a query reads
+    nothing from disk and results are keyed by the versions that produced
+    them. Versions are part of the keys, so entries of a model or index that
+    has been published again are never hit. They are also dropped as soon as
+    a new version of the same model is seen.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        """
+        Parameters:
+            max_entries (int): Entries kept by each level.
+            ttl_seconds (float): Lifetime of an entry.
+        """
+        self.vectors = LRUCache(max_entries, ttl_seconds)
+        self.results = LRUCache(max_entries, ttl_seconds)
+        # model name -> (model version, index versions...) last seen
+        self.versions = {}
+
+    def check_versions(self, model_name: str, versions: tuple) -> None:
+        """
+        Drop the entries of a model once a new version of it is seen. Query
+        vectors are kept when only the index changed (incremental updates).
+        """
+        last_versions = self.versions.get(model_name, versions)
+        if last_versions[0] != versions[0]:
+            self.vectors.discard(lambda key: key[0] == model_name)
+        if last_versions != versions:
+            self.results.discard(lambda key: key[0] == model_name)
+        self.versions[model_name] = versions
+
+    def ranked_ids(
+        self,
+        model,
+        model_name: str,
+        query_text: str,
+        k: int,
+        search,
+        filters=None,
+        search_versions: tuple = (),
+    ):
+        """
+        Ranked document ids of a query, searched only on a miss.
+
+        Parameters:
+            model: TFIDFModel or Word2VecModel loaded with its `version` and
+                search `index`, see `JurisdictionSearchEngine.model`.
+            model_name (str): Name of the model (the app category).
+            query_text (str): Query as entered.
+            k (int): Number of results.
+            search (Callable): search(query_vector, k) -> ranked ids.
+            filters (tuple): Parsed filters the search applies.
+            search_versions (tuple): Versions of other loaded data the
+                search reads besides the model index.
+
+        Returns:
+            List[int]: Ranked document ids.
+        """
+        query = normalize_query(query_text)
+        versions = (model.version, model.index.version, *search_versions)
+        self.check_versions(model_name, versions)
+
+        results_key = (model_name, versions[1:], query, k, filters)
+        ranked_ids = self.results.get(results_key)
+        if ranked_ids is not MISSING:
+            return list(ranked_ids)
+
+        vector_key = (model_name, versions[0], query)
+        query_vector = self.vectors.get(vector_key)
+        if query_vector is MISSING:
+            query_vector = model.get_query_vector(query)
+            self.vectors.put(vector_key, query_vector)
+
+        ranked_ids = tuple(int(i) for i in search(query_vector, k))
+        self.results.put(results_key, ranked_ids)
+        return list(ranked_ids)
+
+    def ranked_ids_many(
+        self,
+        model,
+        model_name: str,
+        query_texts: list,
+        k: int,
+        search_many,
+        filters=None,
+        search_versions: tuple = (),
+    ):
+        """
+        Ranked document ids of several queries. The queries missing from the
+        results level are vectorized together and searched in one call, their
+        vectors are not cached.
+
+        Parameters:
+            model: TFIDFModel or Word2VecModel loaded with its `version` and
+                search `index`, see `JurisdictionSearchEngine.model`.
+            model_name (str): Name of the model.
+            query_texts (List[str]): Queries as entered.
+            k (int): Number of results per query.
+            search_many (Callable): search_many(query_texts, query_vectors,
+                k) -> ranked ids of each query.
+            filters (tuple): Parsed filters the search applies.
+            search_versions (tuple): Versions of other loaded data the
+                search reads besides the model index.
+
+        Returns:
+            List[List[int]]: Ranked document ids of each query.
+        """
+        queries = [normalize_query(text) for text in query_texts]
+        versions = (model.version, model.index.version, *search_versions)
+        self.check_versions(model_name, versions)
+
+        found = {}
+        for query in queries:
+            if query not in found:
+                found[query] = self.results.get(
+                    (model_name, versions[1:], query, k, filters)
+                )
+
+        missing = [query for query, ids in found.items() if ids is MISSING]
+        if missing:
+            query_vectors = model.get_query_vectors(missing)
+            ranked_ids_missing = search_many(missing, query_vectors, k)
+            for query, ranked_ids in zip(missing, ranked_ids_missing):
+                found[query] = tuple(int(i) for i in ranked_ids)
+                self.results.put(
+                    (model_name, versions[1:], query, k, filters), found[query]
+                )
+
+        return [list(found[query]) for query in queries]
+
+    def stats(self) -> dict:
+        """Hit and miss counters of each level"""
+        return {"vectors": self.vectors.stats(), "results": self.results.stats()}
@@ -0,0 +1,139 @@
+import re
+
+import numpy as np
+
+# Columns of the sentence table that searches can be filtered on
+FILTER_COLUMNS = ["doc_date", "first_verdict", "last_verdict", "legal_costs"]
+
+# Codes of the values extracted by JurisdictionPreprocessor, stored as uint8.
+# 0 stands for a value that was not found
+VERDICT_CODES = {"D": 1, "EP": 2, "E": 3}
+LEGAL_COSTS_CODES = {"NC": 1, "C1": 2, "C2": 3, "C1C2": 4}
+COLUMN_CODES = {
+    "first_verdict": VERDICT_CODES,
+    "last_verdict": VERDICT_CODES,
+    "legal_costs": LEGAL_COSTS_CODES,
+}
+# `"legal_costs": true / false` in a request
+WITH_COSTS = ["C1", "C2", "C1C2"]
+WITHOUT_COSTS = ["NC"]
+
+# Filter keys of a search request, dates are inclusive bounds of doc_date
+DATE_FILTERS = ["date_from", "date_to"]
+FILTER_KEYS = DATE_FILTERS + list(COLUMN_CODES)
+
+# Sentence dates are stored as dd/mm/yyyy, requests may also use yyyy-mm-dd
+DATE_PATTERNS = [
+    (re.compile(r"^(\d{2})/(\d{2})/(\d{4})$"), (3, 2, 1)),
+    (re.compile(r"^(\d{4})-(\d{2})-(\d{2})$"), (1, 2, 3)),
+]
+
+
+def date_key(text) -> int:
+    """yyyymmdd integer of a date, comparable in order. 0 if not a date"""
+    for pattern, (year, month, day) in DATE_PATTERNS:
+        match = pattern.match(str(text or "").strip())
+        if match:
+            return int(match.group(year) + match.group(month) + match.group(day))
+    return 0
+
+
+def encode_attributes(columns: dict) -> dict:
+    """
+    Compact arrays of the filter columns of some documents, stored with their
+    search index.
+
+    Parameters:
+        columns (dict): Column -> values of each document, as read from the
+            sentence table.
+
+    Returns:
+        dict: Column -> np.ndarray, int32 yyyymmdd dates and uint8 codes.
+    """
+    attributes = {
+        "doc_date": np.array(
+            [date_key(value) for value in columns["doc_date"]], dtype=np.int32
+        )
+    }
+    for column, codes in COLUMN_CODES.items():
+        attributes[column] = np.array(
+            [codes.get(value, 0) for value in columns[column]], dtype=np.uint8
+        )
+    return attributes
+
+
+def sentence_attributes(data, ids) -> dict:
+    """
+    Encoded filter columns of the documents of a SentenceCorpus, in the order
+    of ids. None for data not read from the sentence table (e.g. a list).
+    """
+    if not hasattr(data, "attributes"):
+        return None
+    return encode_attributes(data.attributes(ids, FILTER_COLUMNS))
+
+
+def parse_filters(filters) -> tuple:
+    """
+    Validate the filters of a search request.
+
+    Parameters:
+        filters (dict): Any of
+            date_from, date_to (str): yyyy-mm-dd or dd/mm/yyyy, inclusive.
+            first_verdict, last_verdict (str or List[str]): D, EP or E.
+            legal_costs (bool, str or List[str]): NC, C1, C2 or C1C2. true
+                for any costs imposed, false for none.
+
+    Returns:
+        tuple: Sorted (key, value) pairs, hashable to key caches. None when
+            there is no filter.
+    """
+    if not filters:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+
+    parsed = []
+    for key, value in filters.items():
+        if key in DATE_FILTERS:
+            value = date_key(value)
+            if not value:
+                raise ValueError(f"{key} must be a yyyy-mm-dd date")
+
+        elif key in COLUMN_CODES:
+            if key == "legal_costs" and isinstance(value, bool):
+                value = WITH_COSTS if value else WITHOUT_COSTS
+            codes = COLUMN_CODES[key]
+            values = [value] if isinstance(value, str) else value
+
+            if (
+                not isinstance(values, list)
+                or not values
+                or not all(isinstance(v, str) and v in codes for v in values)
+            ):
+                raise ValueError(f"{key} must be one or more of: {', '.join(codes)}")
+            value = tuple(sorted({codes[v] for v in values}))
+
+        else:
+            raise ValueError(
+                f"Unknown filter '{key}'. Use any of: {', '.join(FILTER_KEYS)}."
+            )
+
+        parsed.append((key, value))
+
+    return tuple(sorted(parsed))
+
+
+def filter_mask(attributes: dict, filters: tuple) -> np.ndarray:
+    """Boolean mask of the documents matching all parsed filters"""
+    mask = np.ones(len(attributes["doc_date"]), dtype=bool)
+
+    for key, value in filters:
+        if key == "date_from":
+            mask &= attributes["doc_date"] >= value
+        elif key == "date_to":
+            # unknown dates (0) are before any date_from, drop them here too
+            mask &= (attributes["doc_date"] <= value) & (attributes["doc_date"] > 0)
+        else:
+            mask &= np.isin(attributes[key], value)
+
+    return mask
@@ -2,34 +2,42 @@ import os
 import pickle
 
 import numpy as np
-from scipy.sparse import csr_matrix
-from sklearn.feature_extraction.text import TfidfVectorizer
+from scipy.sparse import save_npz
 
-from scripts.data_processing.data_preprocessor import JurisdictionPreprocessor
 from scripts.data_processing.data_storage import JurisdictionDataBaseManager
 
-from .utils import CONFIG_PATH, read_config
+from .sentence_filters import sentence_attributes
+from .utils import CONFIG_PATH, oov_ratio, read_config
+from .vector_index import build_index, load_latest_index
 
 
 class TFIDFModel:
     def __init__(self):
-        self.processor = JurisdictionPreprocessor()
-        self.paths = read_config(CONFIG_PATH)["general"]
+        config = read_config(CONFIG_PATH)
+        self.paths = config["general"]
         # Read model parameter configuration
-        self.params = read_config(CONFIG_PATH)["tfidf"]
+        self.params = config["tfidf"]
 
         self.model_path = os.path.join(
             self.paths["model_path"], self.params["model_file_name"]
         )
+        self.index_path = os.path.join(
+            self.paths["index_path"], self.params["index_name"]
+        )
+
+    def fit_and_save(self, data, to_save=True, table_path=None, ids=None):
+        from sklearn.feature_extraction.text import TfidfVectorizer
 
-    def fit_and_save(self, data, to_save=True, table_path=None):
         # Create TFIDF matrix and model
         self.vectorizer = TfidfVectorizer(
             max_df=self.params["max_ratio"],
             min_df=self.params["min_ratio"],
             max_features=self.params["max_dim"],
+            dtype=np.dtype(self.params["dtype"]),
         )
 
+        # data is streamed once, only the vocabulary and the sparse matrix are
+        # held in memory (data may be a list or a SentenceCorpus)
         self.tfidf_vectors = self.vectorizer.fit_transform(data)
 
         if to_save:
@@ -37,26 +45,76 @@ class TFIDFModel:
             with open(self.model_path, "wb") as handle:
                 pickle.dump(self.vectorizer, handle)
 
-            # save vectors
+            # save vectors, kept in sparse CSR format
             vec_out = os.path.join(
                 self.paths["embedding_path"], self.params["vectors_file_name"]
             )
-            embeddings = np.array(self.tfidf_vectors)
-            np.save(vec_out, embeddings)
+            save_npz(vec_out, self.tfidf_vectors)
+
+            # publish a prebuilt search index for the app to load
+            if ids is None:
+                ids = np.arange(1, self.tfidf_vectors.shape[0] + 1)
+            fit_stats = {
+                "fit_oov_ratio": self.oov_ratio(data),
+                "corpus_version": getattr(data, "version", None),
+            }
+            build_index(
+                self.index_path,
+                self.tfidf_vectors,
+                ids,
+                fit_stats=fit_stats,
+                index_params=self.params["index"],
+                attributes=sentence_attributes(data, ids),
+            )
 
             if table_path:
-                sparse_vectors = csr_matrix(embeddings.all())
-                dense_vectors = sparse_vectors.toarray()
-                # format adequately to insert into db
-                dense_vector_list = [[vec.tolist()] for vec in dense_vectors]
-                # save vectors into pgvector data base
+                # save vectors into pgvector data base, replacing old ones
                 db_manager = JurisdictionDataBaseManager()
-                db_manager("pgvector", table_path, dense_vector_list)
+                db_manager.bulk_load_vectors(
+                    table_path,
+                    ids,
+                    self.tfidf_vectors,
+                    recreate=True,
+                    staging=self.paths["pgvector_load"]["staging"],
+                    index_params=self.paths["pgvector_index"],
+                    chunk_rows=self.paths["pgvector_load"]["chunk_rows"],
+                )
+
+    def update_and_save(self, data, ids, table_path=None):
+        """
+        Embed new documents with the frozen vectorizer and append them to the
+        search index (and pgvector table) without refitting.
+        """
+        new_vectors = self.vectorizer.transform(data)
+
+        self.load_index().append(
+            new_vectors, ids, attributes=sentence_attributes(data, ids)
+        )
+
+        if table_path:
+            db_manager = JurisdictionDataBaseManager()
+            db_manager.bulk_load_vectors(
+                table_path,
+                ids,
+                new_vectors,
+                chunk_rows=self.paths["pgvector_load"]["chunk_rows"],
+            )
 
     def load(self):
         with open(self.model_path, "rb") as handle:
             self.vectorizer = pickle.load(handle)
 
+    def load_index(self):
+        return load_latest_index(self.index_path)
+
+    def oov_ratio(self, data):
+        analyzer = self.vectorizer.build_analyzer()
+        return oov_ratio(map(analyzer, data), self.vectorizer.vocabulary_)
+
     def get_query_vector(self, query_text):
-        query_embedding = self.vectorizer.transform([query_text]).toarray()
-        return query_embedding
+        # sparse (1 x max_dim) CSR row, indexes accept both sparse and dense
+        return self.get_query_vectors([query_text])
+
+    def get_query_vectors(self, query_texts):
+        # sparse (n_queries x max_dim) CSR matrix, vectorized at once
+        return self.vectorizer.transform(query_texts)
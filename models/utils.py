@@ -1,9 +1,66 @@
+from itertools import islice
+
 import yaml
 
 CONFIG_PATH = "models/config.yaml"
 
+# Documents looked at to estimate the out-of-vocabulary ratio of a corpus
+OOV_SAMPLE_SIZE = 1000
+
 
 def read_config(path):
     with open(path) as fh:
         config = yaml.load(fh.read(), Loader=yaml.FullLoader)
     return config
+
+
+def iter_chunks(iterable, chunk_size):
+    """Yield lists of up to chunk_size consecutive items of iterable"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def oov_ratio(token_lists, vocabulary) -> float:
+    """
+    Share of tokens (over a sample of documents) not found in vocabulary.
+
+    Parameters:
+        token_lists (Iterable[List[str]]): Tokens of each document.
+        vocabulary (Container[str]): Vocabulary known by the model.
+
+    Returns:
+        float: Out-of-vocabulary ratio, 0 when there are no tokens.
+    """
+    n_tokens = n_oov = 0
+    for tokens in islice(token_lists, OOV_SAMPLE_SIZE):
+        n_tokens += len(tokens)
+        n_oov += sum(1 for token in tokens if token not in vocabulary)
+
+    return n_oov / n_tokens if n_tokens else 0.0
+
+
+def needs_full_refit(index, n_new, new_oov_ratio, thresholds) -> bool:
+    """
+    Decide whether new documents can be appended to an index with the frozen
+    model or the model has to be refitted over the whole corpus.
+
+    Parameters:
+        index (VectorIndex): Latest published index of the model.
+        n_new (int): Number of documents waiting to be added.
+        new_oov_ratio (float): Out-of-vocabulary ratio of the new documents.
+        thresholds (dict): `incremental` section of the config file.
+
+    Returns:
+        bool: True if a full refit is needed.
+    """
+    growth_ratio = (len(index) + n_new - index.n_fitted) / max(index.n_fitted, 1)
+    oov_drift = new_oov_ratio - index.meta.get("fit_oov_ratio", 0.0)
+
+    return (
+        growth_ratio > thresholds["max_growth_ratio"]
+        or oov_drift > thresholds["max_oov_drift"]
+    )
@@ -0,0 +1,973 @@
+import json
+import os
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+import numpy as np
+from scipy.sparse import csr_matrix, issparse, load_npz, save_npz, vstack
+
+from .sentence_filters import filter_mask
+
+# NOTE: faiss and sklearn are imported on first use, they are slow to import
+# and loading a sparse index needs neither of them
+if TYPE_CHECKING:
+    import faiss
+
+# Bump whenever the on-disk layout of an index version changes
+INDEX_FORMAT_VERSION = 1
+
+# Files that make up one published index version
+LATEST_POINTER_FILE = "LATEST"
+INDEX_FILE_NAME = "index.faiss"
+IDS_FILE_NAME = "ids.npy"
+VECTORS_FILE_NAME = "vectors.npy"
+SPARSE_VECTORS_FILE_NAME = "vectors.npz"
+ATTRIBUTES_FILE_NAME = "attributes.npz"
+META_FILE_NAME = "meta.json"
+
+# Filters matching at most this many documents are searched exactly over the
+# matches alone, instead of through the index with a selector
+FILTER_EXACT_MAX_DOCS = 5000
+# Vectors scored at once by exact searches
+EXACT_SEARCH_CHUNK_ROWS = 20000
+# Filter masks kept by each loaded index
+MAX_CACHED_FILTER_MASKS = 64
+
+# Fewest bits per PQ sub-quantizer code: smaller training sets fall back to
+# SQ8 codes. Each sub-quantizer trains 2**nbits centroids, one vector at least
+# per centroid
+MIN_PQ_NBITS = 4
+
+# Indexes already loaded by this process, keyed by (root path, version)
+_LOADED_INDEXES = {}
+
+
+def normalize_embeddings(embeddings) -> np.ndarray:
+    """Return float32 L2-normalized rows (cosine similarity == inner product)"""
+    if issparse(embeddings):
+        embeddings = embeddings.toarray()
+
+    embeddings = np.atleast_2d(np.ascontiguousarray(embeddings, dtype=np.float32))
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    # all-zero rows (empty documents) are kept as they are
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+# Exact index used when no index parameters are configured
+FLAT_INDEX_PARAMS = {"type": "flat"}
+
+
+def normalize_sparse_embeddings(embeddings):
+    """Return float32 L2-normalized rows of a sparse matrix, in CSR format"""
+    from sklearn.preprocessing import normalize
+
+    return normalize(embeddings.tocsr().astype(np.float32), norm="l2", copy=False)
+
+
+def faiss_factory_string(params: dict, n_vectors: int) -> str:
+    """Translate the `index` section of the model config to a FAISS factory"""
+    index_type = params["type"]
+
+    # IVF needs at least one training vector per cluster
+    nlist = min(params.get("nlist", 1), max(n_vectors, 1))
+
+    if index_type == "flat":
+        return "Flat"
+    elif index_type == "sq8":
+        return "SQ8"
+    elif index_type == "pq":
+        return pq_factory_string(params, n_vectors)
+    elif index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    elif index_type == "ivf_sq8":
+        return f"IVF{nlist},SQ8"
+    elif index_type == "ivf_pq":
+        return f"IVF{nlist},{pq_factory_string(params, n_vectors)}"
+    elif index_type == "hnsw":
+        return f"HNSW{params['hnsw_m']}"
+
+    raise ValueError(
+        f"Unknown index type '{index_type}'. "
+        "Use one of: flat, sq8, pq, ivf_flat, ivf_sq8, ivf_pq, hnsw."
+    )
+
+
+def pq_factory_string(params: dict, n_vectors: int) -> str:
+    """
+    PQ codes of the index params, with fewer bits per code when there are
+    not enough vectors to train 2**pq_nbits centroids, or SQ8 codes when even
+    MIN_PQ_NBITS bits are too many.
+    """
+    pq_m, pq_nbits = params["pq_m"], params["pq_nbits"]
+    if n_vectors >= 2**pq_nbits:
+        return f"PQ{pq_m}x{pq_nbits}"
+
+    nbits = int(np.log2(max(n_vectors, 1)))
+    if nbits >= MIN_PQ_NBITS:
+        print(
+            f"WARNING: {n_vectors} vectors are too few to train PQ codes of "
+            f"{pq_nbits} bits, using {nbits} bits"
+        )
+        return f"PQ{pq_m}x{nbits}"
+
+    print(
+        f"WARNING: {n_vectors} vectors are too few to train PQ codes of "
+        f"{MIN_PQ_NBITS} bits or more, using SQ8 codes"
+    )
+    return "SQ8"
+
+
+def rescore_candidates(params: dict) -> int:
+    """Candidates rescored exactly per query, 0 for exact flat indexes"""
+    if params["type"] == "flat":
+        return 0
+    return params.get("rescore", 0)
+
+
+def set_search_params(index: "faiss.Index", params: dict) -> None:
+    """Apply the query-time knobs (nprobe / efSearch) of the index params"""
+    import faiss
+
+    if params["type"].startswith("ivf"):
+        faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+    elif params["type"] == "hnsw":
+        index.hnsw.efSearch = params["ef_search"]
+
+
+def build_faiss_index(embeddings: np.ndarray, params: dict = None) -> "faiss.Index":
+    """
+    Build (and train, for IVF types) the FAISS index described by params.
+
+    Parameters:
+        embeddings (np.ndarray): Normalized float32 matrix to index.
+        params (dict): `index` section of the model config, exact flat
+            index if not given.
+
+    Returns:
+        faiss.Index: Cosine similarity (inner product) index of embeddings.
+    """
+    import faiss
+
+    params = params or FLAT_INDEX_PARAMS
+
+    factory_string = faiss_factory_string(params, embeddings.shape[0])
+    index = faiss.index_factory(
+        embeddings.shape[1], factory_string, faiss.METRIC_INNER_PRODUCT
+    )
+
+    if params["type"] == "hnsw":
+        index.hnsw.efConstruction = params["ef_construction"]
+
+    if not index.is_trained:
+        index.train(embeddings)
+
+    index.add(embeddings)
+    set_search_params(index, params)
+
+    return index
+
+
+def rescored_search(
+    index: "faiss.Index",
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    rescore: int,
+    search_params=None,
+):
+    """
+    Search the index for `rescore` candidates per query and rank them again
+    by their exact similarity to the query, keeping the k best. Lossy indexes
+    (quantized codes, approximate graphs) select the candidates and only
+    those rows of the float32 vectors are read, so `vectors` may be
+    memory-mapped.
+
+    Parameters:
+        index (faiss.Index): Index over `vectors`.
+        vectors (np.ndarray): Normalized float32 vectors, in index order.
+        queries (np.ndarray): Normalized float32 queries.
+        k (int): Number of results per query.
+        rescore (int): Candidates rescored per query, no rescoring if not
+            above k.
+        search_params (faiss.SearchParameters): e.g. a selector of the
+            positions to search.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Scores and index positions of shape
+            (n_queries, k), padded with -inf / -1 like FAISS.
+    """
+    if rescore <= k:
+        return index.search(queries, k, params=search_params)
+
+    _, candidates = index.search(queries, rescore, params=search_params)
+
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    positions = np.full((len(queries), k), -1, dtype=np.int64)
+    for row, (query, row_candidates) in enumerate(zip(queries, candidates)):
+        # sorted positions read the memory-mapped rows in file order
+        row_candidates = np.sort(row_candidates[row_candidates != -1])
+        exact_scores = vectors[row_candidates] @ query
+
+        best = np.argsort(-exact_scores, kind="stable")[:k]
+        scores[row, : len(best)] = exact_scores[best]
+        positions[row, : len(best)] = row_candidates[best]
+
+    return scores, positions
+
+
+def selector_search_params(params: dict, mask: np.ndarray):
+    """
+    FAISS search parameters restricting a search to the positions set in
+    mask, with the query-time knobs of the index params. None for index types
+    that take no selector (pq).
+
+    Returns:
+        Tuple[faiss.SearchParameters, np.ndarray]: Parameters and the bitmap
+            they point to, which must be kept alive while searching.
+    """
+    import faiss
+
+    if params["type"] == "pq":
+        return None, None
+
+    bitmap = np.packbits(mask, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+
+    # parameters given at search time replace the ones set on the index
+    if params["type"].startswith("ivf"):
+        search_params = faiss.SearchParametersIVF(sel=selector, nprobe=params["nprobe"])
+    elif params["type"] == "hnsw":
+        search_params = faiss.SearchParametersHNSW(
+            sel=selector, efSearch=params["ef_search"]
+        )
+    else:
+        search_params = faiss.SearchParameters(sel=selector)
+
+    return search_params, bitmap
+
+
+def exact_search(vectors, queries: np.ndarray, positions: np.ndarray, k: int):
+    """
+    Exact top k of each query among the vectors at the given (sorted)
+    positions, read in chunks.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Scores and index positions of shape
+            (n_queries, k), padded with -inf / -1 like FAISS.
+    """
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best = np.full((len(queries), k), -1, dtype=np.int64)
+
+    for start in range(0, len(positions), EXACT_SEARCH_CHUNK_ROWS):
+        chunk = positions[start : start + EXACT_SEARCH_CHUNK_ROWS]
+        chunk_scores = queries @ np.asarray(vectors[chunk], dtype=np.float32).T
+
+        all_scores = np.hstack([scores, chunk_scores])
+        all_positions = np.hstack([best, np.broadcast_to(chunk, chunk_scores.shape)])
+        top = np.argsort(-all_scores, axis=1, kind="stable")[:, :k]
+        scores = np.take_along_axis(all_scores, top, axis=1)
+        best = np.take_along_axis(all_positions, top, axis=1)
+
+    return scores, best
+
+
+def evaluate_recall(
+    index: "faiss.Index", vectors: np.ndarray, k: int, n_queries: int, rescore=0
+):
+    """
+    Measure recall@k and per-query latency of index against an exact search,
+    using a sample of the indexed vectors as queries. With `rescore`, the
+    candidates of the index are ranked again exactly, as searches do.
+
+    Returns:
+        dict: `recall_at_k`, `k`, and `approx_ms` / `exact_ms` per query.
+    """
+    import faiss
+
+    rng = np.random.default_rng(0)
+    n_queries = min(n_queries, vectors.shape[0])
+    queries = vectors[rng.choice(vectors.shape[0], n_queries, replace=False)]
+    k = min(k, vectors.shape[0])
+
+    start = time.perf_counter()
+    _, exact = faiss.knn(queries, vectors, k, metric=faiss.METRIC_INNER_PRODUCT)
+    exact_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+    start = time.perf_counter()
+    _, approx = rescored_search(index, vectors, queries, k, rescore)
+    approx_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+    hits = sum(len(set(a) & set(e)) for a, e in zip(approx, exact))
+
+    return {
+        "k": int(k),
+        "recall_at_k": hits / (n_queries * k),
+        "approx_ms": approx_ms,
+        "exact_ms": exact_ms,
+    }
+
+
+def read_faiss_index(path: str) -> "faiss.Index":
+    """Read a FAISS index memory-mapping it when the index type allows it"""
+    import faiss
+
+    mmap_flags = [
+        getattr(faiss, "IO_FLAG_MMAP_IFC", None),
+        getattr(faiss, "IO_FLAG_MMAP", None),
+    ]
+    for flag in mmap_flags:
+        if flag is None:
+            continue
+        try:
+            return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            continue
+
+    return faiss.read_index(path)
+
+
+class VectorIndex:
+    """
+    Versioned, on-disk similarity index of document embeddings.
+
+    Each call to `build` publishes a new version directory under `root_path`
+    holding the normalized float32 vectors, the FAISS index built on them and
+    the map from index position to document id. The `LATEST` pointer file is
+    swapped atomically once the version is complete, so readers never see a
+    half-written index.
+
+    Compressed index types (sq8, pq, ivf_sq8, ivf_pq) only keep their codes
+    in memory. With `rescore` set in the index params, their top candidates
+    are ranked again with the float32 vectors, memory-mapped from disk.
+
+    Versions built with the filter columns of their documents (date, verdicts
+    and legal costs) store them as small arrays, so searches can be
+    restricted to the matching documents without reading the database.
+    """
+
+    def __init__(self, root_path: str, version: str, index, ids, meta: dict):
+        self.root_path = root_path
+        self.version = version
+        self.index = index
+        self.ids = ids
+        self.meta = meta
+        # memory-mapped on the first rescored search
+        self.vectors = None
+        # ids sort order, computed on the first re-ranking
+        self.id_order = None
+        # filter columns of each document, loaded on the first filtered search
+        self.attributes = None
+        self.filter_masks = {}
+
+    @property
+    def version_path(self) -> str:
+        return os.path.join(self.root_path, self.version)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def n_fitted(self) -> int:
+        """Number of documents the model behind this index was fitted on"""
+        return self.meta.get("n_fitted", self.meta["n_vectors"])
+
+    @property
+    def last_id(self) -> int:
+        return int(self.ids.max()) if len(self.ids) else 0
+
+    @classmethod
+    def build(
+        cls,
+        root_path: str,
+        embeddings,
+        ids,
+        fit_stats: dict = None,
+        index_params: dict = None,
+        attributes: dict = None,
+    ) -> "VectorIndex":
+        """
+        Normalize the embeddings, build their index and publish it as the
+        latest version under root_path.
+
+        Parameters:
+            root_path (str): Directory holding all versions of this index.
+            embeddings (array-like): Matrix of shape (n_docs, dim).
+            ids (array-like): Document id of each embedding row.
+            fit_stats (dict): Statistics of the model fit kept in the index
+                metadata (e.g. `fit_oov_ratio`), used to detect drift.
+            index_params (dict): `index` section of the model config. Exact
+                flat index if not given.
+            attributes (dict): Filter columns of each document, see
+                `sentence_filters.encode_attributes`. Searches of an index
+                without them cannot be filtered.
+
+        Returns:
+            VectorIndex: The newly published index.
+        """
+        vectors = normalize_embeddings(embeddings)
+        ids = cls.check_ids(ids, vectors)
+
+        index_params = index_params or FLAT_INDEX_PARAMS
+        index = build_faiss_index(vectors, index_params)
+
+        meta = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "n_vectors": int(vectors.shape[0]),
+            "n_fitted": int(vectors.shape[0]),
+            "dim": int(vectors.shape[1]),
+            "metric": "inner_product",
+            "index_params": index_params,
+            **(fit_stats or {}),
+        }
+
+        # report the latency/recall trade-off of approximate index types
+        if index_params["type"] != "flat":
+            meta["recall"] = evaluate_recall(
+                index,
+                vectors,
+                index_params["recall_k"],
+                index_params["recall_queries"],
+                rescore=rescore_candidates(index_params),
+            )
+            print(
+                f"{index_params['type']} index recall@{meta['recall']['k']}: "
+                f"{meta['recall']['recall_at_k']:.3f} "
+                f"({meta['recall']['approx_ms']:.3f} ms/query vs "
+                f"{meta['recall']['exact_ms']:.3f} ms/query exact)"
+            )
+
+        vector_index = cls.write_version(
+            root_path, vectors, ids, index, meta, attributes
+        )
+        print(
+            f"{index_params['type']} index: "
+            f"{vector_index.meta['index_bytes'] / 1e6:.1f} MB in memory, "
+            f"{vector_index.meta['vectors_bytes'] / 1e6:.1f} MB of float32 "
+            "vectors on disk"
+        )
+
+        return vector_index
+
+    def append(self, embeddings, ids, attributes: dict = None) -> "VectorIndex":
+        """
+        Publish a new version made of this index plus the given embeddings,
+        without rebuilding what is already indexed.
+
+        Parameters:
+            embeddings (array-like): Matrix of shape (n_new_docs, dim) computed
+                with the same (frozen) model as the indexed vectors.
+            ids (array-like): Document id of each new embedding row.
+            attributes (dict): Filter columns of each new document.
+
+        Returns:
+            VectorIndex: The newly published index.
+        """
+        import faiss
+
+        new_vectors = normalize_embeddings(embeddings)
+        new_ids = self.check_ids(ids, new_vectors)
+
+        # a memory-mapped index is read-only, read a writable copy to extend
+        # IVF types keep their trained clusters, new vectors are just assigned
+        index = faiss.read_index(os.path.join(self.version_path, INDEX_FILE_NAME))
+        index.add(new_vectors)
+
+        vectors = np.concatenate([self.load_vectors(), new_vectors])
+        ids = np.concatenate([self.ids, new_ids])
+
+        meta = dict(self.meta, n_vectors=int(vectors.shape[0]))
+
+        return self.write_version(
+            self.root_path,
+            vectors,
+            ids,
+            index,
+            meta,
+            self.append_attributes(attributes),
+        )
+
+    @classmethod
+    def write_version(
+        cls, root_path, vectors, ids, index, meta, attributes=None
+    ) -> "VectorIndex":
+        """Write all files of a new version and publish it as the latest"""
+        import faiss
+
+        version = cls.new_version_name()
+        version_path = os.path.join(root_path, version)
+        os.makedirs(version_path, exist_ok=True)
+
+        np.save(os.path.join(version_path, VECTORS_FILE_NAME), vectors)
+        np.save(os.path.join(version_path, IDS_FILE_NAME), ids)
+        cls.write_attributes(version_path, attributes, ids)
+        faiss.write_index(index, os.path.join(version_path, INDEX_FILE_NAME))
+
+        # footprint of the index loaded for searching, and of the vectors only
+        # read (memory-mapped) to rescore candidates
+        meta = dict(
+            meta,
+            index_bytes=os.path.getsize(os.path.join(version_path, INDEX_FILE_NAME)),
+            vectors_bytes=int(vectors.nbytes),
+        )
+        with open(os.path.join(version_path, META_FILE_NAME), "w") as handle:
+            json.dump(meta, handle)
+
+        cls.publish(root_path, version)
+
+        return cls(root_path, version, index, ids, meta)
+
+    @classmethod
+    def load(cls, root_path: str, version: str = None) -> "VectorIndex":
+        """
+        Load an index version (the latest one by default) from disk.
+        Vectors and ids are memory-mapped instead of read into memory.
+        """
+        if version is None:
+            version = cls.latest_version(root_path)
+
+        version_path = os.path.join(root_path, version)
+
+        meta = cls.read_meta(version_path)
+
+        ids = np.load(os.path.join(version_path, IDS_FILE_NAME), mmap_mode="r")
+        index = read_faiss_index(os.path.join(version_path, INDEX_FILE_NAME))
+        set_search_params(index, meta.get("index_params", FLAT_INDEX_PARAMS))
+
+        return cls(root_path, version, index, ids, meta)
+
+    def load_vectors(self) -> np.ndarray:
+        """Memory-map the normalized vectors stored with this version"""
+        return np.load(
+            os.path.join(self.version_path, VECTORS_FILE_NAME), mmap_mode="r"
+        )
+
+    @staticmethod
+    def write_attributes(version_path: str, attributes: dict, ids) -> None:
+        if attributes is None:
+            return
+
+        for column, values in attributes.items():
+            if len(values) != len(ids):
+                raise ValueError(
+                    f"Got {len(values)} {column} values for {len(ids)} documents"
+                )
+        np.savez(os.path.join(version_path, ATTRIBUTES_FILE_NAME), **attributes)
+
+    def load_attributes(self) -> dict:
+        """Filter columns stored with this version, None if there are none"""
+        path = os.path.join(self.version_path, ATTRIBUTES_FILE_NAME)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as attributes:
+            return dict(attributes)
+
+    def append_attributes(self, new_attributes: dict) -> dict:
+        """
+        Filter columns of this index followed by the new ones. None if either
+        is missing, the appended version cannot be filtered until a refit.
+        """
+        attributes = self.load_attributes()
+        if attributes is None or new_attributes is None:
+            return None
+        return {
+            column: np.concatenate([values, new_attributes[column]])
+            for column, values in attributes.items()
+        }
+
+    def filter_mask(self, filters: tuple) -> np.ndarray:
+        """Mask of the positions matching parsed filters, cached per filters"""
+        mask = self.filter_masks.get(filters)
+        if mask is not None:
+            return mask
+
+        if self.attributes is None:
+            self.attributes = self.load_attributes()
+            if self.attributes is None:
+                raise ValueError(
+                    f"Index at {self.version_path} holds no attributes to filter "
+                    "on. Refit the models to rebuild it."
+                )
+
+        mask = filter_mask(self.attributes, filters)
+        if len(self.filter_masks) >= MAX_CACHED_FILTER_MASKS:
+            self.filter_masks.clear()
+        self.filter_masks[filters] = mask
+        return mask
+
+    def search(self, query_vectors, k: int, filters: tuple = None):
+        """
+        Search the k most similar documents for each query vector.
+
+        Parameters:
+            query_vectors (array-like): Matrix of shape (n_queries, dim).
+            k (int): Number of results per query.
+            filters (tuple): Parsed filters (`sentence_filters.parse_filters`)
+                the results must match.
+
+        Returns:
+            Tuple[np.ndarray, List[List[int]]]: Similarity scores and ranked
+                document ids for each query.
+        """
+        queries = normalize_embeddings(query_vectors)
+
+        if filters:
+            scores, positions = self.filtered_search(queries, k, filters)
+        else:
+            rescore = rescore_candidates(
+                self.meta.get("index_params", FLAT_INDEX_PARAMS)
+            )
+            if rescore > k and self.vectors is None:
+                self.vectors = self.load_vectors()
+
+            scores, positions = rescored_search(
+                self.index, self.vectors, queries, k, rescore
+            )
+
+        # FAISS pads with -1 when there are less than k results
+        ranked_ids = [
+            [int(self.ids[pos]) for pos in row if pos != -1] for row in positions
+        ]
+        return scores, ranked_ids
+
+    def filtered_search(self, queries: np.ndarray, k: int, filters: tuple):
+        """
+        Search only the documents matching filters: exactly when they are
+        few, otherwise through the index with a selector of their positions.
+        Index types without selectors (pq) search more candidates instead,
+        enough for k of them to match on average, and drop the others.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Scores and index positions of shape
+                (n_queries, k), padded with -inf / -1 like FAISS.
+        """
+        params = self.meta.get("index_params", FLAT_INDEX_PARAMS)
+        mask = self.filter_mask(filters)
+        matches = np.flatnonzero(mask)
+        if self.vectors is None:
+            self.vectors = self.load_vectors()
+
+        if len(matches) <= FILTER_EXACT_MAX_DOCS:
+            return exact_search(self.vectors, queries, matches, k)
+
+        rescore = rescore_candidates(params)
+        search_params, bitmap = selector_search_params(params, mask)
+        if search_params is not None:
+            scores, positions = rescored_search(
+                self.index, self.vectors, queries, k, rescore, search_params
+            )
+        else:
+            n_candidates = max(rescore, k)
+            oversample = int(np.ceil(2 * len(mask) / len(matches)))
+            _, candidates = self.index.search(queries, n_candidates * oversample)
+
+            scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+            positions = np.full((len(queries), k), -1, dtype=np.int64)
+            for row, (query, row_candidates) in enumerate(zip(queries, candidates)):
+                row_candidates = row_candidates[row_candidates != -1]
+                kept = np.sort(row_candidates[mask[row_candidates]][:n_candidates])
+                row_scores, row_best = exact_search(self.vectors, query[None], kept, k)
+                scores[row], positions[row] = row_scores[0], row_best[0]
+
+        # approximate types may miss matches (e.g. in IVF clusters not
+        # visited), search those queries again exactly
+        n_found = (positions != -1).sum(axis=1)
+        short_rows = np.flatnonzero(n_found < min(k, len(matches)))
+        if len(short_rows):
+            exact_scores, exact_positions = exact_search(
+                self.vectors, queries[short_rows], matches, k
+            )
+            scores[short_rows] = exact_scores
+            positions[short_rows] = exact_positions
+
+        return scores, positions
+
+    def positions_of(self, ids) -> np.ndarray:
+        """Index positions of document ids, ids not indexed are left out"""
+        if self.id_order is None:
+            self.id_order = np.argsort(self.ids, kind="stable")
+
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.ids) or not len(ids):
+            return np.zeros(0, dtype=np.int64)
+
+        found = np.searchsorted(self.ids, ids, sorter=self.id_order)
+        positions = self.id_order[np.minimum(found, len(self.ids) - 1)]
+        return positions[self.ids[positions] == ids]
+
+    def candidate_scores(self, query_vectors, positions: np.ndarray) -> np.ndarray:
+        """Exact similarity of one query to the vectors at the given positions"""
+        if self.vectors is None:
+            self.vectors = self.load_vectors()
+        query = normalize_embeddings(query_vectors)[0]
+        return self.vectors[positions] @ query
+
+    def rerank(self, query_vectors, candidate_ids, k: int, filters: tuple = None):
+        """
+        Rank candidate documents (e.g. from a first retrieval stage) by their
+        exact similarity to a query, reading only their vectors.
+
+        Parameters:
+            query_vectors (array-like or sparse matrix): One query, (1, dim).
+            candidate_ids (Iterable[int]): Document ids to rank.
+            k (int): Number of results.
+            filters (tuple): Parsed filters the results must match.
+
+        Returns:
+            Tuple[np.ndarray, List[int]]: Scores and document ids, best first.
+        """
+        # sorted positions read the memory-mapped rows in file order
+        positions = np.sort(self.positions_of(list(candidate_ids)))
+        if filters:
+            positions = positions[self.filter_mask(filters)[positions]]
+        scores = self.candidate_scores(query_vectors, positions)
+
+        best = np.argsort(-scores, kind="stable")[:k]
+        return scores[best], [int(self.ids[pos]) for pos in positions[best]]
+
+    @staticmethod
+    def read_meta(version_path: str) -> dict:
+        with open(os.path.join(version_path, META_FILE_NAME)) as handle:
+            meta = json.load(handle)
+
+        if meta["format_version"] != INDEX_FORMAT_VERSION:
+            raise ValueError(
+                f"Index at {version_path} has format version "
+                f"{meta['format_version']}, expected {INDEX_FORMAT_VERSION}. "
+                "Refit the models to rebuild it."
+            )
+
+        return meta
+
+    @staticmethod
+    def check_ids(ids, vectors: np.ndarray) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) != vectors.shape[0]:
+            raise ValueError(
+                f"Got {len(ids)} ids for {vectors.shape[0]} embeddings rows"
+            )
+        return ids
+
+    @staticmethod
+    def exists(root_path: str) -> bool:
+        return os.path.exists(os.path.join(root_path, LATEST_POINTER_FILE))
+
+    @staticmethod
+    def new_version_name() -> str:
+        return datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+    @staticmethod
+    def latest_version(root_path: str) -> str:
+        pointer_path = os.path.join(root_path, LATEST_POINTER_FILE)
+        if not os.path.exists(pointer_path):
+            raise FileNotFoundError(
+                f"No index published under {root_path}. Run src/main.py first."
+            )
+
+        with open(pointer_path) as handle:
+            return handle.read().strip()
+
+    @staticmethod
+    def publish(root_path: str, version: str) -> None:
+        """Atomically point root_path's LATEST file to the given version"""
+        pointer_path = os.path.join(root_path, LATEST_POINTER_FILE)
+        tmp_path = f"{pointer_path}.tmp"
+        with open(tmp_path, "w") as handle:
+            handle.write(version)
+        os.replace(tmp_path, pointer_path)
+
+
+class SparseVectorIndex(VectorIndex):
+    """
+    Exact similarity index that keeps sparse embeddings (TF-IDF) in CSR
+    format instead of densifying them.
+
+    Versions are published like the dense `VectorIndex` ones, storing the
+    normalized CSR matrix with `save_npz`. Queries are answered with a sparse
+    matrix product that only visits the non-zero terms of each document, and
+    the top k documents sharing terms with the query are selected with
+    `argpartition`.
+    """
+
+    @classmethod
+    def build(
+        cls,
+        root_path: str,
+        embeddings,
+        ids,
+        fit_stats: dict = None,
+        index_params: dict = None,
+        attributes: dict = None,
+    ) -> "SparseVectorIndex":
+        """
+        Normalize the sparse embeddings and publish them as the latest version
+        under root_path. See `VectorIndex.build` for the parameters.
+        """
+        vectors = normalize_sparse_embeddings(embeddings)
+        ids = cls.check_ids(ids, vectors)
+
+        meta = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "n_vectors": int(vectors.shape[0]),
+            "n_fitted": int(vectors.shape[0]),
+            "dim": int(vectors.shape[1]),
+            "metric": "inner_product",
+            "index_params": index_params or {"type": "sparse"},
+            **(fit_stats or {}),
+        }
+
+        return cls.write_version(root_path, vectors, ids, vectors, meta, attributes)
+
+    def append(self, embeddings, ids, attributes=None) -> "SparseVectorIndex":
+        """Publish a new version made of this index plus the given embeddings"""
+        new_vectors = normalize_sparse_embeddings(embeddings)
+        new_ids = self.check_ids(ids, new_vectors)
+
+        vectors = vstack([self.index, new_vectors], format="csr")
+        ids = np.concatenate([self.ids, new_ids])
+
+        meta = dict(self.meta, n_vectors=int(vectors.shape[0]))
+
+        return self.write_version(
+            self.root_path,
+            vectors,
+            ids,
+            vectors,
+            meta,
+            self.append_attributes(attributes),
+        )
+
+    @classmethod
+    def write_version(
+        cls, root_path, vectors, ids, index, meta, attributes=None
+    ) -> "SparseVectorIndex":
+        """Write all files of a new version and publish it as the latest"""
+        version = cls.new_version_name()
+        version_path = os.path.join(root_path, version)
+        os.makedirs(version_path, exist_ok=True)
+
+        save_npz(
+            os.path.join(version_path, SPARSE_VECTORS_FILE_NAME),
+            vectors,
+            compressed=False,
+        )
+        np.save(os.path.join(version_path, IDS_FILE_NAME), ids)
+        cls.write_attributes(version_path, attributes, ids)
+        with open(os.path.join(version_path, META_FILE_NAME), "w") as handle:
+            json.dump(meta, handle)
+
+        cls.publish(root_path, version)
+
+        return cls(root_path, version, vectors, ids, meta)
+
+    @classmethod
+    def load(cls, root_path: str, version: str = None) -> "SparseVectorIndex":
+        """Load an index version (the latest one by default) from disk"""
+        if version is None:
+            version = cls.latest_version(root_path)
+
+        version_path = os.path.join(root_path, version)
+        meta = cls.read_meta(version_path)
+
+        ids = np.load(os.path.join(version_path, IDS_FILE_NAME), mmap_mode="r")
+        vectors = load_npz(os.path.join(version_path, SPARSE_VECTORS_FILE_NAME))
+
+        return cls(root_path, version, vectors.tocsr(), ids, meta)
+
+    def load_vectors(self):
+        """Normalized CSR vectors stored with this version"""
+        return self.index
+
+    def candidate_scores(self, query_vectors, positions: np.ndarray) -> np.ndarray:
+        """Exact similarity of one query to the vectors at the given positions"""
+        if not issparse(query_vectors):
+            query_vectors = np.atleast_2d(query_vectors)
+        query = normalize_sparse_embeddings(csr_matrix(query_vectors))
+        return (self.index[positions] @ query.T).toarray().ravel()
+
+    def search(self, query_vectors, k: int, filters: tuple = None):
+        """
+        Search the k most similar documents for each query vector.
+
+        Parameters:
+            query_vectors (array-like or sparse matrix): Matrix of shape
+                (n_queries, dim).
+            k (int): Number of results per query.
+            filters (tuple): Parsed filters the results must match.
+
+        Returns:
+            Tuple[List[np.ndarray], List[List[int]]]: Similarity scores and
+                ranked document ids for each query. Documents sharing no term
+                with a query are never returned, so there may be less than k.
+        """
+        if not issparse(query_vectors):
+            query_vectors = np.atleast_2d(query_vectors)
+        queries = normalize_sparse_embeddings(csr_matrix(query_vectors))
+
+        # sparse matrix x (tiny) dense query block: only the non-zero terms of
+        # each document are visited, giving (n_docs x n_queries) scores
+        scores = self.index @ queries.toarray().T
+        mask = self.filter_mask(filters) if filters else True
+
+        all_scores, ranked_ids = [], []
+        for col_scores in scores.T:
+            rows = np.flatnonzero((col_scores > 0) & mask)
+            if len(rows) > k:
+                rows = rows[np.argpartition(-col_scores[rows], k - 1)[:k]]
+
+            rows = rows[np.argsort(-col_scores[rows], kind="stable")]
+            all_scores.append(col_scores[rows])
+            ranked_ids.append([int(self.ids[row]) for row in rows])
+
+        return all_scores, ranked_ids
+
+
+# Index class handling each configured index type
+INDEX_CLASSES = {"sparse": SparseVectorIndex}
+
+
+def index_class(index_params: dict = None):
+    """Index class to build/load for the given `index` config section"""
+    index_type = (index_params or FLAT_INDEX_PARAMS)["type"]
+    return INDEX_CLASSES.get(index_type, VectorIndex)
+
+
+def build_index(
+    root_path, embeddings, ids, fit_stats=None, index_params=None, attributes=None
+):
+    """Build and publish the index type set in index_params"""
+    return index_class(index_params).build(
+        root_path,
+        embeddings,
+        ids,
+        fit_stats=fit_stats,
+        index_params=index_params,
+        attributes=attributes,
+    )
+
+
+def load_index(root_path: str, version: str = None) -> VectorIndex:
+    """Load an index version (the latest by default) with its own class"""
+    if version is None:
+        version = VectorIndex.latest_version(root_path)
+
+    meta = VectorIndex.read_meta(os.path.join(root_path, version))
+    return index_class(meta.get("index_params")).load(root_path, version)
+
+
+def load_latest_index(root_path: str) -> VectorIndex:
+    """
+    Return the latest published index under root_path, loading it from disk
+    only the first time a version is seen by this process.
+    """
+    version = VectorIndex.latest_version(root_path)
+    key = (root_path, version)
+
+    if key not in _LOADED_INDEXES:
+        # drop older versions of the same index so they can be unmapped
+        for loaded_key in [k for k in _LOADED_INDEXES if k[0] == root_path]:
+            del _LOADED_INDEXES[loaded_key]
+        _LOADED_INDEXES[key] = load_index(root_path, version)
+
+    return _LOADED_INDEXES[key]
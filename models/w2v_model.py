@@ -1,30 +1,106 @@
 import os
+from multiprocessing import Pool
 
 import numpy as np
-from gensim.models import Word2Vec
+from scipy.sparse import csr_matrix
 
-from scripts.data_processing.data_preprocessor import JurisdictionPreprocessor
+from scripts.data_processing.data_corpus import TokenStream
 from scripts.data_processing.data_storage import JurisdictionDataBaseManager
 
-from .utils import CONFIG_PATH, read_config
+from .sentence_filters import sentence_attributes
+from .utils import CONFIG_PATH, iter_chunks, oov_ratio, read_config
+from .vector_index import build_index, load_latest_index
+
+# Documents embedded together (and sent to each embedding worker task)
+EMBEDDING_CHUNK_SIZE = 2000
+
+# Word vectors memory-mapped by each embedding worker process
+_WORKER_WORD_VECTORS = None
+
+
+def average_word_vectors(documents, vectors, key_to_index):
+    """
+    Average the word vectors of each document in bulk.
+
+    Tokens are mapped to vocabulary rows per document, and the word vectors
+    of each document are summed through one sparse (n_docs x vocab_size)
+    bag-of-words matrix product, instead of adding vectors word by word.
+
+    Parameters:
+        documents (List[str]): Whitespace-tokenizable documents.
+        vectors (np.ndarray): Word vectors matrix (vocab_size, vector_size).
+        key_to_index (dict): Word to row of `vectors`.
+
+    Returns:
+        np.ndarray: float32 matrix (n_docs, vector_size). Documents without
+            any in-vocabulary word get a zero vector.
+    """
+    doc_vectors = np.zeros((len(documents), vectors.shape[1]), dtype=np.float32)
+    get_row = key_to_index.get
+
+    for start in range(0, len(documents), EMBEDDING_CHUNK_SIZE):
+        chunk = documents[start : start + EMBEDDING_CHUNK_SIZE]
+
+        doc_rows = [
+            np.fromiter(
+                (row for row in map(get_row, doc.split()) if row is not None),
+                dtype=np.int64,
+            )
+            for doc in chunk
+        ]
+        lengths = np.array([len(rows) for rows in doc_rows], dtype=np.int64)
+        indices = np.concatenate(doc_rows)
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+
+        # repeated words are repeated entries, summed by the product
+        bag_of_words = csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr),
+            shape=(len(chunk), vectors.shape[0]),
+        )
+        sums = bag_of_words @ vectors
+        counts = np.maximum(lengths, 1)[:, None]
+        doc_vectors[start : start + len(chunk)] = sums / counts
+
+    return doc_vectors
+
+
+def _init_embedding_worker(word_vectors_path):
+    from gensim.models import KeyedVectors
+
+    # memory-map the saved word vectors so workers share the same pages
+    global _WORKER_WORD_VECTORS
+    _WORKER_WORD_VECTORS = KeyedVectors.load(word_vectors_path, mmap="r")
+
+
+def _embed_documents_chunk(documents):
+    return average_word_vectors(
+        documents, _WORKER_WORD_VECTORS.vectors, _WORKER_WORD_VECTORS.key_to_index
+    )
 
 
 class Word2VecModel:
     def __init__(self):
-        self.processor = JurisdictionPreprocessor()
-        self.paths = read_config(CONFIG_PATH)["general"]
-
+        config = read_config(CONFIG_PATH)
+        self.paths = config["general"]
         # Read model parameter configuration
-        self.params = read_config(CONFIG_PATH)["word2vec"]
+        self.params = config["word2vec"]
         self.model_path = os.path.join(
             self.paths["model_path"], self.params["model_file_name"]
         )
+        self.index_path = os.path.join(
+            self.paths["index_path"], self.params["index_name"]
+        )
+        self.vectors_path = os.path.join(
+            self.paths["embedding_path"], self.params["vectors_file_name"]
+        )
 
-    def fit_and_save(self, data, to_save=True, table_path=None):
-        data_list = [d.split() for d in data]
+    def fit_and_save(self, data, to_save=True, table_path=None, ids=None):
+        from gensim.models import Word2Vec
 
+        # tokens are streamed, gensim iterates data once per epoch, so it must
+        # be restartable (a list or a SentenceCorpus)
         self.model = Word2Vec(
-            data_list,
+            TokenStream(data),
             vector_size=self.params["size"],
             window=self.params["window"],
             min_count=self.params["min_count"],
@@ -35,48 +111,119 @@ class Word2VecModel:
             # Save model
             self.model.save(self.model_path)
 
+            # Store just the words + their trained embeddings.
+            word_vectors = self.model.wv
+            word_vectors.save(self.vectors_path)
+
             # Generate document vectorial representations
-            doc_embeddings = [self.get_doc_vector(doc) for doc in data]
+            doc_embeddings = self.get_doc_vectors(
+                data, n_jobs=self.params["embedding_jobs"]
+            )
 
-            # Store just the words + their trained embeddings.
-            vec_out = os.path.join(
-                self.paths["embedding_path"], self.params["vectors_file_name"]
+            # publish a prebuilt search index for the app to load
+            if ids is None:
+                ids = np.arange(1, len(doc_embeddings) + 1)
+            fit_stats = {
+                "fit_oov_ratio": self.oov_ratio(data),
+                "corpus_version": getattr(data, "version", None),
+            }
+            build_index(
+                self.index_path,
+                doc_embeddings,
+                ids,
+                fit_stats=fit_stats,
+                index_params=self.params["index"],
+                attributes=sentence_attributes(data, ids),
             )
-            word_vectors = self.model.wv
-            word_vectors.save(vec_out)
 
             if table_path:
-                # format adequately to insert into db
-                dense_vector_list = [[vec.tolist()] for vec in doc_embeddings]
-                # save vectors into pgvector data base
+                # save vectors into pgvector data base, replacing old ones
                 db_manager = JurisdictionDataBaseManager()
-                db_manager("pgvector", table_path, dense_vector_list)
+                db_manager.bulk_load_vectors(
+                    table_path,
+                    ids,
+                    doc_embeddings,
+                    recreate=True,
+                    staging=self.paths["pgvector_load"]["staging"],
+                    index_params=self.paths["pgvector_index"],
+                    chunk_rows=self.paths["pgvector_load"]["chunk_rows"],
+                )
+
+    def update_and_save(self, data, ids, table_path=None):
+        """
+        Embed new documents with the frozen model and append them to the
+        search index (and pgvector table) without retraining.
+        """
+        doc_embeddings = self.get_doc_vectors(
+            data, n_jobs=self.params["embedding_jobs"]
+        )
+
+        self.load_index().append(
+            doc_embeddings, ids, attributes=sentence_attributes(data, ids)
+        )
+
+        if table_path:
+            db_manager = JurisdictionDataBaseManager()
+            db_manager.bulk_load_vectors(
+                table_path,
+                ids,
+                doc_embeddings,
+                chunk_rows=self.paths["pgvector_load"]["chunk_rows"],
+            )
 
     def load(self):
+        from gensim.models import Word2Vec
+
         self.model = Word2Vec.load(self.model_path)
         # self.index2word_set = set(self.model.wv.index2word)
 
-    def get_doc_vector(self, document):
-        # Initialize an empty vector
-        aggregate_vector = np.zeros(self.model.vector_size)
-        word_list = document.split()
-        word_count = 0
-
-        # Iterate over each word in the document
-        for word in word_list:
-            if word in self.model.wv.key_to_index:
-                # If the word is in the model's vocabulary
-                # add its vector to the aggregate
-                aggregate_vector += self.model.wv[word]
-                word_count += 1
+    def load_index(self):
+        return load_latest_index(self.index_path)
 
-        # Average the aggregate vector by dividing by the word count
-        if word_count > 0:
-            aggregate_vector = np.divide(aggregate_vector, word_count)
+    def oov_ratio(self, data):
+        return oov_ratio((doc.split() for doc in data), self.model.wv.key_to_index)
 
-        return aggregate_vector
+    def get_doc_vector(self, document):
+        # Average of the document's in-vocabulary word vectors
+        return self.get_doc_vectors([document])[0]
+
+    def get_doc_vectors(self, documents, n_jobs=1):
+        """
+        Embed a batch of documents as the average of their word vectors.
+
+        Parameters:
+            documents (Iterable[str]): Documents to embed, streamed by chunks.
+            n_jobs (int): Worker processes. Workers memory-map the saved word
+                vectors file, so the vectors matrix is shared, not copied.
+
+        Returns:
+            np.ndarray: float32 matrix (n_docs, vector_size).
+        """
+        chunks = iter_chunks(documents, EMBEDDING_CHUNK_SIZE)
+
+        if n_jobs <= 1:
+            doc_vectors = [
+                average_word_vectors(
+                    chunk, self.model.wv.vectors, self.model.wv.key_to_index
+                )
+                for chunk in chunks
+            ]
+        else:
+            with Pool(
+                processes=n_jobs,
+                initializer=_init_embedding_worker,
+                initargs=(self.vectors_path,),
+            ) as pool:
+                doc_vectors = list(pool.imap(_embed_documents_chunk, chunks))
+
+        if not doc_vectors:
+            return np.zeros((0, self.model.vector_size), dtype=np.float32)
+
+        return np.vstack(doc_vectors)
 
     def get_query_vector(self, document):
-        embed = self.get_doc_vector(document)
-        embed = embed.reshape(1, len(embed))
+        embed = self.get_doc_vectors([document])
         return embed
+
+    def get_query_vectors(self, documents):
+        return self.get_doc_vectors(documents)
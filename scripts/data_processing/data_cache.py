@@ -0,0 +1,160 @@
+import gzip
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+
+class JurisdictionDocumentCache:
+    """
+    Local content-addressed store of downloaded PDFs and their extracted text.
+
+    Each URL points to the SHA-256 of its PDF content, and the compressed PDF
+    and text are stored once per content hash, however many URLs serve it:
+
+        <cache_dir>/urls/<url hash[:2]>/<url hash>   -> content hash
+        <cache_dir>/blobs/<hash[:2]>/<hash>.pdf.gz
+        <cache_dir>/blobs/<hash[:2]>/<hash>.txt.gz
+
+    Every file is written to a temporary file and renamed into place, so
+    several processes can share the cache without locks. Reading a blob
+    refreshes its modification time, which `evict` uses to drop the least
+    recently used blobs once the cache outgrows `max_bytes`.
+    """
+
+    # gzip level, PDFs are mostly compressed already and text compresses
+    # well at any level
+    COMPRESS_LEVEL = 6
+    PDF_SUFFIX = ".pdf.gz"
+    TEXT_SUFFIX = ".txt.gz"
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """
+        Parameters:
+            cache_dir (str): Root folder of the cache.
+            max_bytes (int): Size of the stored blobs kept by `evict`.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def hash_bytes(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    def url_path(self, url: str) -> str:
+        url_hash = JurisdictionDocumentCache.hash_bytes(url.encode())
+        return os.path.join(self.cache_dir, "urls", url_hash[:2], url_hash)
+
+    def blob_path(self, content_hash: str, suffix: str) -> str:
+        return os.path.join(
+            self.cache_dir, "blobs", content_hash[:2], content_hash + suffix
+        )
+
+    def content_hash(self, url: str) -> Optional[str]:
+        """Hash of the PDF last stored for `url`, None if it was never stored"""
+        try:
+            with open(self.url_path(url)) as handle:
+                return handle.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def write_atomic(self, path: str, content: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def read_blob(self, url: str, suffix: str) -> Optional[bytes]:
+        content_hash = self.content_hash(url)
+        if content_hash is None:
+            return None
+
+        path = self.blob_path(content_hash, suffix)
+        try:
+            with open(path, "rb") as handle:
+                content = gzip.decompress(handle.read())
+        except (FileNotFoundError, OSError, EOFError):
+            # never stored, evicted or truncated
+            return None
+
+        # mark as recently used for eviction
+        os.utime(path)
+        return content
+
+    def write_blob(self, content_hash: str, suffix: str, content: bytes) -> None:
+        path = self.blob_path(content_hash, suffix)
+        if os.path.exists(path):
+            os.utime(path)
+            return
+
+        compressed = gzip.compress(
+            content, compresslevel=JurisdictionDocumentCache.COMPRESS_LEVEL
+        )
+        self.write_atomic(path, compressed)
+
+    def get_pdf(self, url: str) -> Optional[bytes]:
+        """PDF content stored for `url`, None if missing"""
+        return self.read_blob(url, JurisdictionDocumentCache.PDF_SUFFIX)
+
+    def put_pdf(self, url: str, pdf_bytes: bytes) -> str:
+        """
+        Store the PDF downloaded from `url`.
+
+        Returns:
+            str: Content hash of the PDF.
+        """
+        content_hash = JurisdictionDocumentCache.hash_bytes(pdf_bytes)
+        self.write_blob(content_hash, JurisdictionDocumentCache.PDF_SUFFIX, pdf_bytes)
+        self.write_atomic(self.url_path(url), content_hash.encode())
+        return content_hash
+
+    def get_text(self, url: str) -> Optional[str]:
+        """Text extracted from the PDF stored for `url`, None if missing"""
+        text = self.read_blob(url, JurisdictionDocumentCache.TEXT_SUFFIX)
+        return None if text is None else text.decode("utf-8")
+
+    def put_text(self, url: str, text: str) -> None:
+        """Store the text extracted from the PDF previously stored for `url`"""
+        content_hash = self.content_hash(url)
+        if content_hash is None:
+            raise KeyError(f"No PDF stored for {url}")
+
+        self.write_blob(
+            content_hash, JurisdictionDocumentCache.TEXT_SUFFIX, text.encode("utf-8")
+        )
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used blobs until the cache fits in
+        `max_bytes`. URL entries pointing to removed blobs are left, they are
+        just misses from then on.
+
+        Returns:
+            int: Bytes removed.
+        """
+        blobs = []
+        for dir_path, _, file_names in os.walk(os.path.join(self.cache_dir, "blobs")):
+            for file_name in file_names:
+                if file_name.endswith(".tmp"):
+                    continue
+                stat = os.stat(os.path.join(dir_path, file_name))
+                blobs.append((stat.st_mtime, stat.st_size, dir_path, file_name))
+
+        total_bytes = sum(size for _, size, _, _ in blobs)
+        removed_bytes = 0
+        for _, size, dir_path, file_name in sorted(blobs):
+            if total_bytes - removed_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(dir_path, file_name))
+            except FileNotFoundError:
+                # removed by another process meanwhile
+                pass
+            removed_bytes += size
+
+        return removed_bytes
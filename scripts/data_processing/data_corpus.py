@@ -0,0 +1,136 @@
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from scripts.data_processing.data_storage import SQLITE_NOW, JurisdictionDataBaseManager
+
+
+class SentenceCorpus:
+    """
+    Streaming, restartable view of the documents to vectorize in the
+    `sentence` table.
+
+    Each iteration opens its own cursor and reads rows in chunks with
+    `fetchmany`, so only one chunk of text is in memory at a time and the
+    corpus can be iterated as many times as a model needs (e.g. the vocabulary
+    scan and every training epoch of gensim).
+    """
+
+    # Rows fetched from SQLite per round-trip
+    CHUNK_SIZE = 1000
+
+    def __init__(
+        self, table_name: str = "sentence", min_id: int = 0, chunk_size: int = None
+    ):
+        """
+        Parameters:
+            table_name (str): SQLite table holding the processed sentences.
+            min_id (int): Only sentences with a greater rowid are streamed,
+                e.g. those not indexed yet.
+            chunk_size (int): Rows fetched per round-trip.
+        """
+        self.table_name = table_name
+        self.min_id = int(min_id)
+        self.chunk_size = chunk_size or SentenceCorpus.CHUNK_SIZE
+
+        # database time before any read, kept by the indexes built from this
+        # corpus: sentences updated afterwards are stale in them
+        db_manager = JurisdictionDataBaseManager()
+        with db_manager.session("sqlite"):
+            self.version = db_manager.get_query_data(f"SELECT {SQLITE_NOW}")[0][0]
+
+    def __iter__(self) -> Iterator[str]:
+        for _, documents in self.iter_batches():
+            yield from documents
+
+    def __len__(self) -> int:
+        return len(self.ids())
+
+    def iter_batches(self) -> Iterator[Tuple[List[int], List[str]]]:
+        """
+        Yield (sentence ids, documents) chunks in rowid order. Each document
+        is the summary of the last trial + the new trial, the text used for
+        the similarity search.
+        """
+        db_manager = JurisdictionDataBaseManager()
+        with db_manager.session("sqlite") as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(
+                    "SELECT rowid,factual_background,factual_grounds "
+                    f"FROM {self.table_name} WHERE rowid > ? ORDER BY rowid",
+                    (self.min_id,),
+                )
+                while True:
+                    rows = cursor.fetchmany(self.chunk_size)
+                    if not rows:
+                        break
+                    yield [i for i, _, _ in rows], [a + f for _, a, f in rows]
+            finally:
+                cursor.close()
+
+    def ids(self) -> np.ndarray:
+        """Sentence ids of the corpus, in iteration order"""
+        db_manager = JurisdictionDataBaseManager()
+        with db_manager.session("sqlite"):
+            result = db_manager.get_query_data(
+                f"SELECT rowid FROM {self.table_name} "
+                f"WHERE rowid > {self.min_id} ORDER BY rowid"
+            )
+
+        return np.array([i for i, in result], dtype=np.int64)
+
+    def updated_ids(self, since: Optional[str], max_id: int) -> np.ndarray:
+        """
+        Ids up to max_id of the sentences updated in place since a corpus
+        version, e.g. reprocessed after an index was built. Any updated
+        sentence when since is None.
+        """
+        condition = "updated_at IS NOT NULL" if since is None else "updated_at >= ?"
+        db_manager = JurisdictionDataBaseManager()
+        with db_manager.session("sqlite") as connection:
+            result = connection.execute(
+                f"SELECT rowid FROM {self.table_name} "
+                f"WHERE rowid <= ? AND {condition} ORDER BY rowid",
+                (int(max_id),) if since is None else (int(max_id), since),
+            ).fetchall()
+
+        return np.array([i for i, in result], dtype=np.int64)
+
+    def attributes(self, ids, columns: List[str]) -> dict:
+        """
+        Values of some columns of the given sentences, e.g. to filter searches.
+
+        Returns:
+            dict: Column -> list of values in the order of ids, None for ids
+                not found.
+        """
+        db_manager = JurisdictionDataBaseManager()
+        with db_manager.session("sqlite"):
+            result = db_manager.get_query_data(
+                f"SELECT rowid,{','.join(columns)} FROM {self.table_name} "
+                f"WHERE rowid > {self.min_id}"
+            )
+
+        by_id = {row[0]: row[1:] for row in result}
+        missing = (None,) * len(columns)
+        rows = [by_id.get(int(i), missing) for i in ids]
+        return {column: [row[j] for row in rows] for j, column in enumerate(columns)}
+
+    def tokens(self) -> "TokenStream":
+        """Restartable stream of each document's tokens"""
+        return TokenStream(self)
+
+
+class TokenStream:
+    """
+    Restartable iterable of whitespace tokens per document, built lazily from
+    any restartable iterable of documents (e.g. gensim's `sentences`).
+    """
+
+    def __init__(self, documents: Iterable[str]):
+        self.documents = documents
+
+    def __iter__(self) -> Iterator[List[str]]:
+        for document in self.documents:
+            yield document.split()
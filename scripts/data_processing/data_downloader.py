@@ -0,0 +1,205 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+T = TypeVar("T")
+
+
+class JurisdictionPDFDownloader:
+    """
+    Concurrent PDF downloader sharing one pooled, keep-alive HTTP session.
+
+    Downloads run on a bounded thread pool and PDFs are parsed straight from
+    the downloaded bytes, without touching the disk. Download counters are
+    kept to report throughput.
+    """
+
+    # Simultaneous downloads, also the size of the HTTP connection pool
+    MAX_WORKERS = 8
+    # Seconds to wait for the server before giving up on a PDF
+    TIMEOUT = 30
+    # Retries on connection errors and transient HTTP status codes
+    RETRY_POLICY = Retry(
+        total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]
+    )
+
+    def __init__(self, agents: List[str], max_workers: Optional[int] = None):
+        """
+        Parameters:
+            agents (List[str]): User agents to rotate among requests.
+            max_workers (int): Simultaneous downloads.
+        """
+        self.agents = agents
+        self.max_workers = max_workers or JurisdictionPDFDownloader.MAX_WORKERS
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.max_workers,
+            pool_maxsize=self.max_workers,
+            max_retries=JurisdictionPDFDownloader.RETRY_POLICY,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # counters are updated from the download threads
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.n_success = 0
+        self.n_failed = 0
+        self.n_bytes = 0
+        self.elapsed = 0.0
+
+    def download_pdf(self, url: str) -> Optional[bytes]:
+        """
+        Download a PDF from a given URL.
+
+        Parameters:
+            url (str): The URL of the PDF to be downloaded.
+
+        Returns:
+            bytes: The PDF content, None if the download failed.
+        """
+        return self.fetch(url)
+
+    def fetch(self, url: str) -> Optional[bytes]:
+        """
+        Fetch any resource (PDF, HTML page...) over the pooled session,
+        rotating the user agent and counting it in the download stats.
+
+        Parameters:
+            url (str): The URL to fetch.
+
+        Returns:
+            bytes: The response content, None if the request failed.
+        """
+        # get random user agent
+        random_agent = random.choice(self.agents).removesuffix("\n")
+        # create headers with the selected user agent
+        headers = {
+            "User-Agent": random_agent,
+        }
+
+        try:
+            response = self.session.get(
+                url, headers=headers, timeout=JurisdictionPDFDownloader.TIMEOUT
+            )
+        except requests.RequestException as error:
+            print(f"Failed to download {url}. Error: {error}")
+            self.count_download(None)
+            return None
+
+        # Check if the request was successful
+        if response.status_code != 200:
+            print(f"Failed to download {url}. Status code: {response.status_code}")
+            self.count_download(None)
+            return None
+
+        self.count_download(response.content)
+        return response.content
+
+    def count_download(self, content: Optional[bytes]) -> None:
+        with self.stats_lock:
+            if content is None:
+                self.n_failed += 1
+            else:
+                self.n_success += 1
+                self.n_bytes += len(content)
+
+    def download_many(
+        self, urls: Iterable[str]
+    ) -> Iterator[Tuple[str, Optional[bytes]]]:
+        """
+        Download PDFs concurrently, yielding them as they complete.
+
+        Parameters:
+            urls (Iterable[str]): URLs of the PDFs to download.
+
+        Yields:
+            Tuple[str, Optional[bytes]]: URL and PDF content (None if failed),
+                in completion order.
+        """
+        start = time.perf_counter()
+        yield from self.map_unordered(self.download_pdf, urls)
+        self.elapsed += time.perf_counter() - start
+
+    def map_unordered(
+        self, function: Callable[[str], T], urls: Iterable[str]
+    ) -> Iterator[Tuple[str, T]]:
+        """
+        Apply `function` to each URL on the download threads, yielding the
+        results as they complete.
+
+        At most `2 * max_workers` URLs are in flight, so the results held in
+        memory stay bounded however many URLs are given.
+
+        Parameters:
+            function (Callable[[str], T]): Function of a URL, e.g. a download.
+            urls (Iterable[str]): URLs to process.
+
+        Yields:
+            Tuple[str, T]: URL and result of `function`, in completion order.
+        """
+        url_iterator = iter(urls)
+        max_in_flight = 2 * self.max_workers
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = {}
+
+            while True:
+                # keep the pool fed up to the in-flight bound
+                for url in url_iterator:
+                    in_flight[executor.submit(function, url)] = url
+                    if len(in_flight) >= max_in_flight:
+                        break
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield in_flight.pop(future), future.result()
+
+    def throughput(self) -> dict:
+        """Download counters and rates since the last `reset_stats`"""
+        elapsed = max(self.elapsed, 1e-9)
+        return {
+            "n_success": self.n_success,
+            "n_failed": self.n_failed,
+            "docs_per_s": (self.n_success + self.n_failed) / elapsed,
+            "mb_per_s": self.n_bytes / 1e6 / elapsed,
+        }
+
+    def report_throughput(self) -> None:
+        stats = self.throughput()
+        print(
+            f"Downloaded: {stats['n_success']} | Failed: {stats['n_failed']} | "
+            f"{stats['docs_per_s']:.1f} docs/s | {stats['mb_per_s']:.2f} MB/s"
+        )
+
+    @staticmethod
+    def extract_text_from_bytes(pdf_bytes: bytes) -> Optional[str]:
+        """
+        Extract text from PDF bytes, parsing them in memory.
+
+        Parameters:
+            pdf_bytes (bytes): Content of the PDF.
+
+        Returns:
+            str: The extracted text, None if the PDF could not be opened.
+        """
+        import fitz
+
+        try:
+            with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_document:
+                return "".join(page.get_text("text") for page in pdf_document)
+        except fitz.FileDataError:
+            print("Error openining PDF")
+            return None
@@ -0,0 +1,138 @@
+import re
+import threading
+from html.parser import HTMLParser
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from scripts.data_processing.data_downloader import JurisdictionPDFDownloader
+
+
+class PDFAnchorParser(HTMLParser):
+    """
+    Finds the href of the first anchor inside the element with id
+    objtcontentpdf, as it appears in the page source (the same text the
+    browser's innerHTML gives, HTML entities included). Anchors after the
+    element is closed are ignored, e.g. when it is left empty to be filled
+    by the page scripts.
+    """
+
+    CONTAINER_ID = "objtcontentpdf"
+    HREF_PATTERN = re.compile(r"""\shref\s*=\s*["']([^"']*)["']""", re.IGNORECASE)
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.container_tag = None
+        # open elements with the container tag name, the container included
+        self.depth = 0
+        self.closed = False
+        self.link = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.link is not None or self.closed:
+            return
+
+        if self.container_tag is None:
+            if dict(attrs).get("id") == self.CONTAINER_ID:
+                self.container_tag, self.depth = tag, 1
+            return
+
+        if tag == self.container_tag:
+            self.depth += 1
+        elif tag == "a":
+            match = self.HREF_PATTERN.search(self.get_starttag_text())
+            if match:
+                self.link = match.group(1)
+
+    def handle_endtag(self, tag):
+        if not self.closed and tag == self.container_tag:
+            self.depth -= 1
+            # the container is closed, stop looking
+            self.closed = self.depth == 0
+
+
+class JurisdictionLinkResolver:
+    """
+    Resolves the PDF link of CENDOJ jurisprudence detail pages over pooled
+    HTTP, reading the `objtcontentpdf` anchor straight from the page source.
+
+    Pages whose source does not hold the anchor (it is rendered with
+    JavaScript) are handed to `browser_fallback`, e.g. a pool of reused
+    browsers, which is much slower but renders the page.
+    """
+
+    def __init__(
+        self,
+        downloader: JurisdictionPDFDownloader,
+        browser_fallback: Optional[Callable[[str], Optional[str]]] = None,
+    ):
+        """
+        Parameters:
+            downloader (JurisdictionPDFDownloader): Pooled HTTP session and
+                download threads used to fetch the pages.
+            browser_fallback (Callable[[str], Optional[str]]): Resolves a
+                detail page with a browser, None to not fall back.
+        """
+        self.downloader = downloader
+        self.browser_fallback = browser_fallback
+
+        # pages resolved by each path, updated from the download threads
+        self.stats_lock = threading.Lock()
+        self.n_http = 0
+        self.n_browser = 0
+
+    @staticmethod
+    def parse_pdf_link(html: str) -> Optional[str]:
+        """
+        Parameters:
+            html (str): Source of a jurisprudence detail page.
+
+        Returns:
+            str: The link to the PDF jurisprudence, None if not in the source.
+        """
+        parser = PDFAnchorParser()
+        parser.feed(html)
+        parser.close()
+        return parser.link
+
+    def resolve(self, general_link: str) -> Optional[str]:
+        """
+        Extracts the link to the PDF jurisprudence from the given general link.
+
+        Parameters:
+            general_link (str): The general link to the jurisprudence.
+
+        Returns:
+            str: The link to the PDF jurisprudence, None if not found.
+        """
+        page = self.downloader.fetch(general_link)
+        if page is None:
+            # the server failed, a browser would not do better
+            return None
+
+        link = self.parse_pdf_link(page.decode("utf-8", errors="replace"))
+        if link is not None:
+            with self.stats_lock:
+                self.n_http += 1
+            return link
+
+        if self.browser_fallback is None:
+            return None
+
+        # the anchor is only rendered by the page scripts
+        with self.stats_lock:
+            self.n_browser += 1
+        return self.browser_fallback(general_link)
+
+    def resolve_many(
+        self, general_links: Iterable[str]
+    ) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Resolve detail pages concurrently, yielding them as they complete.
+
+        Parameters:
+            general_links (Iterable[str]): General links to jurisprudences.
+
+        Yields:
+            Tuple[str, Optional[str]]: General link and link to its PDF (None
+                if not found), in completion order.
+        """
+        yield from self.downloader.map_unordered(self.resolve, general_links)
@@ -1,18 +1,16 @@
 import json
-import random
 import re
-import shutil
-import tempfile
+from collections import OrderedDict
 from multiprocessing import Pool, cpu_count
-from typing import Optional
+from typing import Iterator, List, Optional, Tuple
 
-import fitz
-import requests
-import spacy
-from nltk.tokenize import word_tokenize
-from pandas import DataFrame
-
-from scripts.data_processing.data_storage import JurisdictionDataBaseManager
+from scripts.data_processing.data_cache import JurisdictionDocumentCache
+from scripts.data_processing.data_downloader import JurisdictionPDFDownloader
+from scripts.data_processing.data_storage import (
+    SQLITE_NOW,
+    JurisdictionDataBaseManager,
+    table_name_from_path,
+)
 
 ARGS_PATH = "arguments.json"
 ROTATING_USER_AGENTS_FILE = "data/user_agents.txt"
@@ -21,6 +19,12 @@ ROTATING_USER_AGENTS_FILE = "data/user_agents.txt"
 class JurisdictionPreprocessor:
     # Spacy model name to use
     SPACY_MODEL_NAME = "es_core_news_md"
+    # Pipeline components the lemmatizer depends on, the rest are not loaded
+    SPACY_EXCLUDED_COMPONENTS = ["parser", "ner", "senter"]
+    # Tokens sent to the spacy pipeline at once
+    LEMMA_BATCH_SIZE = 1000
+    # Token -> lemma pairs kept in memory, least recently used are evicted
+    LEMMA_CACHE_SIZE = 200000
 
     # Assignation string when info is not found
     INFO_NOT_FOUND_STRING = "Not provided"
@@ -59,6 +63,47 @@ class JurisdictionPreprocessor:
         ),
         "C1C2": re.compile(r"(conden\w+|impo\w+|pago).{1,15}costas", re.DOTALL),
     }
+    # Anchor of each field, all found in one pass of a single alternation
+    # with a named group per field. The date anchor spans its value group and
+    # the case-insensitive flag of RECURRING_PATTERN is scoped to its group
+    SECTION_ANCHORS = {
+        "cendoj_id": CENDOJ_ID_PATTERN.pattern,
+        "date": r"Fecha:\s(?P<date_value>\d{2}/\d{2}/\d{4})",
+        "keyphrases": re.escape(KEYPHRASE_TITLE),
+        "recurring_part": (
+            r"(?i:Parte recurrente/Solicitante:|Parte recurrente|Procurador)"
+        ),
+        "appellant": re.escape(APELLANT_TITLE),
+        "factual_background": re.escape(FACTUAL_BACKGROUND_HEADER),
+        "factual_grounds": FACTUAL_GROUND_HEADER_PATTERN.pattern,
+        "verdict_arguments": VERDICT_HEADER_PATTERN.pattern,
+    }
+    # First characters of every anchor: the lookahead rejects all other
+    # positions at once, instead of trying each alternative there
+    SECTION_ANCHOR_FIRST_CHARS = r"[\dFCPpRAf]"
+    SECTION_ANCHOR_PATTERN = re.compile(
+        f"(?={SECTION_ANCHOR_FIRST_CHARS})(?:"
+        + "|".join(
+            f"(?P<{field}>{pattern})" for field, pattern in SECTION_ANCHORS.items()
+        )
+        + ")"
+    )
+    SECTION_ANCHOR_VALUE_GROUPS = {"date": "date_value"}
+    # Column of the sentence table holding each extracted field
+    SENTENCE_COLUMNS = {
+        "cendoj_id": "cendoj_id",
+        "date": "doc_date",
+        "keyphrases": "keyphrases",
+        "recurring_part": "recurring_part",
+        "appellant": "appellant",
+        "factual_background": "factual_background",
+        "factual_grounds": "factual_grounds",
+        "verdict_arguments": "verdict_arguments",
+        "first_verdict": "first_verdict",
+        "last_verdict": "last_verdict",
+        "legal_costs": "legal_costs",
+        "link": "link",
+    }
     BASIC_CLEANING_PATTERNS = [
         (re.compile(r"\n\n\d{1,2}\n\n\x0c"), ""),
         ("JURISPRUDENCIA", ""),
@@ -70,68 +115,307 @@ class JurisdictionPreprocessor:
         with open(ARGS_PATH) as f:
             args = json.load(f)
 
+        # standardize (tokenize and lemmatize) long sections before saving
+        self.standardize = args["preprocessor"].get("standardize", False)
+
         # init storage method
         self.sqlite_table_path = args["db"]["sqlite_juris_table_path"]
+        self.sqlite_table_name = table_name_from_path(self.sqlite_table_path)
+        # processing state of each url, to resume interrupted runs
+        self.url_state_table_path = args["db"]["sqlite_url_state_table_path"]
+        self.url_state_table_name = table_name_from_path(self.url_state_table_path)
         self.db_manager = JurisdictionDataBaseManager()
 
         # load user agents
         with open(ROTATING_USER_AGENTS_FILE, "r") as file:
             self.agents = file.readlines()
 
-        # Load the spacy model that will work as lemmatizer
-        self.nlp = spacy.load(JurisdictionPreprocessor.SPACY_MODEL_NAME)
-        self.nlp.initialize()
+        # pooled, concurrent PDF downloads
+        self.downloader = JurisdictionPDFDownloader(self.agents)
+
+        # local copies of the downloaded PDFs and their text, so documents
+        # are reprocessed from disk
+        self.cache = JurisdictionDocumentCache(
+            args["preprocessor"]["cache_dir"],
+            int(args["preprocessor"]["cache_max_mb"] * 1e6),
+        )
+
+        # spacy model that works as lemmatizer, loaded on first use
+        self._nlp = None
+        self.lemma_cache = OrderedDict()
+
+    @property
+    def nlp(self):
+        """Spacy lemmatizer, loaded the first time text is standardized"""
+        if self._nlp is None:
+            import spacy
+
+            self._nlp = spacy.load(
+                JurisdictionPreprocessor.SPACY_MODEL_NAME,
+                exclude=JurisdictionPreprocessor.SPACY_EXCLUDED_COMPONENTS,
+            )
+
+        return self._nlp
+
+    def create_tables(self) -> None:
+        """Create the sentence and url state tables if missing"""
+        with self.db_manager.session("sqlite"):
+            self.db_manager.create_table(self.sqlite_table_path)
+            self.db_manager.create_table(self.url_state_table_path)
+            self.migrate_sentence_table()
+
+    def migrate_sentence_table(self) -> None:
+        """
+        Bring a sentence table created by an older schema up to date, within
+        the current session: add the `updated_at` column and the unique index
+        on cendoj_id that upserts need. Duplicated CENDOJ ids keep their
+        latest row, flagged as updated so that the search indexes are refit.
+        """
+        table = self.sqlite_table_name
+        connection = self.db_manager.connection
+
+        columns = [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+        if "updated_at" not in columns:
+            connection.execute(f"ALTER TABLE {table} ADD COLUMN updated_at TEXT")
+
+        for _, index_name, unique, *_ in connection.execute(
+            f"PRAGMA index_list({table})"
+        ).fetchall():
+            index_columns = [
+                row[2] for row in connection.execute(f"PRAGMA index_info({index_name})")
+            ]
+            if unique and index_columns == ["cendoj_id"]:
+                return
+
+        connection.execute(
+            f"UPDATE {table} SET updated_at = {SQLITE_NOW} WHERE rowid IN ("
+            f"SELECT MAX(rowid) FROM {table} GROUP BY cendoj_id HAVING COUNT(*) > 1)"
+        )
+        n_deleted = connection.execute(
+            f"DELETE FROM {table} WHERE rowid NOT IN ("
+            f"SELECT MAX(rowid) FROM {table} GROUP BY cendoj_id)"
+        ).rowcount
+        connection.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {table}_cendoj_id_idx "
+            f"ON {table} (cendoj_id)"
+        )
+        print(
+            f"Migrated table {table}: unique CENDOJ ids, "
+            f"{n_deleted} duplicated rows removed"
+        )
+
+    def register_urls(self, links_set: list) -> None:
+        """Add new urls as pending, the state of known ones is kept"""
+        self.create_tables()
+
+        with self.db_manager.session("sqlite") as connection:
+            connection.executemany(
+                f"INSERT OR IGNORE INTO {self.url_state_table_name} (url) VALUES (?)",
+                [(url,) for url in links_set],
+            )
+
+    def urls_with_status(self, status: str) -> list:
+        """
+        Urls in a processing state: "pending" (never processed or
+        interrupted), "done" or "failed".
+        """
+        with self.db_manager.session("sqlite") as connection:
+            result = connection.execute(
+                f"SELECT url FROM {self.url_state_table_name} WHERE status = ? "
+                "ORDER BY rowid",
+                (status,),
+            ).fetchall()
+
+        return [url for url, in result]
+
+    def __call__(self, links_set: list, batch_size: int) -> dict:
+        """
+        Download, preprocess and save a set of urls by batches. Each batch is
+        saved along with the state of its urls in one transaction, so an
+        interrupted run resumes from the urls still pending.
+
+        Parameters:
+            links_set (list): URLs of the PDFs to process.
+            batch_size (int): URLs processed per worker task.
 
-    def __call__(self, links_set: list, batch_size: int):
+        Returns:
+            dict: Number of documents saved and failed.
+        """
         success_rate = {"n_success": 0, "n_failed": 0}
+        self.create_tables()
 
         # Split the links_set into batches
         batches = [
             links_set[i : i + batch_size] for i in range(0, len(links_set), batch_size)
         ]
 
-        # Create a multiprocessing pool to parallelize the processing & saving
-        pool = Pool(processes=cpu_count())
+        # This process is the only writer, the connection is in WAL mode so
+        # readers keep working meanwhile
+        self.db_manager.generate_connection("sqlite")
 
-        # Process and save batches in parallel
-        pool.starmap(
-            self.process_and_save_batch,
-            [(self.sqlite_table_path, batch, success_rate) for batch in batches],
-        )
+        try:
+            # Workers load their preprocessor (spaCy model included) once and
+            # only receive url batches, records are streamed back as each
+            # batch completes
+            with Pool(
+                processes=cpu_count(), initializer=_init_preprocessing_worker
+            ) as pool:
+                for list_of_dict_info, failures in pool.imap_unordered(
+                    _preprocess_batch, batches
+                ):
+                    self.save_batch(list_of_dict_info, failures)
+
+                    success_rate["n_success"] += len(list_of_dict_info)
+                    success_rate["n_failed"] += len(failures)
+
+                    print(
+                        f"Success: {success_rate['n_success']} | "
+                        f"Fails: {success_rate['n_failed']}"
+                    )
+        finally:
+            self.db_manager.exit_db()
+
+        removed_bytes = self.cache.evict()
+        if removed_bytes:
+            print(f"Evicted {removed_bytes / 1e6:.1f} MB from the document cache")
+
+        return success_rate
+
+    def preprocess_batch(self, doc_batch: list) -> tuple:
+        """
+        Download and preprocess a batch of document urls.
 
-        # Close the multiprocessing pool
-        pool.close()
-        pool.join()
+        Parameters:
+            doc_batch (list): URLs of the PDFs to process.
 
-    def process_and_save_batch(
-        self, doc_batch, table_path: str, success_rate: dict
-    ) -> None:
+        Returns:
+            Tuple[List[dict], List[Tuple[str, str]]]: Information extracted
+                from each document processed successfully, and the url and
+                error of each failed document.
         """
-        todo
+        # Preprocess each document as its text is read from the cache or
+        # downloaded
+        list_of_dict_info = []
+        failures = []
+        for url, text in self.iter_document_texts(doc_batch):
+            if text is None:
+                failures.append((url, "PDF could not be downloaded or read"))
+                continue
+
+            try:
+                list_of_dict_info.append(self.preprocess_document_text(url, text))
+            except Exception as error:
+                print(f"Failed to preprocess {url}. Error: {error}")
+                failures.append((url, f"{type(error).__name__}: {error}"))
+
+        if self.standardize:
+            self.standardize_sections(list_of_dict_info)
+
+        return list_of_dict_info, failures
+
+    def iter_document_texts(self, doc_batch: list) -> Iterator[Tuple[str, str]]:
         """
-        # Preprocess batch of documents
-        list_of_dict_info = [self.preprocess_document_url(url) for url in doc_batch]
+        Text of each document, read from the cache when available, otherwise
+        downloaded concurrently and cached.
 
-        df_records = DataFrame(list_of_dict_info)
+        Parameters:
+            doc_batch (list): URLs of the PDFs to process.
 
-        if df_records is None:
-            success_rate["n_failed"] += 1
-        else:
-            # Save batch
-            db_manager = JurisdictionDataBaseManager()
-            db_manager("sqlite", table_path, df_records)
+        Yields:
+            Tuple[str, str]: URL and text of the PDF (None if failed), cached
+                documents first and then downloads as they complete.
+        """
+        missing_urls = []
+        n_cached = 0
+        for url in doc_batch:
+            text = self.cache.get_text(url)
+            if text is None:
+                # the text may be missing while the PDF is stored
+                pdf_bytes = self.cache.get_pdf(url)
+                if pdf_bytes is None:
+                    missing_urls.append(url)
+                    continue
+                text = self.extract_and_cache_text(url, pdf_bytes)
 
-            success_rate["n_success"] += 1
+            n_cached += 1
+            yield url, text
 
-        print(
-            f"Success: {success_rate['n_success']} | "
-            f"Fails: {success_rate['n_failed']}"
-        )
+        if n_cached:
+            print(f"Read from cache: {n_cached}")
+
+        if not missing_urls:
+            return
+
+        for url, pdf_bytes in self.downloader.download_many(missing_urls):
+            text = None
+            if pdf_bytes is not None:
+                self.cache.put_pdf(url, pdf_bytes)
+                text = self.extract_and_cache_text(url, pdf_bytes)
+
+            yield url, text
+
+        self.downloader.report_throughput()
+
+    def extract_and_cache_text(self, url: str, pdf_bytes: bytes) -> Optional[str]:
+        text = self.downloader.extract_text_from_bytes(pdf_bytes)
+        if text is not None:
+            self.cache.put_text(url, text)
+
+        return text
+
+    def save_batch(self, list_of_dict_info: list, failures: list = ()) -> None:
+        """
+        Upsert a batch of records and record the state of their urls in a
+        single transaction.
+
+        Sentences are keyed on their CENDOJ id: reprocessing a document
+        updates its row in place and keeps its sentence_id, the id of its
+        vectors in the search indexes. `updated_at` records the update, so
+        the indexes built before it are refit.
+
+        Parameters:
+            list_of_dict_info (list): Information extracted from each document.
+            failures (list): (url, error) of each failed document.
+        """
+        fields = list(JurisdictionPreprocessor.SENTENCE_COLUMNS)
+        columns = [JurisdictionPreprocessor.SENTENCE_COLUMNS[f] for f in fields]
+        updates = ", ".join(f"{col} = excluded.{col}" for col in columns[1:])
+        updates += f", updated_at = {SQLITE_NOW}"
+
+        with self.db_manager.connection as connection:
+            connection.executemany(
+                f"INSERT INTO {self.sqlite_table_name} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(cendoj_id) DO UPDATE SET {updates}",
+                [
+                    [dict_info[field] for field in fields]
+                    for dict_info in list_of_dict_info
+                ],
+            )
+            connection.executemany(
+                f"UPDATE {self.url_state_table_name} SET status = 'done', "
+                "error = NULL, attempts = attempts + 1, "
+                f"updated_at = {SQLITE_NOW} WHERE url = ?",
+                [(dict_info["link"],) for dict_info in list_of_dict_info],
+            )
+            connection.executemany(
+                f"UPDATE {self.url_state_table_name} SET status = 'failed', "
+                "error = ?, attempts = attempts + 1, "
+                f"updated_at = {SQLITE_NOW} WHERE url = ?",
+                [(error, url) for url, error in failures],
+            )
 
     def preprocess_document_url(self, url_doc):
         # Extract text from PDF url
         text = self.extract_text_from_link(url_doc)
 
+        dict_information = self.preprocess_document_text(url_doc, text)
+        if self.standardize and dict_information is not None:
+            self.standardize_sections([dict_information])
+
+        return dict_information
+
+    def preprocess_document_text(self, url_doc, text):
         if text is None:
             return None
 
@@ -141,54 +425,19 @@ class JurisdictionPreprocessor:
         # Add document url into document information dictionary
         dict_information["link"] = url_doc
 
-        # NOTE: do not standardize for now
-        # Tokenize and lemmatize saved sections
-        # for sec in JurisdictionPreprocessor.LONG_SECTIONS:
-        #     std_sec = self.standardize_text(dict_information[sec])
-        #     dict_information[sec] = std_sec
-
         return dict_information
 
-    def download_pdf(self, url: str) -> str:
+    def download_pdf(self, url: str) -> Optional[bytes]:
         """
-        Download a PDF from a given URL and return the local
-        path to the downloaded PDF.
+        Download a PDF from a given URL through the pooled downloader.
 
         Parameters:
             url (str): The URL of the PDF to be downloaded.
 
         Returns:
-            str: The local path to the downloaded PDF.
+            bytes: The PDF content, None if the download failed.
         """
-        # get random user agent
-        random_agent = random.choice(self.agents).removesuffix("\n")
-        # create headers with the selected user agent
-        headers = {
-            "User-Agent": random_agent,
-        }
-        # get url information
-        response = requests.get(url, headers=headers)
-
-        # Check if the request was successful
-        if response.status_code == 200:
-            # create a temporal directory to store pdf
-            temp_dir = tempfile.mkdtemp()
-            pdf_path = f"{temp_dir}/downloaded.pdf"
-
-            # write pdf textual information into temporal file
-            with open(pdf_path, "wb") as pdf_file:
-                pdf_file.write(response.content)
-
-            return pdf_path, temp_dir
-
-        else:
-            # Handle the case where the request was not successful
-            print(
-                f"Failed to download PDF from {url}."
-                f"Status code: {response.status_code}"
-            )
-
-            return None, None
+        return self.downloader.download_pdf(url)
 
     def extract_text_from_link(self, url: str) -> str:
         """
@@ -200,30 +449,8 @@ class JurisdictionPreprocessor:
         Returns:
             str: The extracted text from the PDF.
         """
-        pdf_path, temp_dir = self.download_pdf(url)
-
-        if pdf_path is None:
-            return None
-
-        try:
-            pdf_document = fitz.open(pdf_path)
-            extracted_text = ""
-
-            for page_num in range(pdf_document.page_count):
-                page = pdf_document[page_num]
-                page_text = page.get_text("text")
-                extracted_text += page_text
-
-            pdf_document.close()
-
-        except fitz.fitz.FileDataError:
-            print("Error openining PDF")
-            extracted_text = None
-
-        # Clean up downloaded PDF from temporal dir
-        shutil.rmtree(temp_dir)
-
-        return extracted_text
+        for _, text in self.iter_document_texts([url]):
+            return text
 
     def extract_section_content(
         self,
@@ -312,7 +539,7 @@ class JurisdictionPreprocessor:
         The function performs text cleaning on the given `dirty_string`
         by applying basic cleaning patterns defined in the
         `BASIC_CLEANING_PATTERNS`. Each pattern is replaced with its
-        corresponding replacement string using the `re.sub` function.
+        corresponding replacement string.
 
         Parameters:
             dirty_string (str): The input string containing unclean text.
@@ -323,9 +550,13 @@ class JurisdictionPreprocessor:
         """
         clean_string = dirty_string
 
-        # Apply basic cleaning patterns using regular expressions
+        # Apply basic cleaning patterns, plain strings are replaced without
+        # going through the regex engine
         for rm_pat, repl in JurisdictionPreprocessor.BASIC_CLEANING_PATTERNS:
-            clean_string = re.sub(rm_pat, repl, clean_string)
+            if isinstance(rm_pat, str):
+                clean_string = clean_string.replace(rm_pat, repl)
+            else:
+                clean_string = rm_pat.sub(repl, clean_string)
 
         return clean_string
 
@@ -347,6 +578,10 @@ class JurisdictionPreprocessor:
             str: A string representing the legal costs from the section.
                  If no valid legal costs are found, 'NC' (No Costs) is returned
         """
+        # Every costs pattern needs the word, skip the regexes when absent
+        if "costas" not in section.lower():
+            return "NC"
+
         # Match legal costs pattern
         result = ""
 
@@ -398,55 +633,42 @@ class JurisdictionPreprocessor:
                   - "legal_costs": A flag (1 or 0) indicating if
                         "Costas Procesales" were found in document.
         """
+        cls = JurisdictionPreprocessor
+        anchors = self.find_section_anchors(doc)
+
+        if "cendoj_id" not in anchors or "date" not in anchors:
+            raise ValueError("CENDOJ id or date not found in document")
+
         dict_info = dict()
 
         # Retrieve CENDOJ id
-        cendoj_id_match = JurisdictionPreprocessor.CENDOJ_ID_PATTERN.search(doc).group()
-        dict_info["cendoj_id"] = cendoj_id_match
+        dict_info["cendoj_id"] = doc[slice(*anchors["cendoj_id"])]
 
         # Retrieve Litigation Date
-        date_match = JurisdictionPreprocessor.DATE_PATTERN.search(doc).group(1)
-        dict_info["date"] = date_match
-
-        # Retrieve Litigation Tematic
-        dict_info["keyphrases"] = self.extract_section_content(
-            doc, section_name=JurisdictionPreprocessor.KEYPHRASE_TITLE
-        )
-
-        # Retrieve Recurrent Entity
-        recurring_ent_match = JurisdictionPreprocessor.RECURRING_PATTERN.search(doc)
-        if recurring_ent_match:
-            rec_start_position = recurring_ent_match.span(1)[-1]
-            recurring_ent_match = self.extract_section_content(
-                doc, section_start_pos=rec_start_position
-            )
-        else:
-            recurring_ent_match = JurisdictionPreprocessor.INFO_NOT_FOUND_STRING
-
-        dict_info["recurring_part"] = recurring_ent_match
-
-        # Retrieve Apellant Entity
-        dict_info["appellant"] = self.extract_section_content(
-            doc, section_name=JurisdictionPreprocessor.APELLANT_TITLE
-        )
+        dict_info["date"] = doc[slice(*anchors["date"])]
+
+        # Retrieve Litigation Tematic, Recurrent and Apellant Entities, each
+        # one the rest of its title line
+        for field in ["keyphrases", "recurring_part", "appellant"]:
+            if field in anchors:
+                dict_info[field] = self.extract_section_content(
+                    doc, section_start_pos=anchors[field][1]
+                )
+            else:
+                dict_info[field] = cls.INFO_NOT_FOUND_STRING
 
-        # Factual Background section
-        match_new_facts = JurisdictionPreprocessor.FACTUAL_GROUND_HEADER_PATTERN.search(
-            doc
-        )
-        if match_new_facts:
-            background_end_position = match_new_facts.span()[0]
+        # Factual Background section, up to the factual grounds header
+        if "factual_grounds" in anchors and "factual_background" in anchors:
             factual_background = self.extract_section_content(
                 doc,
-                section_name=JurisdictionPreprocessor.FACTUAL_BACKGROUND_HEADER,
-                section_end_pos=background_end_position,
+                section_start_pos=anchors["factual_background"][1],
+                section_end_pos=anchors["factual_grounds"][0],
                 clean_text=False,
             )
             # Perform basic text cleaning operations
             factual_background = self.text_cleaning(factual_background)
         else:
-            background_end_position = 0
-            factual_background = JurisdictionPreprocessor.INFO_NOT_FOUND_STRING
+            factual_background = cls.INFO_NOT_FOUND_STRING
 
         dict_info["factual_background"] = factual_background
 
@@ -456,35 +678,32 @@ class JurisdictionPreprocessor:
         )
 
         # Factual Ground section
-        match_last_verdict = JurisdictionPreprocessor.VERDICT_HEADER_PATTERN.search(
-            doc[background_end_position:]
-        )
-        if match_new_facts and match_last_verdict:
-            # Obtain starn and end section positions from patterns
-            new_facts_start_position = match_new_facts.span()[1]
-            verdict_start_position = match_last_verdict.span()[0]
-            # Extract section string
+        if "factual_grounds" in anchors and "verdict_arguments" in anchors:
+            # NOTE: the end position has always been taken relative to the
+            # factual grounds header, kept so the saved sections do not change
             factual_grounds = self.extract_section_content(
                 doc,
-                section_start_pos=new_facts_start_position,
-                section_end_pos=verdict_start_position,
+                section_start_pos=anchors["factual_grounds"][1],
+                section_end_pos=(
+                    anchors["verdict_arguments"][0] - anchors["factual_grounds"][0]
+                ),
             )
 
             # Perform basic text cleaning operations
             factual_grounds = self.text_cleaning(factual_grounds)
         else:
-            factual_grounds = JurisdictionPreprocessor.INFO_NOT_FOUND_STRING
+            factual_grounds = cls.INFO_NOT_FOUND_STRING
 
         dict_info["factual_grounds"] = factual_grounds
 
         # Verdict argumentation
-        if match_last_verdict:
-            last_verdict = doc[match_last_verdict.span()[0] + background_end_position :]
+        if "verdict_arguments" in anchors:
+            last_verdict = doc[anchors["verdict_arguments"][0] :]
 
             # Perform basic text cleaning operations
             last_verdict = self.text_cleaning(last_verdict)
         else:
-            last_verdict = JurisdictionPreprocessor.INFO_NOT_FOUND_STRING
+            last_verdict = cls.INFO_NOT_FOUND_STRING
 
         dict_info["verdict_arguments"] = last_verdict
 
@@ -500,29 +719,154 @@ class JurisdictionPreprocessor:
 
         return dict_info
 
-    def standardize_text(self, text: str) -> str:
+    def find_section_anchors(self, doc: str) -> dict:
+        """
+        Finds the anchors of all sections of the document.
+
+        Only offsets are returned, sections are sliced from the document by
+        the caller when needed. All anchors are located in a single scan of
+        the document with `SECTION_ANCHOR_PATTERN`, which stops as soon as
+        every anchor has been found.
+
+        Parameters:
+            doc (str): The text of the document to segment.
+
+        Returns:
+            dict: (start, end) offsets in `doc` of the first occurrence of
+                each anchor found, by field name: "cendoj_id" and "date" span
+                the value itself and the rest span the title or header. The
+                verdict header ("verdict_arguments") is the first one after
+                the factual grounds header, or anywhere if that is missing.
         """
-        Tokenizes the input text, removes stopwords and common punctuation,
-        and lemmatizes it.
+        cls = JurisdictionPreprocessor
+        anchors = {}
+        verdict_after_grounds = False
+
+        for match in cls.SECTION_ANCHOR_PATTERN.finditer(doc):
+            field = match.lastgroup
+            span = match.span(cls.SECTION_ANCHOR_VALUE_GROUPS.get(field, field))
+
+            if field == "verdict_arguments":
+                if "factual_grounds" in anchors and not verdict_after_grounds:
+                    anchors[field] = span
+                    verdict_after_grounds = True
+                else:
+                    anchors.setdefault(field, span)
+            elif field not in anchors:
+                anchors[field] = span
 
-        The following text processing steps are performed on the input `text`:
-        1. Tokenizes the text into individual words.
-        2. Lemmatizes the remaining tokens using the spaCy NLP library.
+            if verdict_after_grounds and len(anchors) == len(cls.SECTION_ANCHORS):
+                break
+
+        # verdict headers before the factual grounds one are not the verdict
+        if "factual_grounds" in anchors and not verdict_after_grounds:
+            anchors.pop("verdict_arguments", None)
+
+        return anchors
+
+    def standardize_sections(self, list_of_dict_info: list) -> None:
+        """
+        Tokenize and lemmatize in place the long sections of a batch of
+        documents.
+
+        Parameters:
+            list_of_dict_info (list): Information extracted from each document.
+        """
+        for sec in JurisdictionPreprocessor.LONG_SECTIONS:
+            std_sections = self.standardize_texts(
+                [dict_info[sec] for dict_info in list_of_dict_info]
+            )
+            for dict_info, std_sec in zip(list_of_dict_info, std_sections):
+                dict_info[sec] = std_sec
+
+    def standardize_texts(
+        self, texts: List[str], n_process: int = 1, batch_size: int = None
+    ) -> List[str]:
+        """
+        Tokenizes and lemmatizes a batch of texts.
+
+        The following text processing steps are performed on each text:
+        1. Lowers and tokenizes the text into individual words.
+        2. Lemmatizes the tokens using the spaCy NLP library. Only tokens
+           missing from the lemma cache go through the pipeline, each one
+           once per batch, so the repeated legal vocabulary is lemmatized
+           once per process.
         3. Joins the lemmatized tokens back into a single string.
 
+        Tokens are lemmatized out of context, so a token always gets the
+        same lemma wherever it appears.
+
         Parameters:
-            text (str): The input text to be tokenized, cleaned, and lemmatized
+            texts (List[str]): The input texts to be tokenized and lemmatized.
+            n_process (int): Processes running the spacy pipeline. Use 1
+                inside pool workers, which cannot start processes.
+            batch_size (int): Tokens sent to the pipeline at once.
 
         Returns:
-            str: The lemmatized text after tokenization, stopword removal,
-            and lemmatization.
+            List[str]: The lemmatized texts, in input order.
         """
+        from nltk.tokenize import word_tokenize
+        from spacy.tokens import Doc
+
+        batch_size = batch_size or JurisdictionPreprocessor.LEMMA_BATCH_SIZE
+
         # Lower words and tokenize
-        # Keep word if not in stopword list
-        tokens = [i for i in word_tokenize(text.lower())]
-        # Word lemmatization
-        lemma_words = [word.lemma_ for word in self.nlp(" ".join(tokens))]
+        token_lists = [word_tokenize(text.lower()) for text in texts]
+
+        # Lemmas of this batch, taken from the cache or the pipeline
+        lemmas = {}
+        unseen_tokens = []
+        for tokens in token_lists:
+            for token in tokens:
+                if token in lemmas:
+                    continue
+                lemma = self.lemma_cache.get(token)
+                if lemma is None:
+                    unseen_tokens.append(token)
+                    lemma = token
+                else:
+                    self.lemma_cache.move_to_end(token)
+                lemmas[token] = lemma
+
+        # Word lemmatization, already tokenized docs skip the spacy tokenizer
+        docs = (Doc(self.nlp.vocab, words=[token]) for token in unseen_tokens)
+        for token, doc in zip(
+            unseen_tokens,
+            self.nlp.pipe(docs, n_process=n_process, batch_size=batch_size),
+        ):
+            lemma = doc[0].lemma_ or token
+            lemmas[token] = lemma
+            self.cache_lemma(token, lemma)
+
         # Join into a string
-        lemma_text = " ".join(lemma_words)
+        return [" ".join(lemmas[token] for token in tokens) for tokens in token_lists]
+
+    def cache_lemma(self, token: str, lemma: str) -> None:
+        self.lemma_cache[token] = lemma
+        if len(self.lemma_cache) > JurisdictionPreprocessor.LEMMA_CACHE_SIZE:
+            self.lemma_cache.popitem(last=False)
+
+    def standardize_text(self, text: str) -> str:
+        """
+        Tokenizes and lemmatizes the input text, see `standardize_texts`.
+
+        Parameters:
+            text (str): The input text to be tokenized and lemmatized.
+
+        Returns:
+            str: The lemmatized text.
+        """
+        return self.standardize_texts([text])[0]
+
+
+# Preprocessor of each worker process, built once by the pool initializer
+_WORKER_PREPROCESSOR = None
+
+
+def _init_preprocessing_worker():
+    global _WORKER_PREPROCESSOR
+    _WORKER_PREPROCESSOR = JurisdictionPreprocessor()
+
 
-        return lemma_text
+def _preprocess_batch(doc_batch):
+    return _WORKER_PREPROCESSOR.preprocess_batch(doc_batch)
@@ -2,27 +2,34 @@
 
 import json
 import os
+import queue
 import random
 import re
-from typing import List, Tuple
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterator, List, Tuple
 
 import numpy as np
-import pandas as pd
-from selenium.webdriver import Edge as EdgeDriver
-from selenium.webdriver import EdgeOptions
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.edge.service import Service as EdgeService
-from selenium.webdriver.remote.webelement import WebElement
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-from webdriver_manager.microsoft import EdgeChromiumDriverManager
-
-from scripts.data_processing.data_storage import JurisdictionDataBaseManager
+
+from scripts.data_processing.data_downloader import JurisdictionPDFDownloader
+from scripts.data_processing.data_link_resolver import JurisdictionLinkResolver
+from scripts.data_processing.data_storage import (
+    BufferedTableWriter,
+    JurisdictionDataBaseManager,
+    table_name_from_path,
+)
+
+# NOTE: selenium and webdriver_manager are imported on first use, they are
+# slow to import and only pages that need JavaScript open a browser
+if TYPE_CHECKING:
+    from selenium.webdriver import Edge as EdgeDriver
+    from selenium.webdriver.edge.service import Service as EdgeService
+    from selenium.webdriver.remote.webelement import WebElement
 
 # num requests will always be 4 as it is the maximum number of pages
 # in one search
 NUM_REQUESTS = 20
+# Browsers kept open to resolve the pages that need JavaScript
 NUM_PARALLEL_PROCS = 4
 ROOT_URL = "https://www.poderjudicial.es"
 ROTATING_USER_AGENTS_FILE = "data/user_agents.txt"
@@ -46,15 +53,81 @@ month_to_num = {
 }
 
 
+class EdgeDriverPool:
+    """
+    Browsers reused across pages, at most `size` open at once. They are
+    started on demand, so no browser is opened if none is needed. A browser
+    whose page raised is quit instead of lent again, it may have crashed.
+    """
+
+    def __init__(self, create_driver: Callable[[], "EdgeDriver"], size: int):
+        self.create_driver = create_driver
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.n_created = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def driver(self) -> Iterator["EdgeDriver"]:
+        """Borrow a browser, waiting for one if all `size` are busy"""
+        with self.lock:
+            create = self.idle.empty() and self.n_created < self.size
+            if create:
+                self.n_created += 1
+
+        if create:
+            try:
+                driver = self.create_driver()
+            except BaseException:
+                with self.lock:
+                    self.n_created -= 1
+                raise
+        else:
+            driver = self.idle.get()
+
+        try:
+            yield driver
+        except BaseException:
+            self.discard(driver)
+            raise
+        else:
+            self.idle.put(driver)
+
+    def discard(self, driver: "EdgeDriver") -> None:
+        """Quit a borrowed browser, a new one is started when needed"""
+        try:
+            driver.quit()
+        except Exception:
+            # the browser is already gone
+            pass
+        with self.lock:
+            self.n_created -= 1
+
+    def close(self) -> None:
+        """Quit the idle browsers, call once no browser is borrowed"""
+        while not self.idle.empty():
+            self.idle.get().quit()
+            with self.lock:
+                self.n_created -= 1
+
+
 class JurisdictionScrapper:
     def __init__(self):
         # load user agents
         with open(ROTATING_USER_AGENTS_FILE, "r") as file:
             self.agents = file.readlines()
 
-        # initialize driver's service and options
-        self.edge_service = EdgeService(
-            executable_path=EdgeChromiumDriverManager().install()
+        # driver executable, installed the first time a driver is needed.
+        # Each browser gets its own service (msedgedriver process) built on it
+        self._edge_driver_path = None
+        self.edge_driver_lock = threading.Lock()
+
+        # PDF links are resolved over HTTP, pages needing JavaScript go to a
+        # pool of reused browsers
+        self.browser_pool = EdgeDriverPool(self.init_driver, NUM_PARALLEL_PROCS)
+        self.link_resolver = JurisdictionLinkResolver(
+            JurisdictionPDFDownloader(self.agents),
+            browser_fallback=self.get_link_to_pdf_juris,
         )
 
         # load scrapper arguments
@@ -62,6 +135,7 @@ class JurisdictionScrapper:
             args = json.load(f)
 
         self.sqlite_table_path = args["db"]["sqlite_links_table_path"]
+        self.sqlite_table_name = table_name_from_path(self.sqlite_table_path)
         self.db_manager = JurisdictionDataBaseManager()
 
         # load db secrets
@@ -146,41 +220,77 @@ class JurisdictionScrapper:
 
         # for the second part, check if any links already in the database
         if os.path.exists(self.db_args["database_name"]):
-            # generate connection
-            self.db_manager.generate_connection("sqlite")
-            cur = self.db_manager.connection.cursor()
-            # get tables
-            res = cur.execute("SELECT name FROM sqlite_master")
-            tables = list(sum(res.fetchall(), ()))
-
-            # if table exists, get base_urls and remove them from link_set
-            if self.sqlite_table_path in tables:
-                base_urls = self.db_manager.get_query_data(
-                    f"SELECT base_url FROM {self.sqlite_table_path}"
+            with self.db_manager.session("sqlite"):
+                # get tables
+                tables = self.db_manager.get_query_data(
+                    "SELECT name FROM sqlite_master"
                 )
-                base_urls = list(sum(base_urls, ()))
+                tables = list(sum(tables, ()))
 
-                link_set = link_set - set(base_urls)
+                # if table exists, get base_urls and remove them from link_set
+                if self.sqlite_table_name in tables:
+                    base_urls = self.db_manager.get_query_data(
+                        f"SELECT base_url FROM {self.sqlite_table_name}"
+                    )
+                    base_urls = list(sum(base_urls, ()))
 
-        # extract remaining final pdf links
-        for lk in link_set:
-            self.link_extraction(lk)
+                    link_set = link_set - set(base_urls)
+
+        # extract remaining final pdf links, saved by batches as they resolve
+        try:
+            with BufferedTableWriter(
+                self.sqlite_table_path, ["base_url", "final_url"]
+            ) as link_writer:
+                for lk, pdf_base_lk in self.link_resolver.resolve_many(link_set):
+                    self.link_extraction(lk, pdf_base_lk, link_writer)
+        finally:
+            self.browser_pool.close()
+
+        print(
+            f"Resolved over HTTP: {self.link_resolver.n_http} | "
+            f"With browser: {self.link_resolver.n_browser}"
+        )
+
+    @property
+    def edge_driver_path(self) -> str:
+        """
+        Path of the Edge driver executable. Installing the driver may hit the
+        network, so it is only done once, when the first browser is opened.
+        """
+        with self.edge_driver_lock:
+            if self._edge_driver_path is None:
+                from webdriver_manager.microsoft import EdgeChromiumDriverManager
+
+                self._edge_driver_path = EdgeChromiumDriverManager().install()
+
+        return self._edge_driver_path
+
+    def edge_service(self) -> "EdgeService":
+        """
+        New Edge driver service. Every browser runs its own driver process,
+        so quitting a browser does not stop the driver of the others.
+        """
+        from selenium.webdriver.edge.service import Service as EdgeService
+
+        return EdgeService(executable_path=self.edge_driver_path)
 
     def load_np_array(self, path: str) -> List:
         return set(list(np.ravel(np.load(path, allow_pickle=True))[0]))
 
-    def link_extraction(self, lk: str) -> None:
+    def link_extraction(
+        self, lk: str, pdf_base_lk: str, link_writer: BufferedTableWriter
+    ) -> None:
         """
-        Extract links from a given URL and add them to the set.
+        Save the final link to the PDF of a given URL.
 
         Args:
-            lk (str): The URL from which to extract the link.
+            lk (str): The URL from which the link was extracted.
+            pdf_base_lk (str): The link to the PDF, None if not found.
+            link_writer (BufferedTableWriter): Writer of the links table.
         """
-        # Retrieve link
-        pdf_base_lk = self.get_link_to_pdf_juris(lk)
-
         # If no link is found, return
         if not pdf_base_lk:
+            self.n_fails += 1
             return
         else:
             self.n_success += 1
@@ -189,35 +299,35 @@ class JurisdictionScrapper:
 
         # Clean and generate final link
         pdf_final_lk = ROOT_URL + pdf_base_lk.replace("amp;", "")
-        df_url = pd.DataFrame(
-            list(zip([lk], [pdf_final_lk])), columns=["base_url", "final_url"]
-        )
-
-        self.db_manager("sqlite", self.sqlite_table_path, df_url)
+        link_writer.add((lk, pdf_final_lk))
 
-    def init_driver(self) -> EdgeDriver:
+    def init_driver(self) -> "EdgeDriver":
         """
-        Initialize and return a WebDriver instance.
+        Initialize and return a WebDriver instance. Called concurrently by
+        the browser pool, so the options are local to each driver.
 
         Returns:
         WebDriver: A WebDriver instance for web scraping.
         """
-        self.option = EdgeOptions()
-        self.option.add_argument("start-maximized")
-        self.option.add_argument("--disable-blink-features=AutomationControlled")
-        self.option.add_experimental_option("excludeSwitches", ["enable-automation"])
-        self.option.add_experimental_option("useAutomationExtension", False)
+        from selenium.webdriver import Edge as EdgeDriver
+        from selenium.webdriver import EdgeOptions
+
+        options = EdgeOptions()
+        options.add_argument("start-maximized")
+        options.add_argument("--disable-blink-features=AutomationControlled")
+        options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        options.add_experimental_option("useAutomationExtension", False)
 
         random_agent = random.choice(self.agents).removesuffix("\n")
 
-        driver = EdgeDriver(service=self.edge_service, options=self.option)
+        driver = EdgeDriver(service=self.edge_service(), options=options)
         driver.execute_cdp_cmd(
             "Network.setUserAgentOverride", {"userAgent": random_agent}
         )
 
         return driver
 
-    def get_general_link_href(self, element: WebElement) -> str:
+    def get_general_link_href(self, element: "WebElement") -> str:
         """
         Extracts the href value from the given WebElement.
 
@@ -238,44 +348,54 @@ class JurisdictionScrapper:
 
     def get_link_to_pdf_juris(self, general_link: str) -> str:
         """
-        Extracts the link to the PDF jurisprudence from the given general link.
+        Extracts the link to the PDF jurisprudence from the given general link
+        rendering the page in one of the pooled browsers.
 
         Parameters:
         general_link (str): The general link to the jurisprudence.
 
         Returns:
-        str: The link to the PDF jurisprudence.
+        str: The link to the PDF jurisprudence, None if it failed.
         """
-        driver = self.init_driver()
-        wait = WebDriverWait(driver, 30)
-
-        driver.get(general_link)
-
-        # Wait for the pop-up window to be clickable
         try:
-            pop_up_close_button = wait.until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, "button.close"))
-            )
-            pop_up_close_button.click()
-        except Exception:
-            # Handle the exception if the pop-up does not appear
-            # or the button is not clickable
-            print("Exception occurred while closing the pop-up")
-            self.n_fails += 1
-
-        try:
-            # get link to jurisprudence pdf
-            pdf_box_element = driver.find_element(By.ID, "objtcontentpdf")
-            link = self.get_general_link_href(pdf_box_element)
-        except Exception:
-            print("Exception occurred while searching for objtcontentpdf")
-            link = None
-            self.n_fails += 1
+            return self.render_link_to_pdf_juris(general_link)
+        except Exception as error:
+            # counted as a failed link, the other pages go on
+            print(f"Failed to render {general_link}. Error: {error}")
+            return None
+
+    def render_link_to_pdf_juris(self, general_link: str) -> str:
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        with self.browser_pool.driver() as driver:
+            wait = WebDriverWait(driver, 30)
+
+            driver.get(general_link)
+
+            # Wait for the pop-up window to be clickable
+            try:
+                pop_up_close_button = wait.until(
+                    EC.element_to_be_clickable((By.CSS_SELECTOR, "button.close"))
+                )
+                pop_up_close_button.click()
+            except Exception:
+                # Handle the exception if the pop-up does not appear
+                # or the button is not clickable
+                print("Exception occurred while closing the pop-up")
+
+            try:
+                # get link to jurisprudence pdf
+                pdf_box_element = driver.find_element(By.ID, "objtcontentpdf")
+                link = self.get_general_link_href(pdf_box_element)
+            except Exception:
+                print("Exception occurred while searching for objtcontentpdf")
+                link = None
 
-        driver.quit()
         return link
 
-    def get_date_and_format(self, driver: EdgeDriver) -> str:
+    def get_date_and_format(self, driver: "EdgeDriver") -> str:
         """
         Extracts the last jurisprudence date from the web page and formats it.
 
@@ -285,6 +405,8 @@ class JurisdictionScrapper:
         Returns:
         str: The formatted last jurisprudence date (DD/MM/YYYY).
         """
+        from selenium.webdriver.common.by import By
+
         # Identify last element's title
         xpath_content = (
             "//div[starts-with(@id, 'jurisprudenciaresults_content-')]"  # noqa: E501
@@ -320,6 +442,11 @@ class JurisdictionScrapper:
         Tuple[str, List[str]]: A tuple containing the last jurisprudence date
                                and a list of links to jurisprudences.
         """
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.keys import Keys
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
         driver = self.init_driver()
 
         wait = WebDriverWait(driver, 30)
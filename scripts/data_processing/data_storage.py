@@ -1,28 +1,202 @@
+import io
 import json
 import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
 
-import psycopg2
-from pandas import DataFrame
+import numpy as np
 
 VECTOR_DB_SECRETS = "database_secrets.json"
 
+# Connections kept open per process by each Postgres pool
+PGVECTOR_POOL_MIN_CONNECTIONS = 1
+PGVECTOR_POOL_MAX_CONNECTIONS = 8
+
+# Set on every SQLite connection: WAL lets readers work while the pipeline
+# writes, and waiting on a lock beats failing with "database is locked"
+SQLITE_TIMEOUT = 30
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+]
+# Current time in SQLite, millisecond timestamps that compare in order as text
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# pgvector approximate k-NN indexes (cosine distance), built once the
+# vectors of a table have been loaded
+PGVECTOR_INDEX_TEMPLATES = {
+    "hnsw": (
+        "CREATE INDEX IF NOT EXISTS {table}_vector_idx ON {table} "
+        "USING hnsw (vector vector_cosine_ops) "
+        "WITH (m = {m}, ef_construction = {ef_construction})"
+    ),
+    "ivfflat": (
+        "CREATE INDEX IF NOT EXISTS {table}_vector_idx ON {table} "
+        "USING ivfflat (vector vector_cosine_ops) WITH (lists = {lists})"
+    ),
+}
+
+# Rows sent per COPY statement by the bulk vector loader
+PGVECTOR_COPY_CHUNK_ROWS = 10000
+# Rows held by the client at a time when reading vectors back
+PGVECTOR_FETCH_CHUNK_ROWS = 5000
+# Binary COPY header (signature, flags, header extension length) and trailer
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + b"\x00\x00\x00\x00" * 2
+PGCOPY_TRAILER = b"\xff\xff"
+
+# Query-time knob of each pgvector index type
+PGVECTOR_SEARCH_SETTINGS = {
+    "hnsw": ("hnsw.ef_search", "ef_search"),
+    "ivfflat": ("ivfflat.probes", "probes"),
+}
+
+
+def to_pgvector_literal(vector) -> str:
+    """Format a 1-d vector as a pgvector text literal: '[x1,x2,...]'"""
+    return "[" + ",".join(map(str, vector.tolist())) + "]"
+
+
+def format_vector_rows(ids, vectors) -> list:
+    """Pair each document id with its vector formatted for pgvector"""
+    return [(int(i), to_pgvector_literal(vec)) for i, vec in zip(ids, vectors)]
+
+
+def pgcopy_vector_rows(ids, vectors) -> bytes:
+    """
+    Encode (id INTEGER, vector) rows in the binary COPY format, all at once
+    with NumPy: every tuple is the field count, then each field's length and
+    big-endian value. pgvector reads a vector as its dimension, an unused
+    int16 and the float4 components.
+    """
+    dim = vectors.shape[1]
+    tuples = np.empty(
+        len(ids),
+        dtype=[
+            ("n_fields", ">i2"),
+            ("id_size", ">i4"),
+            ("id", ">i4"),
+            ("vector_size", ">i4"),
+            ("dim", ">i2"),
+            ("unused", ">i2"),
+            ("vector", ">f4", (dim,)),
+        ],
+    )
+    tuples["n_fields"] = 2
+    tuples["id_size"] = 4
+    tuples["id"] = ids
+    tuples["vector_size"] = 4 + 4 * dim
+    tuples["dim"] = dim
+    tuples["unused"] = 0
+    tuples["vector"] = vectors
+
+    return PGCOPY_HEADER + tuples.tobytes() + PGCOPY_TRAILER
+
+
+def table_name_from_path(table_path):
+    """Table created by a .sql file, named after the file"""
+    return os.path.basename(table_path).replace(".sql", "")
+
+
+@lru_cache(maxsize=None)
+def read_db_secrets(secrets_path=VECTOR_DB_SECRETS):
+    """Database secrets, read once per process"""
+    with open(secrets_path) as f:
+        return json.load(f)
+
+
+# Postgres connection pools and per-thread SQLite connections of this
+# process. Both are tagged with the pid that opened them: connections must
+# not cross a fork into pool workers, those open their own
+_PGVECTOR_POOLS = {}
+_PGVECTOR_POOLS_LOCK = threading.Lock()
+_SQLITE_CONNECTIONS = threading.local()
+
+
+def get_pgvector_pool(db_args):
+    """Thread-safe Postgres connection pool of this process"""
+    from psycopg2.pool import ThreadedConnectionPool
+
+    key = (
+        os.getpid(),
+        db_args.get("host", "localhost"),
+        db_args["port"],
+        db_args["database_name"],
+        db_args["user"],
+    )
+    with _PGVECTOR_POOLS_LOCK:
+        if key not in _PGVECTOR_POOLS:
+            _PGVECTOR_POOLS[key] = ThreadedConnectionPool(
+                PGVECTOR_POOL_MIN_CONNECTIONS,
+                PGVECTOR_POOL_MAX_CONNECTIONS,
+                host=db_args.get("host", "localhost"),
+                port=db_args["port"],
+                database=db_args["database_name"],
+                user=db_args["user"],
+                password=db_args["password"],
+            )
+
+        return _PGVECTOR_POOLS[key]
+
+
+def get_sqlite_connection(database_path):
+    """SQLite connection of the calling thread, opened once"""
+    connections = getattr(_SQLITE_CONNECTIONS, "by_path", None)
+    if connections is None or _SQLITE_CONNECTIONS.pid != os.getpid():
+        connections = _SQLITE_CONNECTIONS.by_path = {}
+        _SQLITE_CONNECTIONS.pid = os.getpid()
+
+    if database_path not in connections:
+        connection = sqlite3.connect(database_path, timeout=SQLITE_TIMEOUT)
+        for pragma in SQLITE_PRAGMAS:
+            connection.execute(pragma)
+        connections[database_path] = connection
+
+    return connections[database_path]
+
+
+def close_pooled_connections():
+    """Close the pools and the calling thread's SQLite connections"""
+    with _PGVECTOR_POOLS_LOCK:
+        for key in [key for key in _PGVECTOR_POOLS if key[0] == os.getpid()]:
+            _PGVECTOR_POOLS.pop(key).closeall()
+
+    if getattr(_SQLITE_CONNECTIONS, "pid", None) == os.getpid():
+        for connection in _SQLITE_CONNECTIONS.by_path.values():
+            connection.close()
+        _SQLITE_CONNECTIONS.by_path = {}
+
 
 class JurisdictionDataBaseManager:
-    def __init__(self):
-        pass
+    """
+    Access to the SQLite and pgvector databases through pooled connections:
+    a thread-safe pool per process for Postgres and one connection per
+    thread for SQLite, opened on first use and then reused. Secrets are read
+    once per process.
 
-    def __call__(self, conn_type, table_path, data):
-        # connect to DB
-        self.generate_connection(conn_type)
+    Prefer the `session` context manager, `generate_connection`/`exit_db`
+    borrow and give back a connection the same way. A manager holds the
+    connection of its current session, so each thread needs its own manager.
+    """
 
-        # create table for processed data
-        # self.create_table(table_path)
+    def __init__(self):
+        self.connection = None
+        self.conn_type = None
 
-        # NOTE: Verify connection exists !
+    def __call__(self, conn_type, table_path, data, recreate=False, index_params=None):
+        with self.session(conn_type):
+            # (re)create table for vectors when they are all being replaced
+            if recreate:
+                self.create_table(table_path)
 
-        try:
-            if type(data) is DataFrame:
+            # pandas DataFrames go through to_sql, anything else are vector
+            # rows (checked without importing pandas)
+            if hasattr(data, "to_sql"):
                 data.to_sql(
                     table_path, self.connection, if_exists="append", index=False
                 )
@@ -32,50 +206,302 @@ class JurisdictionDataBaseManager:
 
                 self.insert_embeddings_into_pgvector_table(table_name, data)
 
-            self.connection.commit()
-            self.exit_db()
-
-        except Exception as error:
-            self.exit_db()
-            raise error
+                # index after loading, building it row by row is much slower
+                if index_params:
+                    self.create_vector_index(table_name, index_params)
 
-    def generate_connection(self, conn_type):
-        # load db secrets
-        with open(VECTOR_DB_SECRETS) as f:
-            db_args = json.load(f)
+    @staticmethod
+    def acquire_connection(conn_type):
+        db_args = read_db_secrets()
 
         if conn_type == "pgvector":
-            self.connection = psycopg2.connect(
-                host="localhost",
-                port=db_args["port"],
-                database=db_args["database_name"],
-                user=db_args["user"],
-                password=db_args["password"],
-            )
+            return get_pgvector_pool(db_args).getconn()
 
         elif conn_type == "sqlite":
-            self.connection = sqlite3.connect(db_args["database_name"])
+            return get_sqlite_connection(db_args["database_name"])
+
+        raise ValueError(f"Unknown connection type: {conn_type}")
+
+    @staticmethod
+    def release_connection(conn_type, connection):
+        """
+        Give a connection back. Uncommitted changes are rolled back, as
+        closing the connection used to do. SQLite connections are shared by
+        the managers of a thread, so do not leave a transaction open across
+        another session on the same thread.
+        """
+        if conn_type == "pgvector":
+            # the pool rolls back open transactions
+            get_pgvector_pool(read_db_secrets()).putconn(connection)
+
+        elif connection.in_transaction:
+            connection.rollback()
+
+    @contextmanager
+    def session(self, conn_type):
+        """
+        Pooled connection for a unit of work, committed on success and rolled
+        back on error. The manager methods use it meanwhile.
+
+        Usage:
+            with db_manager.session("sqlite") as connection:
+                connection.execute(...)
+                db_manager.get_query_data(...)
+        """
+        previous = self.conn_type, self.connection
+        self.generate_connection(conn_type)
+        try:
+            yield self.connection
+            self.connection.commit()
+        finally:
+            self.exit_db()
+            self.conn_type, self.connection = previous
+
+    def generate_connection(self, conn_type):
+        self.conn_type = conn_type
+        self.connection = self.acquire_connection(conn_type)
 
     def create_table(self, table_path):
         cursor = self.connection.cursor()
 
         with open(table_path, "r") as handle:
-            cursor.execute(handle.read())
+            statements = handle.read()
+
+        # tables may come with their indexes, sqlite3 runs one statement per
+        # execute
+        if isinstance(self.connection, sqlite3.Connection):
+            cursor.executescript(statements)
+        else:
+            cursor.execute(statements)
 
         cursor.close()
 
-    def insert_embeddings_into_pgvector_table(self, table_name, vector_list):
+    def insert_embeddings_into_pgvector_table(self, table_name, vector_rows):
         cursor = self.connection.cursor()
-        # SQL statement to insert vectors into the table
-        sql = f"INSERT INTO {table_name} (vector) VALUES (%s)"
+        # SQL statement to insert (id, vector literal) rows into the table
+        sql = f"INSERT INTO {table_name} (id, vector) VALUES (%s, %s::vector)"
         # Execute the SQL statement with multiple sets of parameters
-        cursor.executemany(sql, vector_list)
+        cursor.executemany(sql, vector_rows)
+        cursor.close()
+
+    def copy_vectors_into_pgvector_table(self, table_name, ids, vectors, chunk_rows):
+        """
+        Stream vectors into a table with binary COPY, one statement per chunk
+        of rows. Sparse vectors are densified one chunk at a time.
+
+        Parameters:
+            table_name (str): pgvector table with (id, vector) columns.
+            ids (np.ndarray): Document id of each vector.
+            vectors (np.ndarray | scipy.sparse matrix): One vector per row.
+            chunk_rows (int): Rows sent per COPY statement.
+        """
+        cursor = self.connection.cursor()
+        for start in range(0, vectors.shape[0], chunk_rows):
+            chunk = vectors[start : start + chunk_rows]
+            if hasattr(chunk, "toarray"):
+                chunk = chunk.toarray()
+
+            buffer = io.BytesIO(
+                pgcopy_vector_rows(ids[start : start + chunk_rows], chunk)
+            )
+            cursor.copy_expert(
+                f"COPY {table_name} (id, vector) FROM STDIN WITH (FORMAT binary)",
+                buffer,
+            )
+        cursor.close()
+
+    def bulk_load_vectors(
+        self,
+        table_path,
+        ids,
+        vectors,
+        recreate=False,
+        staging=False,
+        index_params=None,
+        chunk_rows=None,
+    ):
+        """
+        Load vectors into a pgvector table with COPY, much faster than
+        inserting rows one statement at a time.
+
+        With `recreate` and `staging`, the vectors are loaded and indexed in
+        an unlogged copy of the table, which skips the write-ahead log while
+        loading, and is then swapped in with a rename: searches keep using
+        the old table until the new one is complete. Otherwise the table is
+        (re)created, loaded and indexed in a single transaction.
+
+        Parameters:
+            table_path (str): .sql file creating the table.
+            ids (np.ndarray): Document id of each vector.
+            vectors (np.ndarray | scipy.sparse matrix): One vector per row.
+            recreate (bool): Replace the vectors of the table.
+            staging (bool): Load through an unlogged staging table, only used
+                along with `recreate`.
+            index_params (dict): pgvector index built after loading.
+            chunk_rows (int): Rows sent per COPY statement.
+        """
+        table_name = table_name_from_path(table_path)
+        chunk_rows = chunk_rows or PGVECTOR_COPY_CHUNK_ROWS
+        ids = np.asarray(ids)
+        start = time.perf_counter()
+
+        if recreate and staging:
+            self.load_through_staging_table(
+                table_path, ids, vectors, index_params, chunk_rows
+            )
+        else:
+            with self.session("pgvector"):
+                if recreate:
+                    self.create_table(table_path)
+                self.copy_vectors_into_pgvector_table(
+                    table_name, ids, vectors, chunk_rows
+                )
+                if recreate and index_params:
+                    self.create_vector_index(table_name, index_params)
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"Loaded {len(ids)} vectors into {table_name} in {elapsed:.1f} s "
+            f"({len(ids) / max(elapsed, 1e-9):.0f} rows/s)"
+        )
+
+    def load_through_staging_table(
+        self, table_path, ids, vectors, index_params, chunk_rows
+    ):
+        table_name = table_name_from_path(table_path)
+        staging_name = f"{table_name}_staging"
+
+        with self.session("pgvector") as connection:
+            cursor = connection.cursor()
+            # the table is only created on the first load, to copy its columns
+            cursor.execute("SELECT to_regclass(%s)", (table_name,))
+            if cursor.fetchone()[0] is None:
+                self.create_table(table_path)
+            # columns only, the primary key is added once the rows are in
+            cursor.execute(f"DROP TABLE IF EXISTS {staging_name}")
+            cursor.execute(
+                f"CREATE UNLOGGED TABLE {staging_name} "
+                f"(LIKE {table_name} INCLUDING DEFAULTS)"
+            )
+            cursor.close()
+
+        with self.session("pgvector") as connection:
+            self.copy_vectors_into_pgvector_table(
+                staging_name, ids, vectors, chunk_rows
+            )
+            cursor = connection.cursor()
+            cursor.execute(f"ALTER TABLE {staging_name} ADD PRIMARY KEY (id)")
+            cursor.close()
+            if index_params:
+                self.create_vector_index(staging_name, index_params)
+            # crash safe again before replacing the live table
+            cursor = connection.cursor()
+            cursor.execute(f"ALTER TABLE {staging_name} SET LOGGED")
+            cursor.close()
+
+        # swap in one short transaction, readers wait for it at most
+        with self.session("pgvector") as connection:
+            cursor = connection.cursor()
+            cursor.execute(f"DROP TABLE {table_name}")
+            cursor.execute(f"ALTER TABLE {staging_name} RENAME TO {table_name}")
+            cursor.execute(
+                f"ALTER INDEX {staging_name}_pkey RENAME TO {table_name}_pkey"
+            )
+            cursor.execute(
+                f"ALTER INDEX IF EXISTS {staging_name}_vector_idx "
+                f"RENAME TO {table_name}_vector_idx"
+            )
+            cursor.close()
+
+    def create_vector_index(self, table_name, index_params):
+        cursor = self.connection.cursor()
+        template = PGVECTOR_INDEX_TEMPLATES[index_params["type"]]
+        cursor.execute(template.format(table=table_name, **index_params))
+        cursor.close()
+
+    def search_similar_vectors(self, table_name, query_vector, k, index_params=None):
+        """
+        Run the k-NN search on the server, ranking by cosine distance with
+        the table's pgvector index so only the k best ids are returned.
+
+        Parameters:
+            table_name (str): pgvector table to search.
+            query_vector (np.ndarray): 1-d query embedding.
+            k (int): Number of results.
+            index_params (dict): pgvector index parameters, used to set the
+                query-time ef_search / probes for this transaction.
+
+        Returns:
+            List[int]: Ids of the k most similar vectors, best first.
+        """
+        cursor = self.connection.cursor()
+
+        if index_params:
+            setting, param = PGVECTOR_SEARCH_SETTINGS[index_params["type"]]
+            cursor.execute(f"SET LOCAL {setting} = {int(index_params[param])}")
+
+        cursor.execute(
+            f"SELECT id FROM {table_name} ORDER BY vector <=> %s::vector LIMIT %s",
+            (to_pgvector_literal(query_vector), k),
+        )
+        ranked_ids = [row[0] for row in cursor.fetchall()]
         cursor.close()
 
-    def load_data_from_table(self, table_name, columns, condition_ids=None):
+        return ranked_ids
+
+    def load_vectors(self, table_name, chunk_rows=None):
+        """
+        Read the vectors of a pgvector table into a contiguous float32 matrix,
+        allocated once from the row count and dimension. Rows come through a
+        named (server-side) cursor `chunk_rows` at a time, and each pgvector
+        literal is parsed straight into its row, so the peak memory is about
+        the size of the matrix.
+
+        Parameters:
+            table_name (str): pgvector table with (id, vector) columns.
+            chunk_rows (int): Rows fetched per round trip.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: int64 ids and float32 vectors, in
+                id order.
+        """
+        chunk_rows = chunk_rows or PGVECTOR_FETCH_CHUNK_ROWS
+
+        cursor = self.connection.cursor()
+        cursor.execute(f"SELECT count(*), max(vector_dims(vector)) FROM {table_name}")
+        n_rows, dim = cursor.fetchone()
+        cursor.close()
+
+        ids = np.empty(n_rows, dtype=np.int64)
+        vectors = np.empty((n_rows, dim or 0), dtype=np.float32)
+
+        # rows added since the count are left out
+        cursor = self.connection.cursor(name=f"load_{table_name}_vectors")
+        cursor.itersize = chunk_rows
+        cursor.execute(
+            f"SELECT id, vector::text FROM {table_name} ORDER BY id LIMIT %s",
+            (n_rows,),
+        )
+        n_loaded = 0
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            for i, (row_id, literal) in enumerate(rows, n_loaded):
+                ids[i] = row_id
+                vectors[i] = np.fromstring(literal[1:-1], dtype=np.float32, sep=",")
+            n_loaded += len(rows)
+        cursor.close()
+
+        # fewer rows if some were deleted since the count
+        return ids[:n_loaded], vectors[:n_loaded]
+
+    def load_data_from_table(
+        self, table_name, columns, condition_ids=None, id_column="id"
+    ):
         if condition_ids:
             str_ids = ",".join(map(str, condition_ids))
-            condition_query = f"WHERE id IN ({str_ids})"
+            condition_query = f"WHERE {id_column} IN ({str_ids})"
         else:
             condition_query = ""
 
@@ -92,4 +518,105 @@ class JurisdictionDataBaseManager:
         return results
 
     def exit_db(self):
-        self.connection.close()
+        if self.connection is not None:
+            self.release_connection(self.conn_type, self.connection)
+            self.connection = None
+
+
+class BufferedTableWriter:
+    """
+    Buffers rows for an SQLite table and inserts them with `executemany`, in
+    one transaction per flush, every `flush_rows` rows or `flush_seconds`
+    seconds, whichever comes first. Full buffers are written by the thread
+    adding the rows, the time-based flushes by a timer thread, so rows are
+    written even while none arrive.
+
+    Use it as a context manager: the table is created if missing and the
+    timer started on enter, and the buffered rows are flushed on exit, also
+    when leaving on an exception, so at most `flush_seconds` of rows are lost
+    on a hard crash. Rows already in the table (same primary key) are
+    ignored, so resuming writes is safe.
+    """
+
+    # Rows buffered before being written
+    FLUSH_ROWS = 500
+    # Seconds a row may wait in the buffer
+    FLUSH_SECONDS = 5.0
+
+    def __init__(self, table_path, columns, flush_rows=None, flush_seconds=None):
+        """
+        Parameters:
+            table_path (str): .sql file creating the table.
+            columns (List[str]): Columns of each row, in order.
+            flush_rows (int): Rows buffered before being written.
+            flush_seconds (float): Seconds a row may wait in the buffer.
+        """
+        self.table_path = table_path
+        self.columns = columns
+        self.flush_rows = flush_rows or BufferedTableWriter.FLUSH_ROWS
+        self.flush_seconds = flush_seconds or BufferedTableWriter.FLUSH_SECONDS
+
+        self.insert_query = (
+            f"INSERT OR IGNORE INTO {table_name_from_path(table_path)} "
+            f"({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        )
+        self.buffer = []
+        self.n_written = 0
+        self.last_flush = time.monotonic()
+
+        # the buffer is shared with the timer thread, each thread writes
+        # through its own SQLite connection
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.timer = None
+
+    def __enter__(self):
+        db_manager = JurisdictionDataBaseManager()
+        with db_manager.session("sqlite"):
+            db_manager.create_table(self.table_path)
+
+        self.last_flush = time.monotonic()
+        self.stopped.clear()
+        self.timer = threading.Thread(target=self.flush_periodically, daemon=True)
+        self.timer.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.timer.join()
+        self.flush()
+
+    def add(self, row):
+        """Buffer a row, flushing the buffer if it is full"""
+        with self.lock:
+            self.buffer.append(row)
+            full = len(self.buffer) >= self.flush_rows
+
+        if full:
+            self.flush()
+
+    def flush_periodically(self):
+        """Timer thread: flush the buffer `flush_seconds` after the last flush"""
+        while not self.stopped.wait(
+            max(self.last_flush + self.flush_seconds - time.monotonic(), 0)
+        ):
+            if time.monotonic() - self.last_flush < self.flush_seconds:
+                continue
+            try:
+                self.flush()
+            except Exception as error:
+                # the rows stay buffered, written by a later flush
+                print(f"Failed to flush rows to {self.table_path}. Error: {error}")
+
+    def flush(self):
+        """Write the buffered rows in a single transaction"""
+        with self.lock:
+            self.last_flush = time.monotonic()
+            if not self.buffer:
+                return
+
+            db_manager = JurisdictionDataBaseManager()
+            with db_manager.session("sqlite") as connection:
+                connection.executemany(self.insert_query, self.buffer)
+            self.n_written += len(self.buffer)
+            self.buffer = []
@@ -1,23 +1,27 @@
 import os
 import tempfile
 
-import docx2txt
-import faiss
-import numpy as np
-import PyPDF2
 import streamlit as st
-from data_processing.data_storage import JurisdictionDataBaseManager
 
-from models.tfidf_model import TFIDFModel
-from models.w2v_model import Word2VecModel
+from models.sentence_filters import LEGAL_COSTS_CODES, VERDICT_CODES
+from scripts.search_service import JurisdictionSearchEngine
 
 CURDIR = os.path.dirname(__file__)
 MODEL_PATH = os.path.join(CURDIR, "data/models/vectorizer.pickle")
 
-DICT_CATEGORY_MODEL = {"TfIdf": TFIDFModel(), "WordVector": Word2VecModel()}
+
+@st.cache_resource
+def get_search_engine():
+    """
+    Search engine shared by all reruns and sessions of the app. It loads each
+    model the first time its category is selected and caches the queries.
+    """
+    return JurisdictionSearchEngine()
 
 
 def extract_text_from_pdf(file_path):
+    import PyPDF2
+
     with open(file_path, "rb") as file:
         reader = PyPDF2.PdfReader(file)
         num_pages = len(reader.pages)
@@ -28,50 +32,20 @@ def extract_text_from_pdf(file_path):
 
 
 def extract_text_from_docx(file_path):
+    import docx2txt
+
     text = docx2txt.process(file_path)
     return text
 
 
-def normalize_embeddings(embeddings):
-    """Normalize the embeddings"""
-    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
-
-
-def build_faiss_index(embeddings, ids):
-    """Build the FAISS index"""
-    # Cosine similarity index
-    index = faiss.IndexFlatIP(embeddings.shape[1])
-    index.add(embeddings)
-    return index
-
-
-def perform_similarity_search(category, model, query_text, k):
-    """Perform similarity search"""
-    db_pgvec = JurisdictionDataBaseManager()
-    db_pgvec.generate_connection("pgvector")
-
-    result = db_pgvec.load_data_from_table(category.lower(), "id, vector")
-
-    ids, embeddings = zip(*result)
-    index = build_faiss_index(np.array(embeddings), np.array(ids))
-
-    query_embedding = model.get_query_vector(query_text)
-
-    # generate similarity scores and sorted index list
-    _, index_list = index.search(query_embedding, k)
-    index_list = index_list.tolist()[0]
-    return index_list
-
-
 def streamlit_app():
     """Streamlit app"""
-    db_sqlite = JurisdictionDataBaseManager()
-    db_sqlite.generate_connection("sqlite")
+    engine = get_search_engine()
 
     st.title("Similar Document Search")
 
     st.write("Select a category")
-    category = st.selectbox("categories", list(DICT_CATEGORY_MODEL))
+    category = st.selectbox("categories", engine.categories)
 
     new_document = st.text_input("Enter a new document:")
 
@@ -81,10 +55,18 @@ def streamlit_app():
 
     number_results = st.text_input("Enter the number of results [1 - 50]:")
 
-    if category and number_results and (new_document or uploaded_file):
-        model = DICT_CATEGORY_MODEL.get(category)
-        model.load()
+    # filters on the sentence metadata, empty ones are not applied
+    st.sidebar.header("Filters")
+    filters = {
+        "date_from": st.sidebar.text_input("From date (yyyy-mm-dd)"),
+        "date_to": st.sidebar.text_input("To date (yyyy-mm-dd)"),
+        "first_verdict": st.sidebar.multiselect("First verdict", list(VERDICT_CODES)),
+        "last_verdict": st.sidebar.multiselect("Last verdict", list(VERDICT_CODES)),
+        "legal_costs": st.sidebar.multiselect("Legal costs", list(LEGAL_COSTS_CODES)),
+    }
+    filters = {key: value for key, value in filters.items() if value}
 
+    if category and number_results and (new_document or uploaded_file):
         number_results = int(number_results)
 
         # Retrieve text from uploaded file
@@ -104,17 +86,23 @@ def streamlit_app():
                     )
                     return
 
-        top_k_ids = perform_similarity_search(
-            category, model, new_document, number_results
+        # repeated queries (and reruns of the script) skip the search
+        try:
+            top_k_ids = engine.search(category, new_document, number_results, filters)
+        except ValueError as error:
+            st.error(str(error))
+            return
+        stats = engine.query_cache.stats()
+        st.sidebar.caption(
+            f"Query cache hit rate: {stats['results']['hit_rate']:.0%} results, "
+            f"{stats['vectors']['hit_rate']:.0%} vectors"
         )
 
-        # retrieve document information for top results
-        results = db_sqlite.load_data_from_table("sentence", "*", top_k_ids)
-
-        # retrieve column names for retrieved info
-        info_table = db_sqlite.get_query_data("PRAGMA table_info(sentence)")
-        # Extract the column names from the results
-        column_names = [result[1] for result in info_table]
+        # retrieve document information for top results, in ranking order,
+        # without the sentence_id
+        sentences = engine.sentences(top_k_ids)
+        results = [list(sentence.values())[1:] for sentence in sentences]
+        column_names = list(sentences[0])[1:] if sentences else []
 
         st.header("Similar documents:")
         for result in results:
@@ -0,0 +1,423 @@
+"""
+Headless similarity search service.
+
+Loads the models and their search indexes once at startup and answers JSON
+requests over HTTP, one thread per connection:
+
+    GET  /health
+    POST /search        {"category": "TfIdf", "query": "...", "k": 10}
+    POST /search/batch  {"category": "TfIdf", "queries": ["...", ...], "k": 10}
+    GET  /sentences?ids=12,7,31
+
+Searches take optional "filters" on the sentence metadata, e.g. partially
+upheld, with costs, since 2021:
+
+    {"last_verdict": "EP", "legal_costs": true, "date_from": "2021-01-01"}
+
+Search responses hold the ranked sentences with their metadata from SQLite,
+or only their `sentence_id` with "metadata": false. A batch is vectorized as
+one matrix and answered with one index search. With `retrieval: "hybrid"` in
+the config, BM25 candidates are re-ranked with the model vectors instead.
+
+Run from the repository root:
+    $ python -m scripts.search_service --port 8000
+"""
+import argparse
+import copy
+import json
+import os
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from scipy.sparse import issparse
+
+from models.bm25_index import load_latest_bm25_index
+from models.query_cache import QueryCache, model_version
+from models.sentence_filters import parse_filters
+from models.tfidf_model import TFIDFModel
+from models.utils import CONFIG_PATH, read_config
+from models.w2v_model import Word2VecModel
+from scripts.data_processing.data_storage import JurisdictionDataBaseManager
+
+DICT_CATEGORY_MODEL = {"TfIdf": TFIDFModel, "WordVector": Word2VecModel}
+
+SENTENCE_TABLE = "sentence"
+# Limits of a single request
+MAX_K = 50
+MAX_BATCH_QUERIES = 256
+# Seconds between checks for refitted models and newly published indexes
+VERSION_CHECK_SECONDS = 5
+
+
+class JurisdictionSearchEngine:
+    """
+    Similarity search over the published indexes of every model category,
+    shared by the app and the HTTP service.
+
+    Models are loaded on first use together with the indexes their searches
+    read, and loaded again once they are refitted or the indexes published
+    again, checked at most every `VERSION_CHECK_SECONDS`. Searches go through
+    a `QueryCache`, and the metadata of the results is read from the SQLite
+    sentence table.
+
+    One engine serves concurrent requests, so each database read goes through
+    its own `JurisdictionDataBaseManager`: a manager holds the connection of
+    its current session and cannot be shared by threads.
+    """
+
+    def __init__(self):
+        config = read_config(CONFIG_PATH)
+        self.query_cache = QueryCache(**config["general"]["query_cache"])
+        self.retrieval = config["general"]["retrieval"]
+        self.bm25_params = config["bm25"]
+
+        self.models = {}
+        # category -> time.monotonic() of the next check for new versions
+        self.next_check = {}
+        self.models_lock = threading.Lock()
+        self.sentence_columns = None
+
+    @property
+    def categories(self) -> list:
+        return list(DICT_CATEGORY_MODEL)
+
+    def model(self, category: str):
+        """
+        Loaded model of a category, with its `version` and the indexes its
+        searches read: `index` and, in hybrid retrieval, `bm25_index`.
+
+        A loaded model is never changed, new versions are loaded into a new
+        one. A search holding it reads the same versions throughout, the ones
+        its cached results are keyed by.
+        """
+        if category not in DICT_CATEGORY_MODEL:
+            raise ValueError(
+                f"Unknown category '{category}'. "
+                f"Use one of: {', '.join(DICT_CATEGORY_MODEL)}."
+            )
+
+        with self.models_lock:
+            model = self.models.get(category)
+            now = time.monotonic()
+            if model is None or now >= self.next_check[category]:
+                model = self.load_model(category, model)
+                self.models[category] = model
+                self.next_check[category] = now + VERSION_CHECK_SECONDS
+
+        return model
+
+    def load_model(self, category: str, loaded_model=None):
+        """
+        Load the model of a category with its indexes, reusing what has not
+        been published again since `loaded_model` was loaded.
+        """
+        model = loaded_model
+        if model is None or model_version(model) != model.version:
+            model = DICT_CATEGORY_MODEL[category]()
+            model.load()
+            model.version = model_version(model)
+
+        # loaded from disk once per process and index version
+        index = model.load_index()
+        bm25_index = None
+        if self.retrieval == "hybrid":
+            bm25_index = load_latest_bm25_index(self.bm25_path(model))
+
+        if model is loaded_model:
+            if index is model.index and bm25_index is model.bm25_index:
+                # nothing new was published
+                return model
+            # the fitted model is shared, only its indexes are new
+            model = copy.copy(model)
+
+        model.index = index
+        model.bm25_index = bm25_index
+        return model
+
+    def load_all(self) -> None:
+        """Load every model and search index, so no request pays for it"""
+        for category in DICT_CATEGORY_MODEL:
+            self.model(category)
+
+    def bm25_path(self, model) -> str:
+        """Directory of the BM25 index versions, next to the model indexes"""
+        return os.path.join(model.paths["index_path"], self.bm25_params["index_name"])
+
+    def search_versions(self, model) -> tuple:
+        """
+        Retrieval mode and versions of the data searches read besides the
+        model index, part of the cached results keys.
+        """
+        if self.retrieval == "hybrid":
+            return (self.retrieval, model.bm25_index.version)
+        return (self.retrieval,)
+
+    def search_vectors(
+        self, model, query_vectors, k: int, query_texts=None, filters=None
+    ) -> list:
+        """
+        Ranked sentence ids of each query vector, with the configured search
+        backend, or re-ranked from BM25 candidates in hybrid retrieval.
+
+        Parameters:
+            model: TFIDFModel or Word2VecModel loaded by `model`.
+            query_vectors (array-like or sparse matrix): One query per row.
+            k (int): Number of results per query.
+            query_texts (List[str], optional): Text of each query, needed by
+                hybrid retrieval.
+            filters (tuple, optional): Parsed filters the results must match.
+
+        Returns:
+            List[List[int]]: Ranked sentence ids of each query.
+        """
+        if self.retrieval == "hybrid" and query_texts is not None:
+            return self.search_hybrid(model, query_vectors, k, query_texts, filters)
+
+        # filtered searches need the attributes stored with the local index
+        if model.paths["search_backend"] == "pgvector" and not filters:
+            # k-NN runs on the server, one query at a time
+            if issparse(query_vectors):
+                query_vectors = query_vectors.toarray()
+
+            db_manager = JurisdictionDataBaseManager()
+            with db_manager.session("pgvector"):
+                return [
+                    db_manager.search_similar_vectors(
+                        model.params["index_name"],
+                        query_vector,
+                        k,
+                        index_params=model.paths["pgvector_index"],
+                    )
+                    for query_vector in query_vectors
+                ]
+
+        _, ranked_ids = model.index.search(query_vectors, k, filters=filters)
+        return ranked_ids
+
+    def search_hybrid(
+        self, model, query_vectors, k: int, query_texts: list, filters=None
+    ) -> list:
+        """
+        Ranked sentence ids of each query: the BM25 candidates of its text,
+        ranked by their exact similarity to its vector. Queries with fewer
+        than k candidates (e.g. no known term) are completed by a k-NN search.
+        """
+        ranked_ids, short_queries = [], []
+        for i, query_text in enumerate(query_texts):
+            _, candidate_ids = model.bm25_index.search(
+                query_text, self.bm25_params["candidates"]
+            )
+            _, ids = model.index.rerank(
+                query_vectors[i : i + 1], candidate_ids, k, filters=filters
+            )
+            ranked_ids.append(ids)
+            if len(ids) < k:
+                short_queries.append(i)
+
+        if short_queries:
+            knn_ids = self.search_vectors(
+                model, query_vectors[short_queries], k, filters=filters
+            )
+            for i, ids in zip(short_queries, knn_ids):
+                seen = set(ranked_ids[i])
+                ranked_ids[i] += [j for j in ids if j not in seen][: k - len(seen)]
+
+        return ranked_ids
+
+    def search(
+        self, category: str, query_text: str, k: int, filters: dict = None
+    ) -> list:
+        """Ranked sentence ids of a query, matching filters if given"""
+        model = self.model(category)
+        filters = parse_filters(filters)
+        return self.query_cache.ranked_ids(
+            model,
+            category,
+            query_text,
+            k,
+            lambda query_vector, k: self.search_vectors(
+                model, query_vector, k, [query_text], filters
+            )[0],
+            filters,
+            self.search_versions(model),
+        )
+
+    def search_batch(
+        self, category: str, query_texts: list, k: int, filters: dict = None
+    ) -> list:
+        """Ranked sentence ids of each query, uncached ones searched at once"""
+        model = self.model(category)
+        filters = parse_filters(filters)
+        return self.query_cache.ranked_ids_many(
+            model,
+            category,
+            query_texts,
+            k,
+            lambda texts, query_vectors, k: self.search_vectors(
+                model, query_vectors, k, texts, filters
+            ),
+            filters,
+            self.search_versions(model),
+        )
+
+    def sentences(self, sentence_ids) -> list:
+        """
+        Metadata of sentences, in the order of the given ids. Ids not found
+        are left out.
+
+        Returns:
+            List[dict]: Column -> value of each sentence.
+        """
+        sentence_ids = [int(i) for i in sentence_ids]
+        if not sentence_ids:
+            return []
+
+        db_manager = JurisdictionDataBaseManager()
+        with db_manager.session("sqlite"):
+            if self.sentence_columns is None:
+                info_table = db_manager.get_query_data(
+                    f"PRAGMA table_info({SENTENCE_TABLE})"
+                )
+                self.sentence_columns = [row[1] for row in info_table]
+
+            rows = db_manager.load_data_from_table(
+                SENTENCE_TABLE, "*", sentence_ids, id_column="sentence_id"
+            )
+
+        by_id = {row[0]: dict(zip(self.sentence_columns, row)) for row in rows}
+        return [by_id[i] for i in sentence_ids if i in by_id]
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints of the search service, see the module docstring"""
+
+    engine = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            if url.path == "/health":
+                self.send_json(
+                    200,
+                    {
+                        "status": "ok",
+                        "categories": self.engine.categories,
+                        "query_cache": self.engine.query_cache.stats(),
+                    },
+                )
+            elif url.path == "/sentences":
+                ids = parse_qs(url.query).get("ids", [""])[0]
+                sentence_ids = [int(i) for i in ids.split(",") if i]
+                self.send_json(200, {"results": self.engine.sentences(sentence_ids)})
+            else:
+                self.send_json(404, {"error": f"Unknown path {url.path}"})
+        except ValueError as error:
+            self.send_json(400, {"error": str(error)})
+        except Exception as error:
+            self.send_internal_error(error)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        try:
+            request = self.read_json()
+            category = request["category"]
+            if not isinstance(category, str):
+                raise ValueError("category must be a string")
+            try:
+                k = int(request.get("k", 10))
+            except (TypeError, ValueError):
+                k = 0
+            if not 1 <= k <= MAX_K:
+                raise ValueError(f"k must be between 1 and {MAX_K}")
+
+            filters = request.get("filters")
+            if url.path == "/search":
+                query = request["query"]
+                if not isinstance(query, str):
+                    raise ValueError("query must be a string")
+                ranked_ids = [self.engine.search(category, query, k, filters)]
+            elif url.path == "/search/batch":
+                queries = request["queries"]
+                if (
+                    not isinstance(queries, list)
+                    or len(queries) > MAX_BATCH_QUERIES
+                    or not all(isinstance(query, str) for query in queries)
+                ):
+                    raise ValueError(
+                        f"queries must be a list of up to {MAX_BATCH_QUERIES} texts"
+                    )
+                ranked_ids = self.engine.search_batch(category, queries, k, filters)
+            else:
+                self.send_json(404, {"error": f"Unknown path {url.path}"})
+                return
+
+            results = self.ranked_results(ranked_ids, request.get("metadata", True))
+            if url.path == "/search":
+                results = results[0]
+            self.send_json(200, {"category": category, "k": k, "results": results})
+
+        except KeyError as error:
+            self.send_json(400, {"error": f"Missing field {error}"})
+        except ValueError as error:
+            self.send_json(400, {"error": str(error)})
+        except Exception as error:
+            self.send_internal_error(error)
+
+    def ranked_results(self, ranked_ids: list, metadata: bool) -> list:
+        """Results of each query, metadata of all of them read at once"""
+        if not metadata:
+            return [[{"sentence_id": i} for i in ids] for ids in ranked_ids]
+
+        all_ids = {i for ids in ranked_ids for i in ids}
+        by_id = {s["sentence_id"]: s for s in self.engine.sentences(all_ids)}
+        return [[by_id[i] for i in ids if i in by_id] for ids in ranked_ids]
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as error:
+            raise ValueError(f"Invalid JSON: {error}")
+        if not isinstance(request, dict):
+            raise ValueError("Request body must be a JSON object")
+        return request
+
+    def send_internal_error(self, error: Exception) -> None:
+        """Log an unexpected error and answer it, the connection is kept"""
+        self.log_error("%s", traceback.format_exc())
+        self.send_json(500, {"error": f"Internal error: {error}"})
+
+    def send_json(self, status: int, content: dict) -> None:
+        body = json.dumps(content, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    engine = JurisdictionSearchEngine()
+    engine.load_all()
+    SearchRequestHandler.engine = engine
+
+    server = ThreadingHTTPServer((args.host, args.port), SearchRequestHandler)
+    print(f"Search service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
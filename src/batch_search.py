@@ -0,0 +1,214 @@
+"""
+Bulk similarity search of many texts at once, e.g. to triage incoming claims.
+
+Reads a JSONL or CSV file of records with an `id` and either a `text` or the
+`path` of a PDF/DOCX file, and streams the top k similar sentences of each
+record to a JSONL output file:
+
+    {"id": "claim-1", "results": [{"sentence_id": 12}, ...]}
+
+Records are searched in blocks by a pool of workers, each loading the model
+and index once. Block results are appended as they complete, so a rerun with
+the same output file skips the records already searched. Records that could
+not be read are written with an `error` instead, and tried again on a rerun.
+
+Run from the repository root:
+    $ python -m src.batch_search claims.jsonl results.jsonl --category TfIdf --k 20
+    $ python -m src.batch_search claims.jsonl results.jsonl \\
+        --filters '{"last_verdict": "EP", "date_from": "2021-01-01"}'
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from multiprocessing import Pool, cpu_count
+
+from models.sentence_filters import parse_filters
+from models.utils import iter_chunks
+from scripts.data_processing.data_downloader import JurisdictionPDFDownloader
+from scripts.search_service import DICT_CATEGORY_MODEL, JurisdictionSearchEngine
+
+# Engine and model loaded once by each search worker process
+_WORKER_ENGINE = None
+_WORKER_MODEL = None
+
+
+def read_records(input_path):
+    """Yield the records of a JSONL or CSV file, with their position as id"""
+    with open(input_path, newline="", encoding="utf-8") as handle:
+        if input_path.endswith(".csv"):
+            # judgments and claims are longer than the default field limit
+            csv.field_size_limit(2**31 - 1)
+            records = csv.DictReader(handle)
+        else:
+            records = (json.loads(line) for line in handle if line.strip())
+
+        for position, record in enumerate(records, 1):
+            record["id"] = str(record.get("id") or position)
+            yield record
+
+
+def read_done_ids(output_path):
+    """
+    Ids already searched in the output file. Records that failed are tried
+    again, and a last line left half-written by an interruption is truncated.
+    """
+    done_ids = set()
+    if not os.path.exists(output_path):
+        return done_ids
+
+    with open(output_path, "rb+") as handle:
+        complete_bytes = 0
+        for line in handle:
+            if not line.endswith(b"\n"):
+                break
+            result = json.loads(line)
+            if "results" in result:
+                done_ids.add(result["id"])
+            complete_bytes += len(line)
+        handle.truncate(complete_bytes)
+
+    return done_ids
+
+
+def record_text(record):
+    """Text of a record, read from its PDF/DOCX file if it has a path"""
+    if record.get("text"):
+        return record["text"]
+
+    path = record.get("path")
+    if not path:
+        raise ValueError("Record without text nor path")
+
+    if path.lower().endswith(".pdf"):
+        with open(path, "rb") as handle:
+            text = JurisdictionPDFDownloader.extract_text_from_bytes(handle.read())
+        if text is None:
+            raise ValueError(f"Could not read {path}")
+        return text
+
+    elif path.lower().endswith(".docx"):
+        import docx2txt
+
+        return docx2txt.process(path)
+
+    raise ValueError(f"Unsupported file {path}, use PDF or DOCX")
+
+
+def _init_search_worker(category):
+    global _WORKER_ENGINE, _WORKER_MODEL
+
+    # one search thread per worker, the pool already uses all cores
+    try:
+        import faiss
+
+        faiss.omp_set_num_threads(1)
+    except ImportError:
+        pass
+
+    _WORKER_ENGINE = JurisdictionSearchEngine()
+    # loaded with its indexes
+    _WORKER_MODEL = _WORKER_ENGINE.model(category)
+
+
+def _search_block(task):
+    """Vectorize a block of records as one matrix and search it at once"""
+    records, k, filters = task
+
+    # a record that cannot be read (corrupt file, missing extractor, ...)
+    # is reported in the output, the rest of its block is still searched
+    ids, texts, failures = [], [], []
+    for record in records:
+        try:
+            texts.append(record_text(record))
+            ids.append(record["id"])
+        except Exception as error:
+            failures.append({"id": record["id"], "error": str(error)})
+
+    results = []
+    if texts:
+        query_vectors = _WORKER_MODEL.get_query_vectors(texts)
+        ranked_ids = _WORKER_ENGINE.search_vectors(
+            _WORKER_MODEL, query_vectors, k, texts, filters
+        )
+        results = [
+            {"id": i, "results": [{"sentence_id": int(s)} for s in sentence_ids]}
+            for i, sentence_ids in zip(ids, ranked_ids)
+        ]
+
+    return results + failures
+
+
+def add_metadata(engine, results):
+    """Add the sentence metadata to the results of a block, read at once"""
+    all_ids = {
+        r["sentence_id"] for result in results for r in result.get("results", [])
+    }
+    by_id = {s["sentence_id"]: s for s in engine.sentences(all_ids)}
+    for result in results:
+        if "results" in result:
+            result["results"] = [
+                by_id.get(r["sentence_id"], r) for r in result["results"]
+            ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("input_path", help="JSONL or CSV file of records")
+    parser.add_argument("output_path", help="JSONL file of results, appended to")
+    parser.add_argument(
+        "--category", choices=list(DICT_CATEGORY_MODEL), default="TfIdf"
+    )
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--jobs", type=int, default=cpu_count())
+    parser.add_argument(
+        "--metadata", action="store_true", help="add the sentence rows to results"
+    )
+    parser.add_argument(
+        "--filters",
+        type=json.loads,
+        help="JSON filters of the results, e.g. '{\"legal_costs\": true}'",
+    )
+    args = parser.parse_args()
+    filters = parse_filters(args.filters)
+
+    done_ids = read_done_ids(args.output_path)
+    records = [r for r in read_records(args.input_path) if r["id"] not in done_ids]
+    if done_ids:
+        print(f"Resuming: {len(done_ids)} records already searched")
+    print(f"Searching {len(records)} records with {args.category}, k={args.k}")
+
+    engine = JurisdictionSearchEngine() if args.metadata else None
+    tasks = (
+        (block, args.k, filters) for block in iter_chunks(records, args.batch_size)
+    )
+
+    n_searched, n_failed = 0, 0
+    start = time.perf_counter()
+    with open(args.output_path, "a", encoding="utf-8") as output, Pool(
+        processes=args.jobs,
+        initializer=_init_search_worker,
+        initargs=(args.category,),
+    ) as pool:
+        for results in pool.imap_unordered(_search_block, tasks):
+            if engine is not None:
+                add_metadata(engine, results)
+
+            for result in results:
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            # complete lines survive an interruption, the rest is searched again
+            output.flush()
+
+            n_failed += sum("error" in result for result in results)
+            n_searched += len(results)
+            elapsed = time.perf_counter() - start
+            print(
+                f"Searched {n_searched}/{len(records)} | Fails: {n_failed} | "
+                f"{n_searched / elapsed:.1f} queries/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
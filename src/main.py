@@ -1,10 +1,20 @@
 import json
+import os
 
+import numpy as np
+
+from models.bm25_index import BM25Index
 from models.tfidf_model import TFIDFModel
+from models.utils import CONFIG_PATH, needs_full_refit, read_config
+from models.vector_index import VectorIndex
 from models.w2v_model import Word2VecModel
+from scripts.data_processing.data_corpus import SentenceCorpus
 from scripts.data_processing.data_preprocessor import JurisdictionPreprocessor
 from scripts.data_processing.data_scraper import JurisdictionScrapper
-from scripts.data_processing.data_storage import JurisdictionDataBaseManager
+from scripts.data_processing.data_storage import (
+    JurisdictionDataBaseManager,
+    table_name_from_path,
+)
 
 ARGS_PATH = "arguments.json"
 
@@ -22,35 +32,109 @@ def main():
     db_manager = JurisdictionDataBaseManager()
 
     # get links from scrapper
-    db_manager.generate_connection("sqlite")
-    res = db_manager.get_query_data("SELECT final_url from jurisprudence_urls")
+    links_table = table_name_from_path(args["db"]["sqlite_links_table_path"])
+    with db_manager.session("sqlite"):
+        res = db_manager.get_query_data(f"SELECT final_url from {links_table}")
     links_set = list(sum(res, ()))
 
-    # parallelize document processing and save by batches
+    # parallelize document processing and save by batches. Only urls not
+    # processed yet are handed to the preprocessor, or the failed ones alone
+    # when retrying
     batch_size = args["preprocessor"]["batch_size"]
     preprocessor = JurisdictionPreprocessor()
-    preprocessor(links_set, batch_size)
+    preprocessor.register_urls(links_set)
+    status = "failed" if args["preprocessor"]["retry_failed"] else "pending"
+    preprocessor(preprocessor.urls_with_status(status), batch_size)
+
+    # generate TF-IDF and Word2Vec models and vectors and save
+    pg_tables_path = args["db"]
+    update_mode = args["models"]["update_mode"]
 
-    # retrieve back/ground data to generate the vector representation
-    db_manager.generate_connection("sqlite")
-    records = db_manager.load_data_from_table(
-        "sentence", "factual_background,factual_grounds"
+    fit_or_update_model(
+        TFIDFModel(), pg_tables_path["pgv_tfidf_table_path"], update_mode
+    )
+    fit_or_update_model(
+        Word2VecModel(), pg_tables_path["pgv_w2v_table_path"], update_mode
     )
 
-    # we are using summary of last trial + new trial for the similarity search
-    data_2_vectorize = [a + f for a, f in records]
+    # first retrieval stage of the hybrid search
+    update_bm25_index()
 
-    pg_tables_path = args["db"]
-    # generate TF-IDF model and vectors and save
-    tfidf_model = TFIDFModel()
-    tfidf_model.fit_and_save(
-        data_2_vectorize, table_path=pg_tables_path["pgv_tfidf_table_path"]
+
+def fit_or_update_model(model, table_path, update_mode):
+    """
+    Fit the model over all sentences or, in incremental mode, embed only the
+    sentences missing from its index with the frozen model. Falls back to a
+    full refit when there is no index yet, sentences already indexed were
+    updated (their vectors, filter attributes and pgvector rows are stale)
+    or the new data crosses the configured growth/drift thresholds.
+    """
+    if update_mode == "incremental" and VectorIndex.exists(model.index_path):
+        index = model.load_index()
+        new_data = SentenceCorpus(min_id=index.last_id)
+        new_ids = new_data.ids()
+        updated_ids = new_data.updated_ids(
+            index.meta.get("corpus_version"), index.last_id
+        )
+
+        if len(updated_ids):
+            print(
+                f"{model.__class__.__name__}: {len(updated_ids)} indexed docs "
+                "were updated"
+            )
+        elif not len(new_ids):
+            print(f"{model.__class__.__name__}: index is up to date")
+            return
+        else:
+            model.load()
+            new_oov_ratio = model.oov_ratio(new_data)
+            thresholds = model.paths["incremental"]
+
+            if not needs_full_refit(index, len(new_ids), new_oov_ratio, thresholds):
+                print(f"{model.__class__.__name__}: appending {len(new_ids)} docs")
+                model.update_and_save(new_data, new_ids, table_path=table_path)
+                return
+
+    print(f"{model.__class__.__name__}: fitting over the whole corpus")
+    # documents are streamed from SQLite in chunks, never fully loaded
+    data_2_vectorize = SentenceCorpus()
+    model.fit_and_save(
+        data_2_vectorize, table_path=table_path, ids=data_2_vectorize.ids()
     )
 
-    # generate Word2Vec model and vectors and save
-    w2v_model = Word2VecModel()
-    w2v_model.fit_and_save(
-        data_2_vectorize, table_path=pg_tables_path["pgv_w2v_table_path"]
+
+def update_bm25_index():
+    """
+    Build the BM25 index over all sentences when hybrid retrieval is enabled
+    and the published one misses some of them or some were updated.
+    Collection statistics (IDF, average length) change with every new
+    document, so it is always built from scratch.
+    """
+    config = read_config(CONFIG_PATH)
+    if config["general"]["retrieval"] != "hybrid":
+        return
+
+    bm25_params = config["bm25"]
+    root_path = os.path.join(config["general"]["index_path"], bm25_params["index_name"])
+    corpus = SentenceCorpus()
+    corpus_ids = corpus.ids()
+
+    if VectorIndex.exists(root_path):
+        index = BM25Index.load(root_path)
+        updated_ids = corpus.updated_ids(
+            index.meta.get("corpus_version"), index.last_id
+        )
+        if np.array_equal(index.ids, corpus_ids) and not len(updated_ids):
+            print("BM25: index is up to date")
+            return
+
+    print(f"BM25: indexing {len(corpus_ids)} docs")
+    BM25Index.build(
+        root_path,
+        corpus.iter_batches(),
+        k1=bm25_params["k1"],
+        b=bm25_params["b"],
+        corpus_version=corpus.version,
     )
 
 
@@ -0,0 +1,59 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class FixtureServer:
+    """
+    Local HTTP stand-in for the CENDOJ servers, serving fixed responses on a
+    free port from a background thread.
+    """
+
+    def __init__(self):
+        # path -> (content type, body)
+        self.pages = {}
+        self.n_requests = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class FixtureHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server.lock:
+                    server.n_requests += 1
+                if self.path not in server.pages:
+                    self.send_error(404)
+                    return
+                content_type, body = server.pages[self.path]
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, args=(0.05,), daemon=True
+        )
+
+    def add(self, path: str, body: bytes, content_type: str) -> str:
+        """Serve body at path, returns its URL"""
+        self.pages[path] = (content_type, body)
+        return self.url(path)
+
+    def url(self, path: str) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+
+@pytest.fixture
+def fixture_server():
+    server = FixtureServer()
+    server.thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
@@ -0,0 +1,99 @@
+from urllib.parse import urlparse
+
+import pytest
+
+from scripts.data_processing.data_downloader import JurisdictionPDFDownloader
+
+fitz = pytest.importorskip("fitz")
+
+AGENTS = ["Mozilla/5.0 (fixture)\n"]
+
+
+def make_pdf(pages) -> bytes:
+    """PDF with one page per given text"""
+    with fitz.open() as document:
+        for text in pages:
+            document.new_page().insert_text((72, 72), text)
+        return document.tobytes()
+
+
+@pytest.fixture
+def pdf_urls(fixture_server):
+    """URL -> text of the fixture PDFs"""
+    return {
+        fixture_server.add(
+            f"/pdf/{i}.pdf",
+            make_pdf([f"Sentencia {i}", f"Fallo {i}"]),
+            "application/pdf",
+        ): f"Sentencia {i}"
+        for i in range(20)
+    }
+
+
+def test_download_many_fetches_every_pdf(fixture_server, pdf_urls):
+    downloader = JurisdictionPDFDownloader(AGENTS, max_workers=4)
+
+    downloaded = dict(downloader.download_many(pdf_urls))
+
+    assert set(downloaded) == set(pdf_urls)
+    for url, content in downloaded.items():
+        assert content == fixture_server.pages[urlparse(url).path][1]
+    assert downloader.n_success == len(pdf_urls)
+    assert downloader.n_failed == 0
+
+
+def test_download_many_bounds_urls_in_flight(fixture_server, pdf_urls):
+    downloader = JurisdictionPDFDownloader(AGENTS, max_workers=2)
+    consumed = []
+
+    def urls():
+        for url in pdf_urls:
+            consumed.append(url)
+            yield url
+
+    results = downloader.download_many(urls())
+    next(results)
+
+    # the first result is yielded before every URL is submitted
+    assert len(consumed) <= 2 * downloader.max_workers + 1
+    assert len(list(results)) == len(pdf_urls) - 1
+
+
+def test_failed_downloads_are_counted(fixture_server, pdf_urls):
+    downloader = JurisdictionPDFDownloader(AGENTS, max_workers=4)
+    missing_url = fixture_server.url("/pdf/missing.pdf")
+
+    downloaded = dict(downloader.download_many([*pdf_urls, missing_url]))
+
+    assert downloaded[missing_url] is None
+    assert downloader.n_failed == 1
+    assert downloader.n_success == len(pdf_urls)
+
+
+def test_throughput_reports_downloaded_bytes(fixture_server, pdf_urls):
+    downloader = JurisdictionPDFDownloader(AGENTS, max_workers=4)
+
+    list(downloader.download_many(pdf_urls))
+    stats = downloader.throughput()
+
+    n_bytes = sum(len(body) for _, body in fixture_server.pages.values())
+    assert downloader.n_bytes == n_bytes
+    assert stats["n_success"] == len(pdf_urls)
+    assert stats["docs_per_s"] > 0
+    assert stats["mb_per_s"] == pytest.approx(n_bytes / 1e6 / downloader.elapsed)
+
+    downloader.reset_stats()
+    assert downloader.throughput()["n_success"] == 0
+
+
+def test_extract_text_from_downloaded_bytes(pdf_urls):
+    downloader = JurisdictionPDFDownloader(AGENTS, max_workers=4)
+
+    for url, content in downloader.download_many(pdf_urls):
+        text = JurisdictionPDFDownloader.extract_text_from_bytes(content)
+        # pages are joined in order
+        assert text.index(pdf_urls[url]) < text.index("Fallo")
+
+
+def test_extract_text_from_corrupt_pdf():
+    assert JurisdictionPDFDownloader.extract_text_from_bytes(b"%PDF-1.7 trunc") is None
@@ -0,0 +1,99 @@
+import pytest
+
+from scripts.data_processing.data_downloader import JurisdictionPDFDownloader
+from scripts.data_processing.data_link_resolver import JurisdictionLinkResolver
+
+AGENTS = ["Mozilla/5.0 (fixture)\n"]
+
+PDF_HREF = (
+    "/search/contenidos.action?action=accessToPDF&amp;publicinterface=true"
+    "&amp;reference=9000001"
+)
+DETAIL_PAGE = f"""<html><body>
+<div class="modal"><button class="close">x</button></div>
+<div id="objtcontentpdf" class="pdf-box"><div class="inner">
+<a href="{PDF_HREF}" target="_blank">PDF</a>
+</div></div></body></html>"""
+# the anchor is rendered by the page scripts
+EMPTY_CONTAINER_PAGE = """<html><body>
+<div id="objtcontentpdf" class="pdf-box"></div><script>load()</script>
+<footer><a href="/aviso-legal">Aviso</a></footer></body></html>"""
+SCRIPT_ONLY_PAGE = """<html><body><div id="root"></div>
+<script src="/static/app.js"></script></body></html>"""
+
+
+@pytest.fixture
+def detail_urls(fixture_server):
+    """name -> URL of the saved detail pages"""
+    return {
+        name: fixture_server.add(
+            f"/detail/{name}", page.encode("utf-8"), "text/html; charset=utf-8"
+        )
+        for name, page in [
+            ("anchor", DETAIL_PAGE),
+            ("empty", EMPTY_CONTAINER_PAGE),
+            ("script", SCRIPT_ONLY_PAGE),
+        ]
+    }
+
+
+def test_parse_pdf_link_keeps_entities():
+    assert JurisdictionLinkResolver.parse_pdf_link(DETAIL_PAGE) == PDF_HREF
+
+
+@pytest.mark.parametrize("page", [EMPTY_CONTAINER_PAGE, SCRIPT_ONLY_PAGE])
+def test_parse_pdf_link_ignores_anchors_outside_container(page):
+    assert JurisdictionLinkResolver.parse_pdf_link(page) is None
+
+
+def test_resolve_over_http(detail_urls):
+    browser_links = []
+    resolver = JurisdictionLinkResolver(
+        JurisdictionPDFDownloader(AGENTS), browser_fallback=browser_links.append
+    )
+
+    assert resolver.resolve(detail_urls["anchor"]) == PDF_HREF
+    assert resolver.n_http == 1
+    assert resolver.n_browser == 0
+    assert browser_links == []
+
+
+def test_pages_needing_javascript_fall_back_to_browser(detail_urls):
+    browser_links = []
+
+    def browser_fallback(general_link):
+        browser_links.append(general_link)
+        return "/rendered.pdf"
+
+    resolver = JurisdictionLinkResolver(
+        JurisdictionPDFDownloader(AGENTS), browser_fallback=browser_fallback
+    )
+    resolved = dict(resolver.resolve_many(detail_urls.values()))
+
+    assert resolved == {
+        detail_urls["anchor"]: PDF_HREF,
+        detail_urls["empty"]: "/rendered.pdf",
+        detail_urls["script"]: "/rendered.pdf",
+    }
+    assert sorted(browser_links) == sorted(
+        [detail_urls["empty"], detail_urls["script"]]
+    )
+    assert resolver.n_http == 1
+    assert resolver.n_browser == 2
+
+
+def test_unresolved_without_browser_fallback(detail_urls):
+    resolver = JurisdictionLinkResolver(JurisdictionPDFDownloader(AGENTS))
+
+    assert resolver.resolve(detail_urls["script"]) is None
+    assert resolver.n_browser == 0
+
+
+def test_failed_pages_do_not_open_a_browser(fixture_server):
+    browser_links = []
+    resolver = JurisdictionLinkResolver(
+        JurisdictionPDFDownloader(AGENTS), browser_fallback=browser_links.append
+    )
+
+    assert resolver.resolve(fixture_server.url("/detail/missing")) is None
+    assert browser_links == []
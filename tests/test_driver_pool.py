@@ -0,0 +1,143 @@
+import threading
+
+import pytest
+
+from scripts.data_processing.data_scraper import EdgeDriverPool, JurisdictionScrapper
+
+
+class FakeDriver:
+    def __init__(self):
+        self.n_quits = 0
+
+    def quit(self):
+        self.n_quits += 1
+
+
+class FakeDriverFactory:
+    def __init__(self):
+        self.drivers = []
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        driver = FakeDriver()
+        with self.lock:
+            self.drivers.append(driver)
+        return driver
+
+
+def test_drivers_are_reused():
+    create_driver = FakeDriverFactory()
+    pool = EdgeDriverPool(create_driver, size=2)
+
+    for _ in range(5):
+        with pool.driver() as driver:
+            pass
+
+    assert create_driver.drivers == [driver]
+    assert pool.n_created == 1
+
+
+def test_no_more_than_size_drivers_are_open():
+    create_driver = FakeDriverFactory()
+    pool = EdgeDriverPool(create_driver, size=3)
+    n_borrowed, max_borrowed = 0, 0
+    lock = threading.Lock()
+    # the first borrows of three threads overlap, each opens a browser
+    barrier = threading.Barrier(3)
+
+    def borrow(n_pages, wait=False):
+        nonlocal n_borrowed, max_borrowed
+        for _ in range(n_pages):
+            with pool.driver():
+                with lock:
+                    n_borrowed += 1
+                    max_borrowed = max(max_borrowed, n_borrowed)
+                if wait:
+                    barrier.wait(timeout=5)
+                    wait = False
+                with lock:
+                    n_borrowed -= 1
+
+    threads = [threading.Thread(target=borrow, args=(10, True)) for _ in range(3)]
+    threads += [threading.Thread(target=borrow, args=(10,)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(create_driver.drivers) == 3
+    assert pool.n_created == 3
+    assert max_borrowed == 3
+
+
+def test_driver_of_failed_page_is_discarded():
+    create_driver = FakeDriverFactory()
+    pool = EdgeDriverPool(create_driver, size=1)
+
+    with pytest.raises(RuntimeError):
+        with pool.driver():
+            raise RuntimeError("browser crashed")
+
+    assert create_driver.drivers[0].n_quits == 1
+    assert pool.n_created == 0
+
+    with pool.driver() as driver:
+        assert driver is create_driver.drivers[1]
+
+
+def test_failed_driver_start_frees_its_slot():
+    def create_driver():
+        raise OSError("msedgedriver not found")
+
+    pool = EdgeDriverPool(create_driver, size=1)
+
+    with pytest.raises(OSError):
+        with pool.driver():
+            pass
+
+    assert pool.n_created == 0
+
+
+def test_close_quits_idle_drivers():
+    create_driver = FakeDriverFactory()
+    pool = EdgeDriverPool(create_driver, size=2)
+
+    with pool.driver(), pool.driver():
+        pass
+    pool.close()
+
+    assert [driver.n_quits for driver in create_driver.drivers] == [1, 1]
+    assert pool.n_created == 0
+
+
+def test_edge_driver_is_installed_once(monkeypatch):
+    webdriver_manager = pytest.importorskip("webdriver_manager.microsoft")
+    n_installs = 0
+
+    class FakeDriverManager:
+        def install(self):
+            nonlocal n_installs
+            n_installs += 1
+            return "/opt/msedgedriver"
+
+    monkeypatch.setattr(
+        webdriver_manager, "EdgeChromiumDriverManager", FakeDriverManager
+    )
+
+    # only the driver attributes, the scrapper reads its data files on init
+    scrapper = JurisdictionScrapper.__new__(JurisdictionScrapper)
+    scrapper._edge_driver_path = None
+    scrapper.edge_driver_lock = threading.Lock()
+
+    paths = []
+    threads = [
+        threading.Thread(target=lambda: paths.append(scrapper.edge_driver_path))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert paths == ["/opt/msedgedriver"] * 8
+    assert n_installs == 1
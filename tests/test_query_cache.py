@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+from models.query_cache import QueryCache
+
+
+def search(query_vector, k):
+    return [1]
+
+
+class FakeModel:
+    """Loaded model with the versions the cache keys are built from"""
+
+    def __init__(self, version, index_version):
+        self.version = version
+        self.index = SimpleNamespace(version=index_version)
+        self.n_vectorized = 0
+
+    def get_query_vector(self, query):
+        self.n_vectorized += 1
+        return query
+
+
+def test_repeated_query_is_not_searched_again():
+    cache = QueryCache(max_entries=8, ttl_seconds=60)
+    model = FakeModel("m1", "i1")
+    searches = []
+
+    def search_recorded(query_vector, k):
+        searches.append(query_vector)
+        return [3, 1, 2][:k]
+
+    for query in ["cláusula  suelo", "cláusula suelo "]:
+        ranked_ids = cache.ranked_ids(model, "TfIdf", query, 2, search_recorded)
+        assert ranked_ids == [3, 1]
+    assert searches == ["cláusula suelo"]
+    assert cache.stats()["results"]["hits"] == 1
+
+
+def test_versions_come_from_the_loaded_objects():
+    cache = QueryCache(max_entries=8, ttl_seconds=60)
+    model = FakeModel("m1", "i1")
+    cache.ranked_ids(model, "TfIdf", "banco", 1, search)
+
+    # a new index of the same model: searched again, query vector kept
+    appended = FakeModel("m1", "i2")
+    cache.ranked_ids(appended, "TfIdf", "banco", 1, search)
+    assert cache.stats()["results"]["misses"] == 2
+    assert appended.n_vectorized == 0
+
+    # a refitted model: vectorized again
+    refitted = FakeModel("m2", "i3")
+    cache.ranked_ids(refitted, "TfIdf", "banco", 1, search)
+    assert refitted.n_vectorized == 1
+    assert len(cache.vectors) == 1
+
+
+def test_search_versions_are_part_of_the_keys():
+    cache = QueryCache(max_entries=8, ttl_seconds=60)
+    model = FakeModel("m1", "i1")
+    for bm25_version in ["b1", "b1", "b2"]:
+        cache.ranked_ids(
+            model,
+            "TfIdf",
+            "banco",
+            1,
+            search,
+            search_versions=("hybrid", bm25_version),
+        )
+
+    assert cache.stats()["results"]["misses"] == 2
@@ -0,0 +1,141 @@
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+
+from models.sentence_filters import encode_attributes, parse_filters
+from scripts.data_processing.data_storage import to_pgvector_literal
+
+faiss = pytest.importorskip("faiss")
+
+from models.vector_index import VectorIndex  # noqa: E402
+from scripts import search_service  # noqa: E402
+
+N_DOCS = 200
+DIM = 16
+
+
+@pytest.fixture
+def embeddings():
+    return np.random.default_rng(0).normal(size=(N_DOCS, DIM)).astype(np.float32)
+
+
+@pytest.fixture
+def index(tmp_path, embeddings):
+    ids = np.arange(1, N_DOCS + 1) * 10
+    attributes = encode_attributes(
+        {
+            "doc_date": [f"01/01/{2015 + i % 8}" for i in range(N_DOCS)],
+            "first_verdict": ["D"] * N_DOCS,
+            "last_verdict": ["E" if i % 4 == 0 else "D" for i in range(N_DOCS)],
+            "legal_costs": ["NC"] * N_DOCS,
+        }
+    )
+    return VectorIndex.build(
+        str(tmp_path / "index"), embeddings, ids, attributes=attributes
+    )
+
+
+def brute_force_ids(embeddings, ids, queries, k):
+    """Ranked ids by exact cosine similarity, computed with NumPy"""
+    vectors = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ vectors.T
+    return [list(ids[np.argsort(-row, kind="stable")[:k]]) for row in scores]
+
+
+class FakeModel:
+    def __init__(self, index, search_backend):
+        self.index = index
+        self.paths = {
+            "search_backend": search_backend,
+            "pgvector_index": {"type": "hnsw", "ef_search": 40},
+        }
+        self.params = {"index_name": "tfidf"}
+
+    def load_index(self):
+        return self.index
+
+
+class FakeDataBaseManager:
+    """Stands for the pgvector server, returns the ids it was given"""
+
+    searches = []
+
+    @contextmanager
+    def session(self, conn_type):
+        assert conn_type == "pgvector"
+        yield None
+
+    def search_similar_vectors(self, table_name, query_vector, k, index_params):
+        FakeDataBaseManager.searches.append((table_name, query_vector, k))
+        return list(range(k))
+
+
+@pytest.fixture
+def engine(monkeypatch, request):
+    # the engine reads the models config relative to the repository root
+    monkeypatch.chdir(request.config.rootpath)
+    monkeypatch.setattr(
+        search_service, "JurisdictionDataBaseManager", FakeDataBaseManager
+    )
+    FakeDataBaseManager.searches = []
+    engine = search_service.JurisdictionSearchEngine()
+    engine.retrieval = "vector"
+    return engine
+
+
+def test_local_index_matches_brute_force(index, embeddings):
+    queries = np.random.default_rng(1).normal(size=(5, DIM)).astype(np.float32)
+
+    scores, ranked_ids = index.search(queries, 10)
+
+    assert ranked_ids == brute_force_ids(embeddings, index.ids, queries, 10)
+    assert np.all(np.diff(scores, axis=1) <= 1e-6)
+
+
+def test_filtered_local_search_matches_brute_force(index, embeddings):
+    queries = np.random.default_rng(2).normal(size=(3, DIM)).astype(np.float32)
+    filters = parse_filters({"last_verdict": "E", "date_from": "2019-01-01"})
+    mask = (np.arange(N_DOCS) % 4 == 0) & (2015 + np.arange(N_DOCS) % 8 >= 2019)
+
+    _, ranked_ids = index.search(queries, 5, filters=filters)
+
+    assert ranked_ids == brute_force_ids(embeddings[mask], index.ids[mask], queries, 5)
+
+
+def test_search_falls_back_to_local_index(engine, index, embeddings):
+    queries = embeddings[:3]
+
+    ranked_ids = engine.search_vectors(FakeModel(index, "faiss"), queries, 5)
+
+    assert ranked_ids == index.search(queries, 5)[1]
+    # each document is its own nearest neighbour
+    assert [ids[0] for ids in ranked_ids] == list(index.ids[:3])
+    assert FakeDataBaseManager.searches == []
+
+
+def test_pgvector_backend_searches_on_server(engine, index, embeddings):
+    ranked_ids = engine.search_vectors(FakeModel(index, "pgvector"), embeddings[:3], 5)
+
+    assert ranked_ids == [list(range(5))] * 3
+    assert [search[0] for search in FakeDataBaseManager.searches] == ["tfidf"] * 3
+
+
+def test_filtered_pgvector_search_uses_local_index(engine, index, embeddings):
+    filters = parse_filters({"last_verdict": "E"})
+
+    ranked_ids = engine.search_vectors(
+        FakeModel(index, "pgvector"), embeddings[:3], 5, filters=filters
+    )
+
+    assert ranked_ids == index.search(embeddings[:3], 5, filters=filters)[1]
+    assert FakeDataBaseManager.searches == []
+
+
+def test_pgvector_literal_round_trip(embeddings):
+    literal = to_pgvector_literal(embeddings[0])
+
+    assert literal[0] == "[" and literal[-1] == "]"
+    parsed = np.array(literal[1:-1].split(","), dtype=np.float32)
+    np.testing.assert_array_equal(parsed, embeddings[0])